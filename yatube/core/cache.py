@@ -0,0 +1,264 @@
+"""Двухуровневый кеш: LRU в памяти процесса (L1) перед общим бэкендом (L2).
+
+L1 отвечает без обращения к L2, пока запись свежая (L1_TIMEOUT секунд).
+Потом запись сверяется с L2 по штампу версии: штамп меняется при каждой
+записи ключа в любом процессе, поэтому чужие изменения видны не позже
+чем через L1_TIMEOUT, а при совпадении штампа значение в L1 заново не
+распаковывается. Штамп хранится в L2 вместе со значением одной
+записью, поэтому они не расходятся.
+
+Настройка::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {'L2': 'shared', 'L1_MAX_ENTRIES': 1000,
+                        'L1_TIMEOUT': 2},
+        },
+        'shared': {...},
+    }
+
+L2 в работе — memcached или другой общий бэкенд; FileCache годится
+для разработки и одной машины.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+_l1_stores = {}
+_l2_stats = {}
+_cull_counters = {}
+_stores_lock = threading.Lock()
+
+
+class LRUStore:
+    """Ограниченный по размеру LRU-словарь, общий для потоков процесса."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            'hits': 0, 'misses': 0, 'revalidations': 0, 'evictions': 0,
+        }
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options['L2']
+        self.l1_timeout = options.get('L1_TIMEOUT', 2)
+        with _stores_lock:
+            self.l1 = _l1_stores.setdefault(
+                name, LRUStore(options.get('L1_MAX_ENTRIES', 1000))
+            )
+            self.l2_stats = _l2_stats.setdefault(
+                name, {'hits': 0, 'misses': 0, 'sets': 0}
+            )
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def stats(self):
+        """Счетчики попаданий, промахов и вытеснений по уровням."""
+        with self.l1.lock:
+            return {
+                'l1': dict(self.l1.stats, size=len(self.l1.entries)),
+                'l2': dict(self.l2_stats),
+            }
+
+    def _count_l2(self, stat):
+        with self.l1.lock:
+            self.l2_stats[stat] += 1
+
+    def _remember(self, key, stamp, expires_at, value):
+        entry = (
+            stamp,
+            expires_at,
+            time.time() + self.l1_timeout,
+            pickle.dumps(value, self.pickle_protocol),
+        )
+        self.l1.set(key, entry)
+        return entry
+
+    def _l1_entry(self, key, version):
+        """Свежая запись L1 или None; устаревшая сверяется по штампу."""
+        made_key = self.make_key(key, version=version)
+        entry = self.l1.get(made_key)
+        if entry is None:
+            return None
+        stamp, expires_at, fresh_until, pickled = entry
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            self.l1.delete(made_key)
+            return None
+        if now < fresh_until:
+            self.l1.count('hits')
+            return entry
+        payload = self.l2.get(key, version=version)
+        if payload is None:
+            self.l1.delete(made_key)
+            return None
+        if payload[0] != stamp:
+            # Штамп пришел вместе с новым значением — второй раз в L2
+            # ходить не нужно.
+            self.l1.count('misses')
+            self._count_l2('hits')
+            return self._remember(made_key, *payload)
+        self.l1.count('revalidations')
+        entry = (stamp, expires_at, now + self.l1_timeout, pickled)
+        self.l1.set(made_key, entry)
+        return entry
+
+    def get(self, key, default=None, version=None):
+        self.validate_key(self.make_key(key, version=version))
+        entry = self._l1_entry(key, version)
+        if entry is not None:
+            return pickle.loads(entry[3])
+        self.l1.count('misses')
+        payload = self.l2.get(key, version=version)
+        if payload is None:
+            self._count_l2('misses')
+            return default
+        self._count_l2('hits')
+        stamp, expires_at, value = payload
+        self._remember(
+            self.make_key(key, version=version), stamp, expires_at, value
+        )
+        return value
+
+    def get_many(self, keys, version=None):
+        """Свежие записи берутся из L1, остальные — одним get_many из L2."""
+        found = {}
+        missing = []
+        now = time.time()
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            entry = self.l1.get(made_key)
+            if entry is not None and now < entry[2] and (
+                    entry[1] is None or now < entry[1]):
+                self.l1.count('hits')
+                found[key] = pickle.loads(entry[3])
+            else:
+                self.l1.count('misses')
+                missing.append(key)
+        if not missing:
+            return found
+        payloads = self.l2.get_many(missing, version=version)
+        for key in missing:
+            payload = payloads.get(key)
+            if payload is None:
+                self._count_l2('misses')
+                continue
+            self._count_l2('hits')
+            stamp, expires_at, value = payload
+            self._remember(
+                self.make_key(key, version=version), stamp, expires_at, value
+            )
+            found[key] = value
+        return found
+
+    def _write(self, method_name, key, value, timeout, version):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        stamp = uuid.uuid4().hex
+        expires_at = self.get_backend_timeout(timeout)
+        written = getattr(self.l2, method_name)(
+            key, (stamp, expires_at, value), timeout, version
+        )
+        if written is False:
+            return False
+        self._count_l2('sets')
+        self._remember(made_key, stamp, expires_at, value)
+        return True
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write('set', key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Атомарен настолько, насколько атомарен add у L2."""
+        self.l1.delete(self.make_key(key, version=version))
+        return self._write('add', key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, version=version)
+        if value is None:
+            return False
+        self.set(key, value, timeout, version)
+        return True
+
+    def delete(self, key, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        self.l1.delete(made_key)
+        self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+
+class FileCache(FileBasedCache):
+    """FileBasedCache, который считает файлы раз в CULL_EVERY записей.
+
+    Django проверяет MAX_ENTRIES обходом всего каталога при каждой
+    записи; здесь обход делается реже, и кеш может превысить MAX_ENTRIES
+    не больше чем на CULL_EVERY записей на процесс.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_every = params.get('OPTIONS', {}).get('CULL_EVERY', 100)
+        with _stores_lock:
+            self._writes = _cull_counters.setdefault(self._dir, [0])
+
+    def _cull(self):
+        with _stores_lock:
+            self._writes[0] += 1
+            if self._writes[0] < self._cull_every:
+                return
+            self._writes[0] = 0
+        super()._cull()
@@ -0,0 +1,105 @@
+"""Чтение из кеша с вычислением по требованию без «эффекта стаи».
+
+Значение хранится вместе с мягким сроком годности и временем, которое
+заняло вычисление. После мягкого срока значение еще stale_timeout
+секунд отдается как устаревшее, пока один процесс, взявший блокировку,
+вычисляет новое. Незадолго до мягкого срока значение с растущей
+вероятностью пересчитывается заранее (XFetch), поэтому дорогие записи
+обычно обновляются до того, как устареют.
+
+Блокировка пересчета — flock на файле в DOGPILE_LOCK_DIR, а не
+cache.add: add у файлового кеша не атомарен. Файлов блокировок
+DOGPILE_LOCK_STRIPES, ключ попадает в один из них по хешу, поэтому
+их число не растет с числом ключей; совпадение двух ключей лишь
+изредка заставляет один из них подождать. Блокировка работает для
+процессов одной машины, как и сам файловый кеш.
+"""
+import fcntl
+import hashlib
+import math
+import os
+import random
+import time
+
+from django.core.cache import cache
+
+from yatube.settings import DOGPILE_LOCK_DIR, DOGPILE_LOCK_STRIPES
+
+
+def _should_refresh(soft_expiry, delta, beta, now):
+    return now - delta * beta * math.log(1 - random.random()) >= soft_expiry
+
+
+def _compute_and_store(key, compute, timeout, stale_timeout):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    cache.set(
+        key, (value, time.time() + timeout, delta), timeout + stale_timeout
+    )
+    return value
+
+
+def lock_path(key):
+    stripe = int(hashlib.md5(key.encode()).hexdigest(), 16)
+    return os.path.join(
+        DOGPILE_LOCK_DIR, str(stripe % DOGPILE_LOCK_STRIPES)
+    )
+
+
+def _locked(key):
+    """Файл с блокировкой пересчета ключа или None, если ее уже держат."""
+    os.makedirs(DOGPILE_LOCK_DIR, exist_ok=True)
+    lock_file = open(lock_path(key), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _unlock(lock_file):
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=60, beta=1.0,
+                   lock_timeout=10, poll_interval=0.05):
+    """Значение из кеша или результат compute(), вычисленный один раз.
+
+    Устаревшее значение отдается, пока его пересчитывает другой процесс.
+    Если значения нет совсем, процессы без блокировки ждут результата
+    до lock_timeout секунд, а потом вычисляют его сами.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, soft_expiry, delta = entry
+        if not _should_refresh(soft_expiry, delta, beta, time.time()):
+            return value
+        lock_file = _locked(key)
+        if lock_file is None:
+            return value
+        try:
+            return _compute_and_store(key, compute, timeout, stale_timeout)
+        finally:
+            _unlock(lock_file)
+
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        lock_file = _locked(key)
+        if lock_file is not None:
+            try:
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[0]
+                return _compute_and_store(
+                    key, compute, timeout, stale_timeout
+                )
+            finally:
+                _unlock(lock_file)
+        time.sleep(poll_interval)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
@@ -0,0 +1,38 @@
+"""Блокировка файлом через flock, общая для процессов на одной машине."""
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+
+
+class LockTimeout(Exception):
+    pass
+
+
+@contextmanager
+def file_lock(path, timeout=None, poll_interval=0.05):
+    """Держит эксклюзивную блокировку файла path.
+
+    Без timeout ждет сколько угодно, иначе через timeout секунд
+    бросает LockTimeout. Файл блокировки не удаляется: удаление
+    занятого файла позволило бы второму процессу взять блокировку
+    на новом файле с тем же именем.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock_file:
+        if timeout is None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise LockTimeout(path)
+                    time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,70 @@
+"""Персональные фрагменты («дыры») в общих закешированных страницах.
+
+Пока у запроса выставлен punch_holes, тег {% hole %} пишет в страницу
+вместо своего содержимого метку: имя шаблона, номер тега в нем и
+значения аргументов. Такая страница одна на всех и кешируется целиком,
+а перед отдачей fill заменяет каждую метку содержимым тега,
+отрендеренным для текущего запроса.
+
+Внутри тега видны только его аргументы и переменные контекстных
+процессоров (user, request, csrf_token), поэтому значения аргументов
+должны сериализоваться в JSON.
+"""
+import base64
+import json
+import re
+
+from django.template import Node, RequestContext
+from django.template.loader import get_template
+
+MARKER = '<!--hole:{}-->'
+MARKER_RE = re.compile(r'<!--hole:([A-Za-z0-9_=-]+)-->')
+
+
+class HoleNode(Node):
+    def __init__(self, nodelist, number, kwargs):
+        self.nodelist = nodelist
+        self.number = number
+        self.kwargs = kwargs
+
+    def render(self, context):
+        values = {
+            name: var.resolve(context) for name, var in self.kwargs.items()
+        }
+        request = context.get('request')
+        if request is None:
+            return self.nodelist.render(context.new(values))
+        if getattr(request, 'punch_holes', False):
+            return _marker(self.origin.template_name, self.number, values)
+        return render_hole(request, context.template, self, values)
+
+
+def _marker(template_name, number, values):
+    payload = json.dumps([template_name, number, values])
+    return MARKER.format(
+        base64.urlsafe_b64encode(payload.encode()).decode()
+    )
+
+
+def _find(template, number):
+    for node in template.nodelist.get_nodes_by_type(HoleNode):
+        if node.number == number:
+            return node
+    raise LookupError(f'{template.origin.template_name}: нет дыры {number}')
+
+
+def render_hole(request, template, node, values):
+    context = RequestContext(request, values)
+    with context.bind_template(template):
+        return node.nodelist.render(context)
+
+
+def fill(request, content):
+    """Заменяет метки в content фрагментами для request."""
+    def render_marker(match):
+        template_name, number, values = json.loads(
+            base64.urlsafe_b64decode(match.group(1))
+        )
+        template = get_template(template_name).template
+        return render_hole(request, template, _find(template, number), values)
+    return MARKER_RE.sub(render_marker, content)
@@ -0,0 +1,393 @@
+"""Инвертированный индекс на чистом Python для баз без FTS5.
+
+Сегмент — два файла: словарь терминов (pickle: термин → смещение,
+длина в байтах, число документов) и списки вхождений, которые читаются
+через mmap. Список вхождений термина — варинты: разность с предыдущим
+id документа, число позиций и разности позиций. Документы в списке
+идут по возрастанию id.
+
+Изменения после сборки сегмента дописываются в журнал, при чтении
+журнал проигрывается в память: измененные и удаленные документы
+скрываются из сегмента, их новые версии ищутся в памяти. compact
+сливает журнал в новый сегмент. Запись только дописывает журнал;
+сливает его команда compact_search_index, запускаемая по расписанию,
+когда needs_compaction: журнал перерос сегмент в SEARCH_COMPACT_RATIO
+раз и не меньше SEARCH_COMPACT_MIN_LOG байт.
+Номер текущего сегмента хранится в файле CURRENT и меняется атомарно,
+поэтому читатели в других процессах видят либо старый, либо новый
+сегмент целиком. Файлы предыдущего сегмента удаляются только при
+следующем сжатии: читатель, успевший прочитать старый CURRENT, еще
+может их открыть.
+
+Документ — строка или список полей; фраза не переходит через границу
+полей. Запрос — слова через пробел (все обязательны) и фразы в кавычках.
+"""
+import mmap
+import os
+import pickle
+import re
+import struct
+import threading
+from array import array
+
+from core.file_lock import file_lock
+from core.stemmer import analyze
+from yatube.settings import SEARCH_COMPACT_MIN_LOG, SEARCH_COMPACT_RATIO
+
+CURRENT = 'CURRENT'
+WRITE_LOCK = 'write.lock'
+MAINTENANCE_LOCK = 'maintenance.lock'
+RECORD_HEADER = struct.Struct('>I')
+PHRASE_RE = re.compile(r'"([^"]*)"|(\S+)')
+# Пустой термин разделяет поля документа и не попадает в словарь.
+GAP = ''
+
+
+def encode_varints(numbers, out):
+    for number in numbers:
+        while number >= 0x80:
+            out.append(number & 0x7F | 0x80)
+            number >>= 7
+        out.append(number)
+
+
+def decode_varints(data):
+    numbers = array('Q')
+    number = shift = 0
+    for byte in data:
+        number |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            numbers.append(number)
+            number = shift = 0
+    return numbers
+
+
+def encode_postings(postings):
+    """Байты списка вхождений {doc_id: позиции}."""
+    out = bytearray()
+    previous_doc = 0
+    for doc_id in sorted(postings):
+        positions = postings[doc_id]
+        encode_varints((doc_id - previous_doc, len(positions)), out)
+        encode_varints(
+            (position - previous for position, previous in zip(
+                positions, (0, *positions[:-1])
+            )),
+            out,
+        )
+        previous_doc = doc_id
+    return bytes(out)
+
+
+def decode_postings(data):
+    numbers = decode_varints(data)
+    postings = {}
+    doc_id = i = 0
+    while i < len(numbers):
+        doc_id += numbers[i]
+        count = numbers[i + 1]
+        positions = []
+        position = 0
+        for delta in numbers[i + 2:i + 2 + count]:
+            position += delta
+            positions.append(position)
+        postings[doc_id] = positions
+        i += 2 + count
+    return postings
+
+
+def invert(doc_id, terms, postings):
+    """Добавляет термины документа в словарь {термин: {doc_id: позиции}}."""
+    for position, term in enumerate(terms):
+        if term == GAP:
+            continue
+        postings.setdefault(term, {}).setdefault(doc_id, []).append(position)
+
+
+class InvertedIndex:
+    def __init__(self, path, analyzer=analyze):
+        self.path = path
+        self.analyzer = analyzer
+        self.lock = threading.Lock()
+        self.generation = None
+        self.lexicon = {}
+        self.data = b''
+        self.log_offset = 0
+        self.live = {}
+        self.live_postings = {}
+        self.stale = set()
+
+    def _file(self, generation, suffix):
+        return os.path.join(self.path, f'segment-{generation}.{suffix}')
+
+    def _current_generation(self):
+        try:
+            with open(os.path.join(self.path, CURRENT)) as current:
+                return int(current.read())
+        except FileNotFoundError:
+            return 0
+
+    def _locked(self, name):
+        return file_lock(os.path.join(self.path, name))
+
+    def _open_segment(self, generation):
+        self.generation = generation
+        self.lexicon = {}
+        self.data = b''
+        self.log_offset = 0
+        self.live = {}
+        self.live_postings = {}
+        self.stale = set()
+        try:
+            with open(self._file(generation, 'lex'), 'rb') as lexicon:
+                self.lexicon = pickle.load(lexicon)
+            with open(self._file(generation, 'post'), 'rb') as data:
+                if os.fstat(data.fileno()).st_size:
+                    self.data = mmap.mmap(
+                        data.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+        except FileNotFoundError:
+            pass
+
+    def _log_records(self, generation, offset):
+        """Целые записи журнала после offset и смещение за последней."""
+        try:
+            with open(self._file(generation, 'log'), 'rb') as log:
+                log.seek(offset)
+                tail = log.read()
+        except FileNotFoundError:
+            return [], offset
+        records = []
+        position = 0
+        while position + RECORD_HEADER.size <= len(tail):
+            size, = RECORD_HEADER.unpack_from(tail, position)
+            end = position + RECORD_HEADER.size + size
+            if end > len(tail):
+                break
+            records.append(
+                pickle.loads(tail[position + RECORD_HEADER.size:end])
+            )
+            position = end
+        return records, offset + position
+
+    def _read_log(self):
+        records, self.log_offset = self._log_records(
+            self.generation, self.log_offset
+        )
+        for doc_id, terms in records:
+            self.stale.add(doc_id)
+            for term in set(self.live.pop(doc_id, ())) - {GAP}:
+                del self.live_postings[term][doc_id]
+                if not self.live_postings[term]:
+                    del self.live_postings[term]
+            if terms is not None:
+                self.live[doc_id] = terms
+                invert(doc_id, terms, self.live_postings)
+
+    def refresh(self):
+        """Подхватывает новый сегмент и новые записи журнала."""
+        with self.lock:
+            generation = self._current_generation()
+            if generation != self.generation:
+                self._open_segment(generation)
+            self._read_log()
+
+    def _segment_size(self, generation):
+        size = 0
+        for suffix in ('lex', 'post'):
+            try:
+                size += os.path.getsize(self._file(generation, suffix))
+            except FileNotFoundError:
+                pass
+        return size
+
+    def _append(self, doc_id, terms):
+        record = pickle.dumps((doc_id, terms), pickle.HIGHEST_PROTOCOL)
+        with self._locked(WRITE_LOCK):
+            generation = self._current_generation()
+            log = os.open(
+                self._file(generation, 'log'),
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            )
+            try:
+                os.write(log, RECORD_HEADER.pack(len(record)) + record)
+            finally:
+                os.close(log)
+
+    def needs_compaction(self):
+        """Журнал пора слить: он перерос сегмент."""
+        generation = self._current_generation()
+        try:
+            log_size = os.path.getsize(self._file(generation, 'log'))
+        except FileNotFoundError:
+            return False
+        return log_size >= max(
+            SEARCH_COMPACT_MIN_LOG,
+            SEARCH_COMPACT_RATIO * self._segment_size(generation),
+        )
+
+    def _terms(self, text):
+        if isinstance(text, str):
+            return self.analyzer(text)
+        terms = []
+        for field in text:
+            if terms:
+                terms.append(GAP)
+            terms.extend(self.analyzer(field))
+        return terms
+
+    def add(self, doc_id, text):
+        """Добавляет документ или заменяет его прежнюю версию."""
+        self._append(doc_id, self._terms(text))
+
+    def remove(self, doc_id):
+        self._append(doc_id, None)
+
+    def _base_postings(self, term):
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return {}
+        offset, size, _ = entry
+        return decode_postings(self.data[offset:offset + size])
+
+    def postings(self, term):
+        """Вхождения термина {doc_id: позиции} с учетом журнала."""
+        postings = {
+            doc_id: positions
+            for doc_id, positions in self._base_postings(term).items()
+            if doc_id not in self.stale
+        }
+        postings.update(self.live_postings.get(term, {}))
+        return postings
+
+    def parse(self, query):
+        """Фразы запроса — списки терминов; отдельное слово — фраза из
+        одного термина."""
+        phrases = []
+        for quoted, word in PHRASE_RE.findall(query):
+            terms = self.analyzer(quoted or word)
+            if terms:
+                phrases.append(terms)
+        return phrases
+
+    def _frequency(self, phrase):
+        return min(self.lexicon.get(term, (0, 0, 0))[2] for term in phrase)
+
+    def _phrase_docs(self, phrase, candidates):
+        postings = []
+        for term in phrase:
+            term_postings = self.postings(term)
+            if candidates is not None:
+                term_postings = {
+                    doc_id: positions
+                    for doc_id, positions in term_postings.items()
+                    if doc_id in candidates
+                }
+            postings.append(term_postings)
+        docs = set(postings[0]).intersection(*postings[1:])
+        if len(phrase) == 1:
+            return docs
+        position_sets = [
+            {doc_id: set(term_postings[doc_id]) for doc_id in docs}
+            for term_postings in postings
+        ]
+        return {
+            doc_id for doc_id in docs
+            if any(
+                all(start + i in positions[doc_id]
+                    for i, positions in enumerate(position_sets))
+                for start in postings[0][doc_id]
+            )
+        }
+
+    def search(self, query):
+        """id документов, где есть все слова и фразы запроса, по убыванию."""
+        self.refresh()
+        phrases = self.parse(query)
+        if not phrases:
+            return []
+        docs = None
+        with self.lock:
+            for phrase in sorted(phrases, key=self._frequency):
+                docs = self._phrase_docs(phrase, docs)
+                if not docs:
+                    return []
+        return sorted(docs, reverse=True)
+
+    def _write_segment(self, postings):
+        generation = self._current_generation() + 1
+        lexicon = {}
+        with open(self._file(generation, 'post'), 'wb') as data:
+            offset = 0
+            for term in sorted(postings):
+                encoded = encode_postings(postings[term])
+                data.write(encoded)
+                lexicon[term] = (offset, len(encoded), len(postings[term]))
+                offset += len(encoded)
+        with open(self._file(generation, 'lex'), 'wb') as lexicon_file:
+            pickle.dump(lexicon, lexicon_file, pickle.HIGHEST_PROTOCOL)
+        current = os.path.join(self.path, f'{CURRENT}.{generation}')
+        with open(current, 'w') as current_file:
+            current_file.write(str(generation))
+        os.replace(current, os.path.join(self.path, CURRENT))
+        for suffix in ('lex', 'post', 'log'):
+            try:
+                os.remove(self._file(generation - 2, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _commit(self, postings, doc_terms, generation, log_offset):
+        """Дописывает в postings журнал после log_offset и делает их
+        текущим сегментом."""
+        with self._locked(WRITE_LOCK):
+            records, _ = self._log_records(generation, log_offset)
+            for doc_id, terms in records:
+                for term in doc_terms.pop(doc_id, ()):
+                    del postings[term][doc_id]
+                    if not postings[term]:
+                        del postings[term]
+                if terms is not None:
+                    doc_terms[doc_id] = set(terms) - {GAP}
+                    invert(doc_id, terms, postings)
+            self._write_segment(postings)
+        self.refresh()
+
+    def build(self, documents):
+        """Собирает индекс заново из пар (doc_id, текст).
+
+        Изменения, записанные в журнал во время сборки, не теряются.
+        Возвращает число документов.
+        """
+        with self._locked(MAINTENANCE_LOCK):
+            self.refresh()
+            generation, log_offset = self.generation, self.log_offset
+            postings = {}
+            doc_terms = {}
+            for doc_id, text in documents:
+                terms = self._terms(text)
+                doc_terms[doc_id] = set(terms) - {GAP}
+                invert(doc_id, terms, postings)
+            self._commit(postings, doc_terms, generation, log_offset)
+        return len(doc_terms)
+
+    def compact(self):
+        """Сливает журнал с сегментом в новый сегмент."""
+        with self._locked(MAINTENANCE_LOCK):
+            self.refresh()
+            with self.lock:
+                generation, log_offset = self.generation, self.log_offset
+                postings = {}
+                doc_terms = {}
+                for term in self.lexicon:
+                    for doc_id, positions in self._base_postings(
+                        term
+                    ).items():
+                        if doc_id not in self.stale:
+                            postings.setdefault(term, {})[doc_id] = positions
+                            doc_terms.setdefault(doc_id, set()).add(term)
+                for doc_id, terms in self.live.items():
+                    doc_terms[doc_id] = set(terms) - {GAP}
+                    invert(doc_id, terms, postings)
+            self._commit(postings, doc_terms, generation, log_offset)
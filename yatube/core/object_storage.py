@@ -0,0 +1,430 @@
+"""Хранилище файлов в объектном хранилище S3 или в его замене на диске.
+
+ObjectStorage — Storage Django поверх протокола объектного хранилища:
+put, multipart-загрузка частями, get, head, delete, list, touch и
+presign. Протокол реализуют S3ObjectStore (S3-совместимый сервис через
+boto3) и LocalObjectStore (каталог на диске), поэтому код хранилища
+проверяется без сети.
+
+Файл сохраняется потоком: пока он меньше multipart_threshold, он
+отправляется одним put, а дальше — частями по part_size, не собираясь
+в памяти целиком. Хранилище (и клиент S3 с пулом из
+max_pool_connections соединений) создается один раз на процесс для
+каждого набора параметров. Адреса файлов ведут на CDN, если задан
+cdn_url, иначе подписываются на url_expiry секунд.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+from yatube.settings import OBJECT_STORAGE
+
+DELETE_BATCH = 1000
+MULTIPART = '.multipart'
+COPIED_HEADERS = (
+    'ContentType', 'CacheControl', 'ContentDisposition', 'ContentEncoding',
+    'ContentLanguage',
+)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class LocalObjectStore:
+    """Объектное хранилище в каталоге root: ключ — путь файла.
+
+    Части multipart-загрузки лежат в root/.multipart/<id>/ и склеиваются
+    в объект атомарно. Подписанные адреса ведут на view
+    core.views.media_object, который проверяет подпись.
+    """
+
+    def __init__(self, root, **options):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.join(self.root, '')):
+            raise ValueError(f'Ключ вне хранилища: {key}')
+        return path
+
+    def _write(self, key, chunks):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix='.tmp-'
+        )
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in chunks:
+                    temp_file.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def put(self, key, data, content_type=None):
+        self._write(key, [data])
+
+    def create_multipart(self, key, content_type=None):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, MULTIPART, upload_id))
+        return upload_id
+
+    def upload_part(self, key, upload_id, number, data):
+        path = os.path.join(self.root, MULTIPART, upload_id, f'{number:05d}')
+        with open(path, 'wb') as part:
+            part.write(data)
+        return hashlib.md5(data).hexdigest()
+
+    def complete_multipart(self, key, upload_id, parts):
+        directory = os.path.join(self.root, MULTIPART, upload_id)
+
+        def chunks():
+            for number, _ in parts:
+                with open(os.path.join(directory, f'{number:05d}'),
+                          'rb') as part:
+                    yield part.read()
+
+        self._write(key, chunks())
+        shutil.rmtree(directory)
+
+    def abort_multipart(self, key, upload_id):
+        shutil.rmtree(
+            os.path.join(self.root, MULTIPART, upload_id), ignore_errors=True
+        )
+
+    def get(self, key):
+        try:
+            return open(self._path(key), 'rb')
+        except FileNotFoundError:
+            raise FileNotFoundError(key)
+
+    def head(self, key):
+        """(размер, время изменения) объекта или None."""
+        try:
+            stat = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def list(self, prefix):
+        """(ключ, размер, время изменения) объектов с префиксом."""
+        directory = os.path.dirname(prefix)
+        stack = [directory]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(os.path.join(self.root, directory)))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                key = f'{directory}/{entry.name}'.lstrip('/')
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != MULTIPART:
+                        stack.append(key)
+                elif key.startswith(prefix):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield key, stat.st_size, stat.st_mtime
+
+    def touch(self, key):
+        os.utime(self._path(key))
+
+    @staticmethod
+    def signature(key, expires):
+        return signing.Signer(salt='core.object_storage').signature(
+            f'{key}:{expires}'
+        )
+
+    def presign(self, key, expires_in):
+        expires = int(time.time()) + expires_in
+        return '{}?{}'.format(self.url(key), urlencode({
+            'expires': expires, 'signature': self.signature(key, expires),
+        }))
+
+    def url(self, key):
+        return reverse('media_object', args=(key,))
+
+
+class S3ObjectStore:
+    """Объектное хранилище в S3-совместимом сервисе через boto3."""
+
+    def __init__(self, bucket, endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, max_pool_connections=10,
+                 **options):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImproperlyConfigured(
+                'Для хранилища S3 установите boto3.'
+            )
+        self.bucket = bucket
+        # Клиент boto3 потокобезопасен: один клиент и один пул
+        # соединений на процесс.
+        self.client = boto3.session.Session().client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={'max_attempts': 5, 'mode': 'standard'},
+                signature_version='s3v4',
+            ),
+        )
+
+    def put(self, key, data, content_type=None):
+        extra = {'ContentType': content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data,
+                               **extra)
+
+    def create_multipart(self, key, content_type=None):
+        extra = {'ContentType': content_type} if content_type else {}
+        return self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, **extra
+        )['UploadId']
+
+    def upload_part(self, key, upload_id, number, data):
+        return self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            PartNumber=number, Body=data,
+        )['ETag']
+
+    def complete_multipart(self, key, upload_id, parts):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': number, 'ETag': etag}
+                for number, etag in parts
+            ]},
+        )
+
+    def abort_multipart(self, key, upload_id):
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id
+        )
+
+    def get(self, key):
+        try:
+            return self.client.get_object(
+                Bucket=self.bucket, Key=key
+            )['Body']
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+
+    def head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            found = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return None
+            raise
+        return found['ContentLength'], found['LastModified'].timestamp()
+
+    def delete(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), DELETE_BATCH):
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [
+                    {'Key': key} for key in keys[start:start + DELETE_BATCH]
+                ],
+                'Quiet': True,
+            })
+
+    def list(self, prefix):
+        pages = self.client.get_paginator('list_objects_v2').paginate(
+            Bucket=self.bucket, Prefix=prefix
+        )
+        for page in pages:
+            for found in page.get('Contents', ()):
+                yield (found['Key'], found['Size'],
+                       found['LastModified'].timestamp())
+
+    def touch(self, key):
+        # Копия объекта в себя с заменой метаданных обновляет
+        # LastModified без передачи содержимого через клиент. При
+        # REPLACE S3 не переносит заголовки сам, поэтому они берутся из
+        # head_object, иначе объект станет binary/octet-stream.
+        found = self.client.head_object(Bucket=self.bucket, Key=key)
+        headers = {
+            name: found[name] for name in COPIED_HEADERS if found.get(name)
+        }
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key,
+            CopySource={'Bucket': self.bucket, 'Key': key},
+            MetadataDirective='REPLACE',
+            Metadata=found.get('Metadata', {}),
+            **headers,
+        )
+
+    def presign(self, key, expires_in):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=expires_in,
+        )
+
+    def url(self, key):
+        return '{}/{}/{}'.format(
+            self.client.meta.endpoint_url, self.bucket, quote(key)
+        )
+
+
+STORES = {'local': LocalObjectStore, 's3': S3ObjectStore}
+
+
+def get_store(options):
+    """Общее для процесса хранилище с параметрами options."""
+    key = tuple(sorted(options.items()))
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = STORES[options['backend']](**options)
+                _stores[key] = store
+    return store
+
+
+@deconstructible
+class ObjectStorage(Storage):
+    """Storage Django поверх объектного хранилища из OBJECT_STORAGE.
+
+    Параметры из OBJECT_STORAGE можно переопределить аргументами.
+    Файлы, как и в core.storage.AtomicFileSystemStorage, появляются
+    целиком и перезаписываются под тем же именем.
+    """
+
+    def __init__(self, **options):
+        self.options = {**OBJECT_STORAGE, **options}
+
+    @cached_property
+    def store(self):
+        return get_store(self.options)
+
+    def _key(self, name):
+        location = self.options['location'].strip('/')
+        name = name.replace('\\', '/').lstrip('/')
+        return f'{location}/{name}' if location else name
+
+    def _name(self, key):
+        location = self.options['location'].strip('/')
+        return key[len(location) + 1:] if location else key
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode:
+            raise ValueError('Объекты открываются только на чтение.')
+        return File(self.store.get(self._key(name)), name)
+
+    def _save(self, name, content):
+        key = self._key(name)
+        content_type = getattr(content, 'content_type', None)
+        threshold = self.options['multipart_threshold']
+        part_size = self.options['part_size']
+        buffer = bytearray()
+        chunks = content.chunks(part_size)
+        for chunk in chunks:
+            buffer += chunk
+            if len(buffer) >= threshold:
+                break
+        else:
+            self.store.put(key, bytes(buffer), content_type)
+            return name
+        upload_id = self.store.create_multipart(key, content_type)
+        parts = []
+        try:
+            # Части уходят по мере чтения: в памяти не больше одной.
+            for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= part_size:
+                    parts.append(self._upload_part(
+                        key, upload_id, len(parts) + 1, buffer[:part_size]
+                    ))
+                    del buffer[:part_size]
+            if buffer or not parts:
+                parts.append(self._upload_part(
+                    key, upload_id, len(parts) + 1, buffer
+                ))
+            self.store.complete_multipart(key, upload_id, parts)
+        except BaseException:
+            self.store.abort_multipart(key, upload_id)
+            raise
+        return name
+
+    def _upload_part(self, key, upload_id, number, data):
+        return number, self.store.upload_part(
+            key, upload_id, number, bytes(data)
+        )
+
+    def delete(self, name):
+        self.store.delete([self._key(name)])
+
+    def exists(self, name):
+        return self.store.head(self._key(name)) is not None
+
+    def _head(self, name):
+        found = self.store.head(self._key(name))
+        if found is None:
+            raise FileNotFoundError(name)
+        return found
+
+    def size(self, name):
+        return self._head(name)[0]
+
+    def get_modified_time(self, name):
+        modified = datetime.fromtimestamp(self._head(name)[1], timezone.utc)
+        return modified if settings.USE_TZ else timezone.make_naive(modified)
+
+    def listdir(self, path):
+        prefix = self._key(path).rstrip('/') + '/'
+        directories, files = set(), []
+        for key, _, _ in self.store.list(prefix):
+            head, _, tail = key[len(prefix):].partition('/')
+            if tail:
+                directories.add(head)
+            else:
+                files.append(head)
+        return sorted(directories), files
+
+    def url(self, name):
+        key = self._key(name)
+        if self.options['cdn_url']:
+            return f"{self.options['cdn_url'].rstrip('/')}/{quote(key)}"
+        if self.options['signed_urls']:
+            return self.store.presign(key, self.options['url_expiry'])
+        return self.store.url(key)
+
+    def touch(self, name):
+        self.store.touch(self._key(name))
+
+    def scan(self, prefix=''):
+        """(имя, размер, время изменения) всех файлов под prefix."""
+        for key, size, modified in self.store.list(self._key(prefix)):
+            yield self._name(key), size, modified
@@ -0,0 +1,186 @@
+"""Кеш целых страниц, общий для всех читателей.
+
+Промежуточный слой стоит сразу за AuthenticationMiddleware и отвечает
+на GET и HEAD к представлениям, помеченным декоратором
+shared_page_cache, не доходя до ORM и рендера шаблонов. Страница
+рендерится и кешируется одна на всех: персональные части размечены
+тегом {% hole %} и перед отдачей рендерятся для каждого запроса
+отдельно (см. core.holes).
+
+У каждого адреса есть версия — время последнего изменения страницы в
+наносекундах. Запись поста или комментария обновляет версии
+затронутых адресов через purge; если версии нет, она берется из
+времени самого нового поста или комментария на странице, но не раньше
+последнего purge: версии хранятся в вытесняющем кеше, и вытесненная
+версия не должна откатиться к странице, закешированной до purge. Из версии
+получаются ETag и Last-Modified для анонимных читателей, поэтому на
+условный GET с совпавшим If-None-Match хватает одного чтения из кеша,
+чтобы ответить 304. Ответы авторизованным персональны и помечаются
+как private.
+"""
+import functools
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+
+from core.holes import fill
+from yatube.settings import PAGE_CACHE_TIMEOUT
+
+VERSION_KEY = 'page-version:{}'
+FLOOR_KEY = 'page-version-floor'
+PAGE_KEY = 'page:{}:{}'
+CACHED_METHODS = ('GET', 'HEAD')
+NANOSECONDS = 10 ** 9
+
+
+def shared_page_cache(last_modified):
+    """Помечает представление для кеша страниц.
+
+    last_modified(request, *args, **kwargs) возвращает время самого
+    нового поста или комментария на странице либо None.
+    """
+    def decorator(view):
+        view.page_last_modified = last_modified
+        return view
+    return decorator
+
+
+def page_version(path, last_modified):
+    """Версия адреса и признак того, что она уже записана в кеш.
+
+    Новая версия не записывается здесь: иначе любой GET, в том числе
+    к несуществующему адресу, оставлял бы в кеше запись. Ее записывает
+    remember_version после того, как страница закеширована.
+    """
+    version_key = VERSION_KEY.format(path)
+    found = cache.get_many([version_key, FLOOR_KEY])
+    if version_key in found:
+        return found[version_key], True
+    floor = found.get(FLOOR_KEY)
+    if floor is None:
+        # Неизвестно, когда был последний purge: берем текущее время.
+        floor = time.time_ns()
+        cache.add(FLOOR_KEY, floor, None)
+    moment = last_modified()
+    if moment is None:
+        return time.time_ns(), False
+    return max(int(moment.timestamp() * NANOSECONDS), floor), False
+
+
+def remember_version(path, version):
+    cache.add(VERSION_KEY.format(path), version, None)
+
+
+def purge(paths):
+    """Делает устаревшими закешированные страницы по адресам paths."""
+    version = time.time_ns()
+    versions = {VERSION_KEY.format(path): version for path in paths}
+    versions[FLOOR_KEY] = version
+    cache.set_many(versions, None)
+
+
+def _page_key(request, version):
+    full_path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(version, full_path)
+
+
+def _stamp(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _personal(response):
+    patch_cache_control(response, private=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def _fill(request, response):
+    if not response.streaming:
+        response.content = fill(
+            request, response.content.decode(response.charset)
+        )
+    return response
+
+
+class SharedPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        match = self._cached_view(request)
+        if match is None:
+            return self.get_response(request)
+        version, stored = page_version(request.path, functools.partial(
+            match.func.page_last_modified,
+            request, *match.args, **match.kwargs,
+        ))
+        anonymous = not request.user.is_authenticated
+        etag = quote_etag(format(version, 'x'))
+        modified = version // NANOSECONDS
+        if anonymous:
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modified
+            )
+            if response is not None:
+                return _stamp(response, etag, modified)
+        key = _page_key(request, version)
+        entry = cache.get(key)
+        if entry is not None:
+            status, content, headers = entry
+            response = HttpResponse(content, status=status)
+            for header, value in headers:
+                response[header] = value
+            request.resolver_match = match
+        else:
+            request.punch_holes = True
+            try:
+                response = self.get_response(request)
+            finally:
+                request.punch_holes = False
+            if not self._storable(request, response):
+                return _fill(request, response)
+            cache.set(
+                key,
+                (response.status_code, response.content,
+                 list(response.items())),
+                PAGE_CACHE_TIMEOUT,
+            )
+            if not stored:
+                remember_version(request.path, version)
+        _fill(request, response)
+        if anonymous:
+            return _stamp(response, etag, modified)
+        return _personal(response)
+
+    @staticmethod
+    def _cached_view(request):
+        """Результат resolve, если страницу можно взять из кеша."""
+        if request.method not in CACHED_METHODS:
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if not hasattr(match.func, 'page_last_modified'):
+            return None
+        return match
+
+    @staticmethod
+    def _storable(request, response):
+        return (
+            request.method == 'GET'
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
@@ -0,0 +1,64 @@
+"""Публикация id новых событий по каналам для процессов одной машины.
+
+Канал хранит только id последнего события в файле PUBSUB_DIR/<канал>:
+сами события (комментарии, посты) читаются из базы, поэтому после
+переподключения клиент получает пропущенное по своему последнему id.
+Подписчики своего процесса будятся сразу через Condition, а
+записи других процессов замечаются опросом файлов раз в
+PUBSUB_POLL_INTERVAL секунд.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from core.file_lock import file_lock
+from yatube.settings import PUBSUB_DIR, PUBSUB_POLL_INTERVAL
+
+_condition = threading.Condition()
+
+
+def _path(channel):
+    return os.path.join(PUBSUB_DIR, channel.replace(':', '-'))
+
+
+def latest(channel):
+    """id последнего события канала или 0."""
+    try:
+        with open(_path(channel)) as channel_file:
+            return int(channel_file.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def publish(channel, event_id):
+    """Сообщает подписчикам канала о событии event_id."""
+    path = _path(channel)
+    # Опоздавшая запись не должна откатить id назад.
+    with file_lock(f'{path}.lock'):
+        if event_id <= latest(channel):
+            return
+        fd, temp_path = tempfile.mkstemp(dir=PUBSUB_DIR, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as temp_file:
+            temp_file.write(str(event_id))
+        os.replace(temp_path, path)
+    with _condition:
+        _condition.notify_all()
+
+
+def wait(channels, after, timeout):
+    """Ждет события новее after в любом из каналов.
+
+    Возвращает id самого нового события или None, если за timeout
+    секунд ничего не пришло.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        newest = max((latest(channel) for channel in channels), default=0)
+        if newest > after:
+            return newest
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        with _condition:
+            _condition.wait(min(remaining, PUBSUB_POLL_INTERVAL))
@@ -0,0 +1,83 @@
+import logging
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """execute_wrapper, считающий запросы к базе."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(limit):
+    """Закрепляет за view максимальное число запросов к базе за запрос.
+
+    Считается весь запрос, вместе с сессией, пользователем и кешем
+    страниц: в рабочем режиме превышение пишет в лог
+    QueryBudgetMiddleware, в тестах его проверяет
+    QueryBudgetMixin.assertQueryBudget.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def budget_for(path):
+    """Бюджет view, которое отвечает на path, или None."""
+    try:
+        view = resolve(path).func
+    except Resolver404:
+        return None
+    return getattr(view, 'query_budget', None)
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы к базе за весь запрос и сверяет их с бюджетом.
+
+    Стоит первым в MIDDLEWARE, чтобы в счет попали запросы всех
+    остальных промежуточных слоев.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+        limit = budget_for(request.path_info)
+        if limit is not None and counter.count > limit:
+            logger.warning(
+                '%s: %s запросов при бюджете %s',
+                request.path, counter.count, limit,
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    """Проверки бюджета запросов для TestCase."""
+
+    def assertQueryBudget(self, client, url, method='get', data=None):
+        limit = budget_for(urlsplit(url).path)
+        self.assertIsNotNone(
+            limit, f'У view для {url} не задан query_budget'
+        )
+        with CaptureQueriesContext(connection) as context:
+            getattr(client, method)(url, data)
+        self.assertLessEqual(
+            len(context), limit,
+            f'{url}: {len(context)} запросов при бюджете {limit}\n'
+            + '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return len(context)
@@ -0,0 +1,126 @@
+"""Потоки Server-Sent Events поверх core.pubsub.
+
+Поток отдает события новее Last-Event-ID (заголовок или параметр
+?last_event_id= для первого подключения), между событиями шлет
+комментарий-heartbeat раз в SSE_HEARTBEAT секунд и закрывается через
+SSE_MAX_DURATION секунд: браузер сам переподключится с последним id.
+Каждый поток занимает поток WSGI-сервера, поэтому их число на процесс
+ограничено SSE_MAX_CONNECTIONS, а лишние подключения получают 503.
+"""
+import json
+import threading
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+
+from core import pubsub
+from yatube.settings import (
+    SSE_HEARTBEAT, SSE_MAX_CONNECTIONS, SSE_MAX_DURATION, SSE_RETRY
+)
+
+_lock = threading.Lock()
+_connections = 0
+
+
+def last_event_id(request):
+    """id последнего полученного клиентом события или None."""
+    value = request.META.get(
+        'HTTP_LAST_EVENT_ID', request.GET.get('last_event_id')
+    )
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def event(event_id, name, data):
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        event_id, name,
+        json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False),
+    ).encode()
+
+
+def _acquire():
+    global _connections
+    with _lock:
+        if _connections >= SSE_MAX_CONNECTIONS:
+            return False
+        _connections += 1
+        return True
+
+
+def _release():
+    global _connections
+    with _lock:
+        _connections -= 1
+
+
+class EventStream:
+    """Итератор событий потока; закрытие освобождает место в лимите.
+
+    fetch(after) возвращает пары (id, байты события) новее after по
+    возрастанию id. Ответ WSGI-сервера закрывается и тогда, когда поток
+    так и не начал читаться, поэтому место освобождается в close(), а
+    не в finally генератора.
+    """
+
+    def __init__(self, channels, after, fetch):
+        self.channels = channels
+        self.after = after
+        self.fetch = fetch
+        self.closed = False
+        self.events = self._events()
+
+    def _events(self):
+        yield f'retry: {SSE_RETRY}\n\n'.encode()
+        deadline = time.monotonic() + SSE_MAX_DURATION
+        # Событие могло быть опубликовано раньше, чем строка стала
+        # видна в базе: ждем id новее уже виденного, а не отданного.
+        seen = self.after
+        while True:
+            for event_id, data in self.fetch(self.after):
+                self.after = event_id
+                yield data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            newest = pubsub.wait(
+                self.channels, max(seen, self.after),
+                min(remaining, SSE_HEARTBEAT),
+            )
+            if newest is None:
+                yield b': ping\n\n'
+            else:
+                seen = newest
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.events)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.events.close()
+            _release()
+
+
+def stream(channels, after, fetch):
+    """Ответ с потоком событий или 503, если потоков уже слишком много."""
+    if not _acquire():
+        response = HttpResponse(
+            'Слишком много потоков событий.', status=503,
+            content_type='text/plain; charset=utf-8',
+        )
+        response['Retry-After'] = SSE_RETRY // 1000
+        return response
+    response = StreamingHttpResponse(
+        EventStream(channels, after, fetch),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен копить поток в буфере.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,200 @@
+"""Разбиение текста на основы слов для русского и английского.
+
+Русские слова обрезаются алгоритмом Портера для русского языка
+(Snowball), английские — классическим алгоритмом Портера. Слова без
+кириллицы и латиницы (числа) остаются как есть.
+"""
+import functools
+import re
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+LATIN_RE = re.compile(r'[a-z]')
+
+RU_RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+RU_PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+RU_REFLEXIVE = re.compile(r'(с[яь])$')
+RU_ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$'
+)
+RU_PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+RU_VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+RU_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем'
+    r'|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+RU_DERIVATIONAL_REGION = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+RU_DERIVATIONAL = re.compile(r'ость?$')
+RU_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def _strip(pattern, word):
+    return pattern.sub('', word, 1)
+
+
+def stem_ru(word):
+    match = RU_RV.match(word.replace('ё', 'е'))
+    if match is None:
+        return word
+    start, rv = match.groups()
+    stripped = _strip(RU_PERFECTIVE_GERUND, rv)
+    if stripped == rv:
+        rv = _strip(RU_REFLEXIVE, rv)
+        stripped = _strip(RU_ADJECTIVE, rv)
+        if stripped != rv:
+            rv = _strip(RU_PARTICIPLE, stripped)
+        else:
+            stripped = _strip(RU_VERB, rv)
+            rv = _strip(RU_NOUN, rv) if stripped == rv else stripped
+    else:
+        rv = stripped
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    if RU_DERIVATIONAL_REGION.match(rv):
+        rv = _strip(RU_DERIVATIONAL, rv)
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _strip(RU_SUPERLATIVE, rv)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return start + rv
+
+
+def _consonant(word, i):
+    if word[i] in 'aeiou':
+        return False
+    if word[i] == 'y':
+        return i == 0 or not _consonant(word, i - 1)
+    return True
+
+
+def _measure(stem):
+    """Число последовательностей «гласные, согласные» в основе."""
+    forms = ''.join('c' if _consonant(stem, i) else 'v'
+                    for i in range(len(stem)))
+    return len(re.findall(r'v+c+', forms))
+
+
+def _has_vowel(stem):
+    return any(not _consonant(stem, i) for i in range(len(stem)))
+
+
+def _double_consonant(word):
+    return (len(word) >= 2 and word[-1] == word[-2]
+            and _consonant(word, len(word) - 1))
+
+
+def _cvc(word):
+    return (len(word) >= 3 and _consonant(word, len(word) - 3)
+            and not _consonant(word, len(word) - 2)
+            and _consonant(word, len(word) - 1) and word[-1] not in 'wxy')
+
+
+EN_STEP2 = (
+    ('ational', 'ate'), ('tional', 'tion'), ('enci', 'ence'),
+    ('anci', 'ance'), ('izer', 'ize'), ('bli', 'ble'), ('alli', 'al'),
+    ('entli', 'ent'), ('eli', 'e'), ('ousli', 'ous'), ('ization', 'ize'),
+    ('ation', 'ate'), ('ator', 'ate'), ('alism', 'al'), ('iveness', 'ive'),
+    ('fulness', 'ful'), ('ousness', 'ous'), ('aliti', 'al'),
+    ('iviti', 'ive'), ('biliti', 'ble'), ('logi', 'log'),
+)
+EN_STEP3 = (
+    ('icate', 'ic'), ('ative', ''), ('alize', 'al'), ('iciti', 'ic'),
+    ('ical', 'ic'), ('ful', ''), ('ness', ''),
+)
+EN_STEP4 = (
+    'al', 'ance', 'ence', 'er', 'ic', 'able', 'ible', 'ant', 'ement',
+    'ment', 'ent', 'ion', 'ou', 'ism', 'ate', 'iti', 'ous', 'ive', 'ize',
+)
+
+
+def _replace_suffix(word, rules):
+    for suffix, replacement in rules:
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            if _measure(stem) > 0:
+                return stem + replacement
+            return word
+    return word
+
+
+def _strip_ed_ing(word):
+    for suffix in ('ed', 'ing'):
+        if word.endswith(suffix) and _has_vowel(word[:-len(suffix)]):
+            word = word[:-len(suffix)]
+            if word.endswith(('at', 'bl', 'iz')):
+                return word + 'e'
+            if _double_consonant(word) and word[-1] not in 'lsz':
+                return word[:-1]
+            if _measure(word) == 1 and _cvc(word):
+                return word + 'e'
+            return word
+    return word
+
+
+def _step1(word):
+    if word.endswith('sses') or word.endswith('ies'):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    if word.endswith('eed'):
+        if _measure(word[:-3]) > 0:
+            word = word[:-1]
+        return word
+    word = _strip_ed_ing(word)
+    if word.endswith('y') and _has_vowel(word[:-1]):
+        word = word[:-1] + 'i'
+    return word
+
+
+def stem_en(word):
+    if len(word) <= 2:
+        return word
+    word = _step1(word)
+    word = _replace_suffix(word, EN_STEP2)
+    word = _replace_suffix(word, EN_STEP3)
+    for suffix in sorted(EN_STEP4, key=len, reverse=True):
+        if word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            if _measure(stem) > 1 and (
+                    suffix != 'ion' or stem.endswith(('s', 't'))):
+                word = stem
+            break
+    if word.endswith('e'):
+        stem = word[:-1]
+        if _measure(stem) > 1 or (_measure(stem) == 1 and not _cvc(stem)):
+            word = stem
+    if word.endswith('ll') and _measure(word) > 1:
+        word = word[:-1]
+    return word
+
+
+@functools.lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower()
+    if CYRILLIC_RE.search(word):
+        return stem_ru(word)
+    if LATIN_RE.search(word):
+        return stem_en(word)
+    return word
+
+
+def words(text):
+    """Слова текста с их позициями в строке: (начало, конец, слово)."""
+    return [
+        (match.start(), match.end(), match.group())
+        for match in WORD_RE.finditer(text)
+    ]
+
+
+def analyze(text):
+    """Основы слов текста в порядке следования."""
+    return [stem(word) for word in WORD_RE.findall(text)]
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import (
+    FileSystemStorage, Storage, get_storage_class
+)
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+from yatube.settings import MEDIA_STORAGE
+
+DEFAULT_PERMISSIONS = 0o644
+
+
+class AtomicFileSystemStorage(FileSystemStorage):
+    """Файловое хранилище с атомарной записью.
+
+    Файл пишется во временный рядом с целевым и переименовывается,
+    поэтому читатели не видят недописанных файлов. Файл с тем же именем
+    заменяется, а не сохраняется под новым именем: так повторная
+    генерация миниатюры пишет туда же, куда указывает ее key.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+            os.chmod(
+                temp_path, self.file_permissions_mode or DEFAULT_PERMISSIONS
+            )
+            os.replace(temp_path, full_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return name
+
+    def touch(self, name):
+        """Обновляет время изменения файла."""
+        os.utime(self.path(name))
+
+    def scan(self, prefix=''):
+        """(имя, размер, время изменения) всех файлов под prefix."""
+        stack = [prefix.strip('/')]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(self.path(directory)))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                name = f'{directory}/{entry.name}'.lstrip('/')
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                yield name, stat.st_size, stat.st_mtime
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    """Хранилище, в котором имя файла — sha256 его содержимого.
+
+    Каталог из upload_to сохраняется, а внутри него файлы раскладываются
+    по двум уровням подкаталогов из первых символов хеша:
+    posts/ab/cd/abcd...ef.gif. Одинаковые загрузки получают одно имя и
+    записываются один раз, поэтому и миниатюры sorl у них общие. Сколько
+    записей ссылается на файл, считает вызывающий код; хранилище только
+    не пишет файл повторно, а обновляет время его изменения, чтобы
+    сборщик мусора не удалил файл, который снова понадобился.
+
+    Файлы лежат в хранилище MEDIA_STORAGE: в MEDIA_ROOT или в объектном
+    хранилище (core.object_storage).
+    """
+    hash_name = 'sha256'
+    shard_levels = 2
+    shard_width = 2
+
+    @cached_property
+    def backend(self):
+        return get_storage_class(MEDIA_STORAGE)()
+
+    def content_name(self, name, content):
+        digest = hashlib.new(self.hash_name)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        shards = [
+            digest[level * self.shard_width:(level + 1) * self.shard_width]
+            for level in range(self.shard_levels)
+        ]
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(
+            part for part in (directory, *shards, digest + extension) if part
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            self.touch(name)
+            return name
+        return self.backend.save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def delete(self, name):
+        self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+    def touch(self, name):
+        self.backend.touch(name)
+
+    def scan(self, prefix=''):
+        return self.backend.scan(prefix)
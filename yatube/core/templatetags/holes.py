@@ -0,0 +1,34 @@
+from django.template import Library, TemplateSyntaxError
+from django.template.base import token_kwargs
+
+from core.holes import HoleNode
+
+register = Library()
+
+
+@register.tag('hole')
+def do_hole(parser, token):
+    """Персональный фрагмент, который рендерится заново на каждый запрос.
+
+    Страница вокруг него кешируется одна на всех::
+
+        {% load holes %}
+        {% hole author_id=author.pk username=author.username %}
+            .. user-dependent markup ..
+        {% endhole %}
+
+    Внутри видны только аргументы тега и переменные контекстных
+    процессоров. Не ставьте тег внутри {% cache %} и {% swr_cache %}:
+    фрагмент может попасть в кеш уже заполненным для одного читателя.
+    """
+    nodelist = parser.parse(('endhole',))
+    parser.delete_first_token()
+    bits = token.split_contents()[1:]
+    kwargs = token_kwargs(bits, parser, support_legacy=False)
+    if bits:
+        raise TemplateSyntaxError(
+            f'"hole" tag accepts only keyword arguments, got {bits[0]!r}'
+        )
+    number = getattr(parser, 'hole_count', 0)
+    parser.hole_count = number + 1
+    return HoleNode(nodelist, number, kwargs)
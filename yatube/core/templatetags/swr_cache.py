@@ -0,0 +1,76 @@
+from django.core.cache.utils import make_template_fragment_key
+from django.template import (
+    Library, Node, TemplateSyntaxError, VariableDoesNotExist,
+)
+
+from core.dogpile import get_or_compute
+
+register = Library()
+
+
+class SWRCacheNode(Node):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+                 stale_var):
+        self.nodelist = nodelist
+        self.expire_time_var = expire_time_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.stale_var = stale_var
+
+    def resolve_seconds(self, var, context):
+        try:
+            return int(var.resolve(context))
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                f'"swr_cache" tag got an unknown variable: {var.var!r}'
+            )
+        except (ValueError, TypeError):
+            raise TemplateSyntaxError(
+                f'"swr_cache" tag got a non-integer timeout: {var.var!r}'
+            )
+
+    def render(self, context):
+        expire_time = self.resolve_seconds(self.expire_time_var, context)
+        options = {}
+        if self.stale_var is not None:
+            options['stale_timeout'] = self.resolve_seconds(
+                self.stale_var, context
+            )
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time,
+            **options,
+        )
+
+
+@register.tag('swr_cache')
+def do_swr_cache(parser, token):
+    """Как {% cache %}, но с защитой от одновременного пересчета.
+
+    Устаревший фрагмент отдается еще stale секунд, пока его пересчитывает
+    один процесс::
+
+        {% load swr_cache %}
+        {% swr_cache [expire_time] [fragment_name] [var1] .. stale=60 %}
+            .. some expensive processing ..
+        {% endswr_cache %}
+    """
+    nodelist = parser.parse(('endswr_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    stale_var = None
+    if len(tokens) > 3 and tokens[-1].startswith('stale='):
+        stale_var = parser.compile_filter(tokens[-1][len('stale='):])
+        tokens = tokens[:-1]
+    return SWRCacheNode(
+        nodelist, parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(t) for t in tokens[3:]],
+        stale_var,
+    )
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import FileCache, TieredCache
+
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': TEMP_CACHE_DIR,
+    },
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def worker(self, name, **options):
+        """Кеш отдельного процесса: свой L1 поверх общего L2."""
+        options.setdefault('L1_TIMEOUT', 60)
+        cache = TieredCache(name, {'OPTIONS': dict(options, L2='shared')})
+        cache.clear()
+        return cache
+
+    def test_second_get_is_served_from_l1(self):
+        """Повторное чтение не обращается к L2"""
+        cache = self.worker(self.id())
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        stats = cache.stats()
+        self.assertEqual(stats['l1']['hits'], 2)
+        self.assertEqual(stats['l2']['hits'], 0)
+
+    def test_other_worker_reads_l2(self):
+        """Другой процесс получает значение из L2"""
+        writer = self.worker(self.id() + 'writer')
+        reader = self.worker(self.id() + 'reader')
+        writer.set('key', 'value')
+        self.assertEqual(reader.get('key'), 'value')
+        self.assertEqual(reader.stats()['l2']['hits'], 1)
+        self.assertIsNone(reader.get('missing'))
+        self.assertEqual(reader.stats()['l2']['misses'], 1)
+
+    def test_stale_l1_entry_is_revalidated_by_stamp(self):
+        """После L1_TIMEOUT запись сверяется со штампом в L2"""
+        writer = self.worker(self.id() + 'writer')
+        reader = self.worker(self.id() + 'reader', L1_TIMEOUT=0)
+        writer.set('key', 'old')
+        self.assertEqual(reader.get('key'), 'old')
+        self.assertEqual(reader.get('key'), 'old')
+        self.assertEqual(reader.stats()['l1']['revalidations'], 1)
+        writer.set('key', 'new')
+        self.assertEqual(reader.get('key'), 'new')
+        writer.delete('key')
+        self.assertIsNone(reader.get('key'))
+
+    def test_l1_is_bounded(self):
+        """L1 вытесняет давно не использованные записи"""
+        cache = self.worker(self.id(), L1_MAX_ENTRIES=2)
+        for key in ('first', 'second', 'third'):
+            cache.set(key, key)
+        stats = cache.stats()
+        self.assertEqual(stats['l1']['size'], 2)
+        self.assertEqual(stats['l1']['evictions'], 1)
+        self.assertEqual(cache.get('first'), 'first')
+        self.assertEqual(cache.stats()['l2']['hits'], 1)
+
+    def test_get_many_reads_missing_keys_from_l2(self):
+        """get_many берет из L2 только то, чего нет в L1"""
+        writer = self.worker(self.id() + 'writer')
+        reader = self.worker(self.id() + 'reader')
+        writer.set('first', 1)
+        writer.set('second', 2)
+        self.assertEqual(reader.get('first'), 1)
+        self.assertEqual(
+            reader.get_many(['first', 'second', 'missing']),
+            {'first': 1, 'second': 2},
+        )
+        stats = reader.stats()
+        self.assertEqual(stats['l1']['hits'], 1)
+        self.assertEqual(stats['l2']['hits'], 2)
+        self.assertEqual(stats['l2']['misses'], 1)
+
+    def test_value_and_stamp_are_one_l2_entry(self):
+        """Штамп хранится в L2 вместе со значением под тем же ключом"""
+        cache = self.worker(self.id())
+        cache.set('key', 'value')
+        stamp, expires_at, value = caches['shared'].get('key')
+        self.assertEqual(value, 'value')
+        self.assertEqual(len(os.listdir(TEMP_CACHE_DIR)), 1)
+
+    def test_changed_stamp_needs_one_l2_read(self):
+        """Новое значение приходит вместе со штампом одним чтением L2"""
+        writer = self.worker(self.id() + 'writer')
+        reader = self.worker(self.id() + 'reader', L1_TIMEOUT=0)
+        writer.set('key', 'old')
+        reader.get('key')
+        writer.set('key', 'new')
+        self.assertEqual(reader.get('key'), 'new')
+        self.assertEqual(reader.stats()['l2']['hits'], 2)
+
+
+class FileCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+
+    def test_cache_is_bounded(self):
+        """Кеш не растет больше MAX_ENTRIES плюс CULL_EVERY записей"""
+        cache = FileCache(self.location, {'OPTIONS': {
+            'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 5,
+        }})
+        for number in range(100):
+            cache.set(number, number)
+            self.assertLessEqual(len(os.listdir(self.location)), 15)
@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core import dogpile
+from core.dogpile import get_or_compute, lock_path
+from core.file_lock import file_lock
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+})
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='fresh', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_value_is_computed_once(self):
+        """Значение вычисляется один раз и дальше читается из кеша"""
+        for _ in range(3):
+            self.assertEqual(
+                get_or_compute('key', self.compute(), 60), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи ждут одно вычисление"""
+        results = []
+
+        def worker():
+            results.append(get_or_compute(
+                'key', self.compute(delay=0.2), 60, poll_interval=0.01))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_recomputing(self):
+        """Пока другой процесс пересчитывает, отдается устаревшее значение"""
+        get_or_compute('key', self.compute('stale'), 0, stale_timeout=60)
+        with file_lock(lock_path('key'), timeout=0):
+            self.assertEqual(
+                get_or_compute('key', self.compute(), 0, stale_timeout=60),
+                'stale')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_recomputed(self):
+        """Устаревшее значение пересчитывает тот, кто взял блокировку"""
+        get_or_compute('key', self.compute('stale'), 0, stale_timeout=60)
+        self.assertEqual(
+            get_or_compute('key', self.compute(), 60), 'fresh')
+        self.assertEqual(get_or_compute('key', self.compute('other'), 60),
+                         'fresh')
+        with file_lock(lock_path('key'), timeout=0):
+            pass
+
+    def test_gives_up_waiting_for_stuck_lock(self):
+        """Зависшая блокировка не блокирует запрос дольше lock_timeout"""
+        with file_lock(lock_path('key'), timeout=0):
+            value = get_or_compute(
+                'key', self.compute(), 60, lock_timeout=0.1,
+                poll_interval=0.01)
+        self.assertEqual(value, 'fresh')
+
+
+class LockTests(SimpleTestCase):
+    def test_concurrent_lock_has_one_winner(self):
+        """Из одновременных попыток блокировку берет ровно одна"""
+        barrier = threading.Barrier(8)
+        winners = []
+
+        def worker():
+            barrier.wait()
+            lock_file = dogpile._locked('race')
+            if lock_file is not None:
+                winners.append(lock_file)
+                time.sleep(0.05)
+                dogpile._unlock(lock_file)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(winners), 1)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.inverted_index import (
+    InvertedIndex, decode_postings, encode_postings
+)
+from core.stemmer import analyze
+
+
+class StemmerTests(SimpleTestCase):
+    def test_word_forms_share_stem(self):
+        """Формы русских и английских слов сводятся к одной основе"""
+        self.assertEqual(
+            len(set(analyze('котики котиков котиками Котик'))), 1)
+        self.assertEqual(len(set(analyze('connection connected'))), 1)
+        self.assertEqual(analyze('2024 год'), ['2024', 'год'])
+
+
+class InvertedIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.index = InvertedIndex(self.path)
+        self.index.build([
+            (1, 'Котики любят молоко'),
+            (2, 'Собаки и котики'),
+            (3, 'Рыжий кот спит'),
+        ])
+
+    def test_postings_round_trip(self):
+        """Списки вхождений кодируются и декодируются без потерь"""
+        postings = {3: [0, 5], 200: [1], 100000: [7, 8, 300]}
+        self.assertEqual(decode_postings(encode_postings(postings)), postings)
+
+    def test_and_and_phrase_queries(self):
+        """Все слова обязательны, фраза ищется по соседним позициям"""
+        self.assertEqual(self.index.search('котик'), [2, 1])
+        self.assertEqual(self.index.search('котики собаки'), [2])
+        self.assertEqual(self.index.search('"любят молоко"'), [1])
+        self.assertEqual(self.index.search('"молоко любят"'), [])
+        self.assertEqual(self.index.search('слон'), [])
+
+    def test_phrase_does_not_cross_fields(self):
+        """Фраза не склеивается из соседних полей документа"""
+        self.index.add(4, ['первый котик', 'молоко'])
+        self.assertEqual(self.index.search('котик молоко'), [4, 1])
+        self.assertEqual(self.index.search('"котик молоко"'), [])
+
+    def test_updates_are_visible_to_other_readers(self):
+        """Изменения из журнала видны другому экземпляру индекса"""
+        reader = InvertedIndex(self.path)
+        self.assertEqual(reader.search('котики'), [2, 1])
+        self.index.add(4, 'котики в доме')
+        self.index.add(1, 'только молоко')
+        self.index.remove(2)
+        self.assertEqual(reader.search('котики'), [4])
+        self.assertEqual(reader.search('молоко'), [1])
+
+    def test_compact_keeps_results(self):
+        """Сжатие сливает журнал в новый сегмент без изменения выдачи"""
+        reader = InvertedIndex(self.path)
+        self.index.add(4, 'котики в доме')
+        self.index.remove(1)
+        self.index.compact()
+        self.assertFalse(self.index.live)
+        self.assertEqual(reader.search('котики'), [4, 2])
+        self.assertEqual(reader.search('молоко'), [])
+        self.assertEqual(reader.generation, self.index.generation)
+
+    def test_write_does_not_compact(self):
+        """Запись только дописывает журнал; сжатие — по needs_compaction"""
+        generation = self.index.generation
+        with mock.patch('core.inverted_index.SEARCH_COMPACT_MIN_LOG', 0), \
+                mock.patch('core.inverted_index.SEARCH_COMPACT_RATIO', 1):
+            self.assertFalse(self.index.needs_compaction())
+            for _ in range(20):
+                self.index.add(5, 'рыжий котик ' * 20)
+            self.assertTrue(self.index.needs_compaction())
+        self.index.refresh()
+        self.assertEqual(self.index.generation, generation)
+
+    def test_previous_segment_outlives_compaction(self):
+        """Файлы прошлого сегмента удаляются только следующим сжатием"""
+        generation = self.index.generation
+        self.index.compact()
+        self.assertTrue(os.path.exists(self.index._file(generation, 'lex')))
+        self.index.compact()
+        self.assertFalse(os.path.exists(self.index._file(generation, 'lex')))
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.object_storage import MULTIPART, ObjectStorage, S3ObjectStore
+from core.storage import ContentAddressedStorage
+from yatube.settings import OBJECT_STORAGE
+
+
+class ObjectStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        options = {
+            **OBJECT_STORAGE, 'backend': 'local', 'root': self.root,
+            'cdn_url': None, 'signed_urls': True,
+            'multipart_threshold': 10, 'part_size': 10,
+        }
+        patcher = mock.patch('core.object_storage.OBJECT_STORAGE', options)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.storage = ObjectStorage()
+
+    def test_small_and_multipart_saves(self):
+        """Маленький файл пишется одним put, большой — частями"""
+        with mock.patch.object(
+            self.storage.store, 'upload_part',
+            wraps=self.storage.store.upload_part,
+        ) as upload_part:
+            self.storage.save('posts/small.txt', ContentFile(b'tiny'))
+            upload_part.assert_not_called()
+            data = bytes(range(256)) * 2
+            self.storage.save('posts/large.bin', ContentFile(data))
+            self.assertEqual(upload_part.call_count, 52)
+        with self.storage.open('posts/large.bin') as saved:
+            self.assertEqual(saved.read(), data)
+        self.assertEqual(self.storage.size('posts/small.txt'), 4)
+        self.assertEqual(os.listdir(os.path.join(self.root, MULTIPART)), [])
+        directories, files = self.storage.listdir('posts')
+        self.assertEqual(
+            (directories, sorted(files)), ([], ['large.bin', 'small.txt']))
+        self.assertEqual(
+            sorted(name for name, _, _ in self.storage.scan('posts/')),
+            ['posts/large.bin', 'posts/small.txt'])
+        self.storage.delete('posts/small.txt')
+        self.assertFalse(self.storage.exists('posts/small.txt'))
+
+    def test_failed_multipart_is_aborted(self):
+        """Оборванная загрузка частями не оставляет объекта и частей"""
+        content = ContentFile(b'x' * 100)
+        with mock.patch.object(self.storage.store, 'complete_multipart',
+                               side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.storage.save('posts/broken.bin', content)
+        self.assertFalse(self.storage.exists('posts/broken.bin'))
+        self.assertEqual(os.listdir(os.path.join(self.root, MULTIPART)), [])
+
+    def test_signed_and_cdn_urls(self):
+        """Подписанный адрес открывается до срока, CDN-адрес не подписан"""
+        self.storage.save('posts/photo.gif', ContentFile(b'gif'))
+        url = self.storage.url('posts/photo.gif')
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'gif')
+        self.assertEqual(
+            self.client.get(url.replace('signature=', 'signature=x')
+                            ).status_code, 403)
+        with mock.patch('time.time', return_value=time.time() + 7200):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        cdn = ObjectStorage(cdn_url='https://cdn.example.com/')
+        self.assertEqual(cdn.url('posts/photo.gif'),
+                         'https://cdn.example.com/media/posts/photo.gif')
+
+    def test_content_addressed_storage_over_objects(self):
+        """Хранилище по хешу содержимого работает поверх объектов"""
+        with mock.patch('core.storage.MEDIA_STORAGE',
+                        'core.object_storage.ObjectStorage'):
+            storage = ContentAddressedStorage()
+            first = storage.save('posts/a.gif', ContentFile(b'same'))
+            second = storage.save('posts/b.gif', ContentFile(b'same'))
+        self.assertEqual(first, second)
+        self.assertEqual(len(list(storage.scan('posts/'))), 1)
+
+    def test_store_is_shared(self):
+        """Хранилище с одинаковыми параметрами создается один раз"""
+        self.assertIs(ObjectStorage().store, self.storage.store)
+        self.assertIsNot(
+            ObjectStorage(root=tempfile.gettempdir()).store,
+            self.storage.store)
+
+    def test_s3_touch_keeps_headers(self):
+        """Обновление времени объекта S3 сохраняет его заголовки"""
+        store = S3ObjectStore.__new__(S3ObjectStore)
+        store.bucket = 'bucket'
+        store.client = mock.Mock()
+        store.client.head_object.return_value = {
+            'ContentType': 'image/jpeg', 'Metadata': {'refs': '2'},
+            'ContentLength': 3,
+        }
+        store.touch('media/posts/a.jpg')
+        store.client.copy_object.assert_called_once_with(
+            Bucket='bucket', Key='media/posts/a.jpg',
+            CopySource={'Bucket': 'bucket', 'Key': 'media/posts/a.jpg'},
+            MetadataDirective='REPLACE', Metadata={'refs': '2'},
+            ContentType='image/jpeg',
+        )
@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import pubsub, sse
+
+
+class PubSubTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patcher = mock.patch('core.pubsub.PUBSUB_DIR', directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_publish_keeps_newest_id(self):
+        """Канал помнит самый новый id, опоздавшая запись его не откатывает"""
+        self.assertEqual(pubsub.latest('post:1'), 0)
+        pubsub.publish('post:1', 5)
+        pubsub.publish('post:1', 3)
+        self.assertEqual(pubsub.latest('post:1'), 5)
+        self.assertEqual(pubsub.latest('post:2'), 0)
+
+    def test_wait_wakes_on_publish(self):
+        """Подписчик просыпается от публикации, не дожидаясь таймаута"""
+        timer = threading.Timer(0.05, pubsub.publish, ('post:1', 7))
+        timer.start()
+        started = time.monotonic()
+        self.assertEqual(pubsub.wait(['post:2', 'post:1'], 0, 5), 7)
+        self.assertLess(time.monotonic() - started, 1)
+        timer.join()
+
+    def test_wait_times_out(self):
+        """Без новых событий wait возвращает None"""
+        pubsub.publish('post:1', 7)
+        self.assertIsNone(pubsub.wait(['post:1'], 7, 0.05))
+
+
+class EventStreamTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for patcher in (
+            mock.patch('core.pubsub.PUBSUB_DIR', directory),
+            mock.patch('core.sse.SSE_HEARTBEAT', 0.02),
+            mock.patch('core.sse.SSE_MAX_DURATION', 0.1),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.events = {1: 'first', 2: 'second'}
+
+    def fetch(self, after):
+        return [
+            (pk, sse.event(pk, 'test', text))
+            for pk, text in sorted(self.events.items()) if pk > after
+        ]
+
+    def test_stream_replays_and_sends_heartbeats(self):
+        """Поток дочитывает события после id клиента и шлет heartbeat"""
+        response = sse.stream(['test'], 1, self.fetch)
+        content = b''.join(response.streaming_content)
+        response.close()
+        self.assertIn(b'id: 2\nevent: test\ndata: "second"\n\n', content)
+        self.assertNotIn(b'first', content)
+        self.assertIn(b': ping\n\n', content)
+
+    def test_connections_are_capped(self):
+        """Потоки сверх лимита получают 503 и освобождают место при закрытии"""
+        with mock.patch('core.sse.SSE_MAX_CONNECTIONS', 1):
+            first = sse.stream(['test'], 0, self.fetch)
+            self.assertEqual(
+                sse.stream(['test'], 0, self.fetch).status_code, 503)
+            first.close()
+            second = sse.stream(['test'], 0, self.fetch)
+            self.assertEqual(second.status_code, 200)
+            second.close()
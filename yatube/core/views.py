@@ -1,4 +1,10 @@
+import time
+
+from django.http import FileResponse, Http404, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from core.object_storage import LocalObjectStore, ObjectStorage
 
 
 def page_not_found(request, exception):
@@ -7,3 +13,21 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def media_object(request, key):
+    """Отдает объект LocalObjectStore по подписанному адресу."""
+    store = ObjectStorage().store
+    if not isinstance(store, LocalObjectStore):
+        raise Http404
+    expires = request.GET.get('expires', '')
+    if not expires.isdigit() or int(expires) < time.time():
+        return HttpResponseForbidden()
+    if not constant_time_compare(
+        request.GET.get('signature', ''), store.signature(key, expires)
+    ):
+        return HttpResponseForbidden()
+    try:
+        return FileResponse(store.get(key))
+    except (FileNotFoundError, ValueError):
+        raise Http404
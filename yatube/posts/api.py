@@ -0,0 +1,420 @@
+"""JSON API /api/v1/ для постов, групп, комментариев и подписок.
+
+Объекты сериализуются словарями из полей FIELDS без форм и шаблонов;
+?fields= оставляет в ответе только перечисленные поля, и связанные
+таблицы подключаются через select_related, только если их поля нужны,
+поэтому число запросов не зависит от размера страницы. Списки
+листаются курсором (?cursor=, ?limit=) через CursorPaginator, посты
+можно получить пачкой по ?ids=1,2,3. У ответов на чтение есть ETag:
+при совпадении If-None-Match возвращается 304 без тела.
+
+Запись — JSON в теле запроса; поля проверяют те же формы, что и на
+сайте, поэтому картинку поста можно передать токеном загрузки частями
+в поле upload. Пользователь определяется сессией, как на сайте.
+
+Ленты для опроса (/api/v1/feed/...) отдают только посты новее
+присланного клиентом ?since= или 304, если их нет: id самого нового
+поста ленты берется из feed_cache.latest_ids без обращения к базе.
+"""
+import functools
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.http import (
+    Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+)
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.http import require_http_methods
+
+from core.query_budget import query_budget
+from posts import feed_cache
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CURSOR_PARAM, CursorPaginator
+from yatube.settings import API_MAX_IDS, API_MAX_LIMIT, NUMBER_OF_PAGES
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group_id,
+    'image': lambda post: StorageURL(post.image) if post.image else None,
+    'comments_count': lambda post: post.comments_count,
+}
+GROUP_FIELDS = {
+    'id': lambda group: group.pk,
+    'title': lambda group: group.title,
+    'slug': lambda group: group.slug,
+    'description': lambda group: group.description,
+    'posts_count': lambda group: group.posts_count,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created,
+}
+FOLLOW_FIELDS = {
+    'id': lambda follow: follow.pk,
+    'author': lambda follow: follow.author.username,
+}
+# Поля, для которых нужна связанная таблица.
+RELATED = {'author': 'author'}
+
+
+class StorageURL(str):
+    """Адрес файла, который помнит имя файла в хранилище.
+
+    Подписанные адреса меняются от запроса к запросу, поэтому ETag
+    считается по имени.
+    """
+
+    def __new__(cls, file):
+        url = super().__new__(cls, file.url)
+        url.name = file.name
+        return url
+
+
+def _stable(data):
+    """data с именами файлов вместо их адресов."""
+    if isinstance(data, StorageURL):
+        return data.name
+    if isinstance(data, dict):
+        return {key: _stable(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_stable(value) for value in data]
+    return data
+
+
+class ApiError(Exception):
+    def __init__(self, status, errors):
+        super().__init__(errors)
+        self.status = status
+        self.errors = errors
+
+
+def _json(request, data, status=200):
+    """Ответ JSON с ETag по содержимому; на чтение может вернуть 304."""
+    response = JsonResponse(data, status=status, encoder=DjangoJSONEncoder,
+                            json_dumps_params={'ensure_ascii': False})
+    if request.method == 'GET' and status == 200:
+        content = json.dumps(_stable(data), cls=DjangoJSONEncoder)
+        etag = quote_etag(hashlib.md5(content.encode()).hexdigest())
+        response['ETag'] = etag
+        return get_conditional_response(
+            request, etag=etag, response=response
+        )
+    return response
+
+
+def _error(status, errors):
+    return JsonResponse({'errors': errors}, status=status,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(budget, methods):
+    """Обертка view API: бюджет запросов, методы и ошибки в JSON."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return _error(error.status, error.errors)
+            except Http404:
+                return _error(404, {'detail': 'Не найдено.'})
+        return query_budget(budget)(require_http_methods(methods)(wrapper))
+    return decorator
+
+
+def _fields(request, fields):
+    """Запрошенные через ?fields= поля в порядке fields."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(fields)
+    names = {name.strip() for name in requested.split(',') if name.strip()}
+    unknown = names - set(fields)
+    if unknown:
+        raise ApiError(400, {
+            'fields': 'Нет полей: {}.'.format(', '.join(sorted(unknown)))
+        })
+    return [name for name in fields if name in names]
+
+
+def _related(names):
+    return [RELATED[name] for name in names if name in RELATED]
+
+
+def _serialize(obj, fields, names):
+    return {name: fields[name](obj) for name in names}
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', NUMBER_OF_PAGES))
+    except ValueError:
+        raise ApiError(400, {'limit': 'Нужно целое число.'})
+    return min(max(limit, 1), API_MAX_LIMIT)
+
+
+def _page(request, queryset, fields, ordering):
+    names = _fields(request, fields)
+    paginator = CursorPaginator(
+        queryset.select_related(*_related(names)), _limit(request), ordering
+    )
+    page = paginator.get_page(cursor=request.GET.get(CURSOR_PARAM))
+    return _json(request, {
+        'results': [_serialize(obj, fields, names) for obj in page],
+        'next': paginator.next_cursor,
+        'previous': paginator.previous_cursor,
+    })
+
+
+def _require_user(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, {'detail': 'Нужно войти.'})
+
+
+def _body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError(400, {'detail': 'Тело запроса должно быть JSON.'})
+    if not isinstance(data, dict):
+        raise ApiError(400, {'detail': 'Тело запроса должно быть объектом.'})
+    return data
+
+
+def _validate(form):
+    if not form.is_valid():
+        raise ApiError(400, form.errors.get_json_data())
+    return form
+
+
+def _ids(request):
+    try:
+        ids = [int(pk) for pk in request.GET['ids'].split(',') if pk]
+    except ValueError:
+        raise ApiError(400, {'ids': 'Нужны целые числа через запятую.'})
+    if len(ids) > API_MAX_IDS:
+        raise ApiError(400, {'ids': f'Не больше {API_MAX_IDS} id.'})
+    return ids
+
+
+def _post_queryset(request):
+    posts = Post.objects.all()
+    if 'group' in request.GET:
+        posts = posts.filter(group__slug=request.GET['group'])
+    if 'author' in request.GET:
+        posts = posts.filter(author__username=request.GET['author'])
+    return posts
+
+
+@api_view(12, ['GET', 'POST'])
+def posts(request):
+    """Лента постов, пачка постов по ?ids= или создание поста."""
+    if request.method == 'POST':
+        _require_user(request)
+        form = _validate(PostForm(_body(request), user=request.user))
+        post = form.save(commit=False)
+        post.author = request.user
+        post.save()
+        form.discard_upload()
+        return _json(request, _serialize(
+            post, POST_FIELDS, list(POST_FIELDS)
+        ), status=201)
+    if 'ids' in request.GET:
+        ids = _ids(request)
+        names = _fields(request, POST_FIELDS)
+        found = Post.objects.select_related(*_related(names)).in_bulk(ids)
+        return _json(request, {'results': [
+            _serialize(found[pk], POST_FIELDS, names)
+            for pk in ids if pk in found
+        ]})
+    return _page(
+        request, _post_queryset(request), POST_FIELDS, ('-pub_date', '-pk')
+    )
+
+
+@api_view(13, ['GET', 'PATCH', 'DELETE'])
+def post(request, post_id):
+    """Пост; автор может изменить или удалить его."""
+    if request.method == 'GET':
+        names = _fields(request, POST_FIELDS)
+        found = get_object_or_404(
+            Post.objects.select_related(*_related(names)), pk=post_id
+        )
+        return _json(request, _serialize(found, POST_FIELDS, names))
+    _require_user(request)
+    found = get_object_or_404(Post.objects.select_related('author'),
+                              pk=post_id)
+    if found.author_id != request.user.pk:
+        raise ApiError(403, {'detail': 'Менять пост может только автор.'})
+    if request.method == 'DELETE':
+        found.delete()
+        return HttpResponse(status=204)
+    data = {'text': found.text, 'group': found.group_id, **_body(request)}
+    form = _validate(PostForm(data, instance=found, user=request.user))
+    form.save()
+    form.discard_upload()
+    return _json(request, _serialize(found, POST_FIELDS, list(POST_FIELDS)))
+
+
+@api_view(7, ['GET', 'POST'])
+def comments(request, post_id):
+    """Комментарии поста по времени или новый комментарий."""
+    if request.method == 'POST':
+        _require_user(request)
+        found = get_object_or_404(Post, pk=post_id)
+        comment = _validate(CommentForm(_body(request))).save(commit=False)
+        comment.author = request.user
+        comment.post = found
+        comment.save()
+        return _json(request, _serialize(
+            comment, COMMENT_FIELDS, list(COMMENT_FIELDS)
+        ), status=201)
+    return _page(
+        request, Comment.objects.filter(post_id=post_id), COMMENT_FIELDS,
+        ('created', 'pk'),
+    )
+
+
+@api_view(1, ['GET'])
+def groups(request):
+    return _page(request, Group.objects.all(), GROUP_FIELDS, ('title', 'pk'))
+
+
+@api_view(1, ['GET'])
+def group(request, slug):
+    names = _fields(request, GROUP_FIELDS)
+    found = get_object_or_404(Group, slug=slug)
+    return _json(request, _serialize(found, GROUP_FIELDS, names))
+
+
+@api_view(13, ['GET', 'POST'])
+def follows(request):
+    """Подписки пользователя или новая подписка на {"author": имя}."""
+    _require_user(request)
+    if request.method == 'POST':
+        username = _body(request).get('author')
+        author = get_object_or_404(User, username=str(username))
+        if author == request.user:
+            raise ApiError(400, {'author': 'Нельзя подписаться на себя.'})
+        follow, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+        return _json(request, _serialize(
+            follow, FOLLOW_FIELDS, list(FOLLOW_FIELDS)
+        ), status=201 if created else 200)
+    return _page(
+        request, Follow.objects.filter(user=request.user), FOLLOW_FIELDS,
+        ('-pk',),
+    )
+
+
+@api_view(9, ['DELETE'])
+def follow(request, username):
+    _require_user(request)
+    deleted, _ = Follow.objects.filter(
+        user=request.user, author__username=username
+    ).delete()
+    if not deleted:
+        raise Http404
+    return HttpResponse(status=204)
+
+
+def _since(request):
+    try:
+        return int(request.GET.get('since', 0))
+    except ValueError:
+        raise ApiError(400, {'since': 'Нужен id поста.'})
+
+
+def _latest_posts(feeds):
+    """Для feed_cache.latest_ids: id самых новых постов лент."""
+    latest = {}
+    author_ids = {}
+    for feed in feeds:
+        kind, _, pk = feed.partition(':')
+        if feed == feed_cache.INDEX:
+            latest[feed] = Post.objects.aggregate(latest=Max('pk'))['latest']
+        elif kind == 'group':
+            latest[feed] = Post.objects.filter(
+                group_id=pk
+            ).aggregate(latest=Max('pk'))['latest']
+        else:
+            author_ids[int(pk)] = feed
+    if author_ids:
+        rows = (
+            Post.objects
+            .filter(author_id__in=author_ids)
+            .order_by()
+            .values('author_id')
+            .annotate(latest=Max('pk'))
+            .values_list('author_id', 'latest')
+        )
+        for author_id, pk in rows:
+            latest[author_ids[author_id]] = pk
+    return latest
+
+
+def _delta(request, posts, feeds):
+    """Посты лент новее ?since= или 304, если новых нет.
+
+    В ответе since — новая отметка для следующего опроса; truncated
+    значит, что новых постов больше API_MAX_LIMIT и ленту стоит
+    перезагрузить целиком.
+    """
+    since = _since(request)
+    names = _fields(request, POST_FIELDS)
+    latest = max(
+        feed_cache.latest_ids(feeds, _latest_posts).values(), default=0
+    )
+    if 'since' in request.GET and latest <= since:
+        return HttpResponseNotModified()
+    results = []
+    if 'since' in request.GET:
+        results = list(posts.filter(pk__gt=since).select_related(
+            *_related(names)
+        ).order_by('-pub_date', '-pk')[:API_MAX_LIMIT + 1])
+    return JsonResponse({
+        'results': [
+            _serialize(post, POST_FIELDS, names)
+            for post in results[:API_MAX_LIMIT]
+        ],
+        'since': latest,
+        'truncated': len(results) > API_MAX_LIMIT,
+    }, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False})
+
+
+@api_view(4, ['GET'])
+def feed(request):
+    """Новые посты главной ленты."""
+    return _delta(request, Post.objects.all(), [feed_cache.INDEX])
+
+
+@api_view(4, ['GET'])
+def group_feed(request, group_id):
+    """Новые посты ленты группы."""
+    return _delta(
+        request, Post.objects.filter(group_id=group_id),
+        [feed_cache.group_feed(group_id)],
+    )
+
+
+@api_view(5, ['GET'])
+def follow_feed(request):
+    """Новые посты ленты подписок: отметка — максимум по авторам."""
+    _require_user(request)
+    author_ids = list(Follow.objects.filter(user=request.user).values_list(
+        'author_id', flat=True
+    ))
+    return _delta(
+        request, Post.objects.filter(author_id__in=author_ids),
+        [feed_cache.profile_feed(author_id) for author_id in author_ids],
+    )
@@ -0,0 +1,129 @@
+"""Денормализованные счетчики постов, комментариев, подписок и ссылок
+на файлы картинок.
+
+Счетчики меняются F-выражениями в том же запросе, что и проверка
+строки, поэтому параллельные записи не теряют обновления. Расхождения
+исправляет команда recount.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, MediaFile, Post, UserStats
+
+User = get_user_model()
+
+
+def _shift(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def shift_user(user_id, field, delta):
+    """Меняет счетчик пользователя; при первом росте создает строку."""
+    updated = _shift(UserStats.objects.filter(user_id=user_id), field, delta)
+    if not updated and delta > 0:
+        recount_users(User.objects.filter(pk=user_id))
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        _shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def move_group(old_group_id, new_group_id):
+    """Переносит пост между группами одним UPDATE."""
+    if old_group_id is None or new_group_id is None:
+        shift_group(old_group_id, -1)
+        shift_group(new_group_id, 1)
+        return
+    Group.objects.filter(
+        Q(pk=new_group_id) | Q(pk=old_group_id, posts_count__gte=1)
+    ).update(posts_count=Case(
+        When(pk=old_group_id, then=F('posts_count') - 1),
+        default=F('posts_count') + 1,
+    ))
+
+
+def shift_post(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def shift_media(name, delta):
+    """Меняет число ссылок на файл; при первой ссылке создает строку."""
+    if not name:
+        return
+    if delta > 0:
+        # INSERT OR IGNORE: строку, созданную параллельной записью, не
+        # перезаписываем, а прибавляем к ней тем же UPDATE.
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name)], ignore_conflicts=True
+        )
+    _shift(MediaFile.objects.filter(pk=name), 'refs', delta)
+
+
+def _count(model, field, outer='pk'):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def _repair(queryset, **expressions):
+    """Пересчитывает поля и возвращает число исправленных строк."""
+    drifted = queryset.annotate(**{
+        f'actual_{field}': expression
+        for field, expression in expressions.items()
+    })
+    differs = Q()
+    for field in expressions:
+        differs |= ~Q(**{field: F(f'actual_{field}')})
+    drifted = drifted.filter(differs)
+    drifted_ids = list(drifted.values_list('pk', flat=True))
+    if drifted_ids:
+        queryset.filter(pk__in=drifted_ids).update(**expressions)
+    return len(drifted_ids)
+
+
+def recount_users(users=None):
+    if users is None:
+        users = User.objects.all()
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in users.filter(
+            stats__isnull=True
+        ).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    return _repair(
+        UserStats.objects.filter(user__in=users),
+        posts_count=_count(Post, 'author', 'user'),
+        followers_count=_count(Follow, 'author', 'user'),
+        following_count=_count(Follow, 'user', 'user'),
+    )
+
+
+def recount_media():
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name) for name in Post.objects.exclude(
+            image=''
+        ).order_by().values_list('image', flat=True).distinct()],
+        ignore_conflicts=True,
+    )
+    return _repair(MediaFile.objects.all(), refs=_count(Post, 'image', 'name'))
+
+
+def recount():
+    """Пересчитывает все счетчики; возвращает число исправленных строк."""
+    return {
+        'users': recount_users(),
+        'posts': _repair(
+            Post.objects.all(), comments_count=_count(Comment, 'post')
+        ),
+        'groups': _repair(
+            Group.objects.all(), posts_count=_count(Post, 'group')
+        ),
+        'media': recount_media(),
+    }
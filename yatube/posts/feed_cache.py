@@ -0,0 +1,121 @@
+"""Версионированный кеш фрагментов лент.
+
+Ключ фрагмента включает вид ленты, ее текущее поколение и позицию
+страницы (курсор или номер). При изменении поста поколение ленты
+меняется, и старые фрагменты просто перестают читаться, поэтому
+их не нужно искать и удалять, а время жизни можно держать большим.
+
+Тем же поколением версионируется id самого нового поста ленты, по
+которому опрашивающие клиенты узнают, появилось ли что-то новое, и
+число постов автора под поколением его профиля.
+"""
+import time
+
+from django.core.cache import cache
+
+from posts.models import UserStats
+from posts.paginators import CURSOR_PARAM, PAGE_PARAM
+from yatube.settings import FEED_CACHE_TIMEOUT
+
+GENERATION_KEY = 'feed-generation:{}'
+LATEST_KEY = 'feed-latest:{}:{}'
+POSTS_COUNT_KEY = 'feed-posts-count:{}:{}'
+INDEX = 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def post_feeds(post, group_ids=()):
+    """Ленты, в которых показывается пост."""
+    feeds = {INDEX, profile_feed(post.author_id)}
+    for group_id in (post.group_id, *group_ids):
+        if group_id is not None:
+            feeds.add(group_feed(group_id))
+    return feeds
+
+
+def _new_generation():
+    # Поколение не должно повторяться, даже если ключ был вытеснен.
+    return time.time_ns()
+
+
+def generation(feed):
+    key = GENERATION_KEY.format(feed)
+    value = cache.get(key)
+    if value is None:
+        value = _new_generation()
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+    return value
+
+
+def bump(feeds):
+    """Меняет поколения лент, чем делает устаревшими их фрагменты."""
+    cache.set_many(
+        {GENERATION_KEY.format(feed): _new_generation() for feed in feeds},
+        None,
+    )
+
+
+def feed_cache_key(feed, request):
+    """Ключ фрагмента страницы ленты для тега {% cache %}."""
+    position = request.GET.get(CURSOR_PARAM) or request.GET.get(PAGE_PARAM)
+    return f'{feed}:{generation(feed)}:{position or ""}'
+
+
+def latest_ids(feeds, compute):
+    """id самого нового поста для каждой ленты из feeds.
+
+    Значения берутся из кеша под текущим поколением ленты, а для лент
+    без значения считаются одним вызовом compute(feeds) -> {лента: id}.
+    Пустая лента получает 0.
+    """
+    feeds = list(feeds)
+    generations = cache.get_many(
+        [GENERATION_KEY.format(feed) for feed in feeds]
+    )
+    keys = {}
+    for feed in feeds:
+        value = generations.get(GENERATION_KEY.format(feed))
+        if value is None:
+            value = generation(feed)
+        keys[feed] = LATEST_KEY.format(feed, value)
+    found = cache.get_many(keys.values())
+    latest = {
+        feed: found[key] for feed, key in keys.items() if key in found
+    }
+    missing = [feed for feed in feeds if feed not in latest]
+    if missing:
+        computed = compute(missing)
+        computed = {feed: computed.get(feed) or 0 for feed in missing}
+        cache.set_many(
+            {keys[feed]: value for feed, value in computed.items()},
+            FEED_CACHE_TIMEOUT,
+        )
+        latest.update(computed)
+    return latest
+
+
+def author_posts_count(author_id, known=None):
+    """Число постов автора из кеша под поколением его профиля.
+
+    known — уже прочитанное из базы число: им кеш заполняется без
+    лишнего запроса.
+    """
+    feed = profile_feed(author_id)
+    key = POSTS_COUNT_KEY.format(feed, generation(feed))
+    count = cache.get(key)
+    if count is None:
+        count = known
+        if count is None:
+            count = UserStats.objects.filter(
+                user_id=author_id
+            ).values_list('posts_count', flat=True).first() or 0
+        cache.set(key, count, FEED_CACHE_TIMEOUT)
+    return count
@@ -1,12 +1,65 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+
+from posts import uploads
+from posts.images import ingest
 from posts.models import Post, Comment
 
 
 class PostForm(forms.ModelForm):
+    """Форма поста; картинку можно передать файлом или токеном
+    законченной загрузки частями в поле upload."""
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image',)
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.upload_token = None
+        self.upload = None
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return ingest(image)
+        token = self.data.get('upload')
+        if not token or self.user is None:
+            return image
+        upload = uploads.completed(token, self.user.pk)
+        if upload is None:
+            raise ValidationError('Загрузка не найдена или не закончена.')
+        self.upload_token = token
+        self.upload = upload
+        try:
+            image = ingest(upload)
+        except ValidationError:
+            self.close_upload()
+            raise
+        if image is not upload:
+            # Картинка пересжата в память, файл загрузки больше не нужен.
+            self.close_upload()
+        return image
+
+    def _post_clean(self):
+        super()._post_clean()
+        if self.errors:
+            self.close_upload()
+
+    def close_upload(self):
+        """Закрывает файл загрузки; картинка из него читается при
+        сохранении поста, поэтому до него файл остается открытым."""
+        if self.upload is not None:
+            self.upload.close()
+            self.upload = None
+
+    def discard_upload(self):
+        """Удаляет загрузку, из которой уже сохранена картинка."""
+        self.close_upload()
+        uploads.discard(self.upload_token)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,73 @@
+"""Прием картинок постов.
+
+ingest проверяет число пикселей по заголовку, не декодируя картинку.
+Слишком большие снимки уменьшаются до IMAGE_MAX_SIDE; для JPEG
+декодирование сразу идет в уменьшенном масштабе (draft), поэтому
+многомегапиксельное фото не разворачивается в память целиком. Поворот
+из EXIF применяется к пикселям. Картинки, которые не нужно уменьшать
+или поворачивать, сохраняются как есть, без перекодирования.
+
+Варианты для srcset в WebP/AVIF и JPEG создает posts.thumbnails уже
+из уменьшенного оригинала.
+"""
+import os
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+from yatube.settings import IMAGE_MAX_PIXELS, IMAGE_MAX_SIDE, IMAGE_QUALITY
+
+EXIF_ORIENTATION = 0x0112
+
+
+def _needs_processing(image):
+    if max(image.size) > IMAGE_MAX_SIDE:
+        return True
+    return image.getexif().get(EXIF_ORIENTATION, 1) != 1
+
+
+def _flatten(image):
+    """RGB для JPEG: прозрачность ложится на белый фон."""
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def ingest(upload):
+    """Проверенная и при необходимости уменьшенная картинка для
+    сохранения в Post.image.
+
+    Бросает ValidationError, если картинка больше IMAGE_MAX_PIXELS.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Не удалось прочитать картинку.')
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Картинка {width}×{height} больше допустимых '
+            f'{IMAGE_MAX_PIXELS // 1_000_000} мегапикселей.'
+        )
+    if getattr(image, 'is_animated', False) or not _needs_processing(image):
+        upload.seek(0)
+        return upload
+    # draft выбирает масштаб декодирования JPEG не меньше нужного.
+    image.draft('RGB', (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    output = BytesIO()
+    _flatten(image).save(
+        output, 'JPEG', quality=IMAGE_QUALITY, optimize=True,
+        progressive=True,
+    )
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{name}.jpg', output.getvalue(), content_type='image/jpeg'
+    )
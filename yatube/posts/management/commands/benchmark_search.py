@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import search
+from posts.models import Post
+
+DEFAULT_QUERIES = ('котики', 'новый пост', '"хороший день"')
+
+
+def like_search(query):
+    """Посты, где каждое слово запроса есть в тексте или комментариях."""
+    posts = Post.objects.all()
+    for word in query.replace('"', ' ').split():
+        posts = posts.filter(
+            Q(text__icontains=word) | Q(comments__text__icontains=word)
+        )
+    return list(posts.distinct().order_by('-pk').values_list('pk', flat=True))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает скорость инвертированного индекса и поиска '
+            'через LIKE')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries',
+            nargs='*',
+            default=DEFAULT_QUERIES,
+            help='Поисковые запросы',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз повторить каждый запрос',
+        )
+        parser.add_argument(
+            '--build',
+            action='store_true',
+            help='Перед замером собрать инвертированный индекс',
+        )
+
+    def measure(self, find, query, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            found = find(query)
+        return (time.perf_counter() - started) * 1000 / repeat, len(found)
+
+    def handle(self, *args, **options):
+        repeat = max(options['repeat'], 1)
+        if options['build']:
+            search.rebuild_inverted(1000)
+        index = search.get_index()
+        for query in options['queries']:
+            index_ms, index_hits = self.measure(
+                search.find_post_ids, query, repeat
+            )
+            like_ms, like_hits = self.measure(like_search, query, repeat)
+            self.stdout.write(
+                f'{query}: индекс {index_ms:.2f} мс ({index_hits}), '
+                f'LIKE {like_ms:.2f} мс ({like_hits}), '
+                f'быстрее в {like_ms / max(index_ms, 0.001):.1f} раз'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Терминов в индексе: {len(index.lexicon)}'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Сливает накопленные изменения полнотекстового индекса'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-needed',
+            action='store_true',
+            help='Сжимать, только если журнал перерос сегмент '
+                 '(для запуска по расписанию)',
+        )
+
+    def handle(self, *args, **options):
+        if search.compact(if_needed=options['if_needed']):
+            self.stdout.write(self.style.SUCCESS('Индекс сжат'))
+        else:
+            self.stdout.write('Сжатие не нужно')
@@ -0,0 +1,172 @@
+import hashlib
+import queue
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts import thumbnails, uploads
+from posts.models import MediaFile, Post
+from yatube.settings import MEDIA_GC_GRACE, UPLOAD_EXPIRY
+
+BATCH_SIZE = 500
+# Сколько найденных файлов обход диска держит впереди удаления.
+QUEUE_SIZE = 10000
+DONE = None
+
+
+def digest(name):
+    """8 байт хеша вместо строки имени: живых путей может быть много.
+
+    Совпадение хешей только оставит лишний файл, но не удалит нужный.
+    """
+    return hashlib.blake2b(name.encode(), digest_size=8).digest()
+
+
+def walk(storage, prefix, older_than, found):
+    """Кладет в found (имя, размер) файлов storage под prefix старше
+    older_than, затем DONE."""
+    try:
+        for name, size, modified in storage.scan(prefix):
+            if modified < older_than:
+                found.put((name, size))
+    finally:
+        found.put(DONE)
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов и миниатюры, на которые ничего не '
+            'ссылается, их записи в key-value store sorl и брошенные '
+            'загрузки частями')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=MEDIA_GC_GRACE,
+            help='Не удалять файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=0,
+            help='Удалять не больше стольких файлов в секунду; 0 — без '
+                 'ограничения',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+
+    def live(self):
+        """Хеши имен картинок, на которые ссылаются посты, и их миниатюр.
+
+        Посты читаются потоком, без загрузки всех строк в память.
+        """
+        live = set()
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).iterator(chunk_size=BATCH_SIZE)
+        referenced = MediaFile.objects.filter(refs__gt=0).values_list(
+            'name', flat=True
+        ).iterator(chunk_size=BATCH_SIZE)
+        for names in (names, referenced):
+            for name in names:
+                live.add(digest(name))
+                for geometry in thumbnails.THUMBNAILS:
+                    live.add(digest(
+                        thumbnails.thumbnail_file(name, geometry).name
+                    ))
+        return live
+
+    def kv_keys_for(self, name):
+        """Ключи store, которые описывают файл name."""
+        if name.startswith(thumbnail_settings.THUMBNAIL_PREFIX):
+            return [add_prefix(ImageFile(name, default.storage).key)]
+        key = thumbnails._source(name).key
+        return [add_prefix(key), add_prefix(key, 'thumbnails')]
+
+    def scan(self, older_than):
+        """Запускает обход хранилищ в потоках, пока этот поток читает
+        базу; возвращает очередь найденных файлов и число обходов."""
+        found = queue.Queue(QUEUE_SIZE)
+        roots = (
+            (self.storage, Post._meta.get_field('image').upload_to),
+            (default.storage, thumbnail_settings.THUMBNAIL_PREFIX),
+        )
+        for walked, prefix in roots:
+            threading.Thread(
+                target=walk, args=(walked, prefix, older_than, found),
+                daemon=True,
+            ).start()
+        return found, len(roots)
+
+    def orphans(self, found, running, live):
+        """(имя, размер) найденных файлов, которых нет среди live."""
+        while running:
+            item = found.get()
+            if item is DONE:
+                running -= 1
+            elif digest(item[0]) not in live:
+                yield item
+
+    def delete(self, name, older_than):
+        """Удаляет файл, если его не использовали снова после обхода;
+        возвращает, удален ли он."""
+        is_thumbnail = name.startswith(thumbnail_settings.THUMBNAIL_PREFIX)
+        file_storage = default.storage if is_thumbnail else self.storage
+        try:
+            modified = file_storage.get_modified_time(name)
+        except FileNotFoundError:
+            return False
+        if modified.timestamp() >= older_than:
+            return False
+        if self.interval:
+            time.sleep(max(self.next_delete - time.monotonic(), 0))
+            self.next_delete = time.monotonic() + self.interval
+        file_storage.delete(name)
+        self.kv_keys.extend(self.kv_keys_for(name))
+        if not is_thumbnail:
+            self.sources.append(name)
+        if len(self.kv_keys) >= BATCH_SIZE:
+            self.forget(self.kv_keys, self.sources)
+        return True
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.interval = 1 / options['rate'] if options['rate'] > 0 else 0
+        self.next_delete = time.monotonic()
+        self.kv_keys, self.sources = [], []
+        self.storage = Post._meta.get_field('image').storage
+        older_than = time.time() - options['grace']
+        found, running = self.scan(older_than)
+        deleted = freed = 0
+        for name, size in self.orphans(found, running, self.live()):
+            if options['verbosity'] > 1:
+                self.stdout.write(name)
+            if dry_run or self.delete(name, older_than):
+                deleted += 1
+                freed += size
+        if not dry_run:
+            self.forget(self.kv_keys, self.sources)
+        expired = uploads.expire(time.time() - UPLOAD_EXPIRY, dry_run)
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {deleted}, {freed / 2 ** 20:.1f} МБ, '
+            f'незаконченных загрузок: {expired}'
+        ))
+
+    def forget(self, kv_keys, sources):
+        """Удаляет записи store и нулевые счетчики ссылок удаленных
+        файлов и очищает списки."""
+        if kv_keys:
+            default.kvstore._delete_raw(*kv_keys)
+        if sources:
+            MediaFile.objects.filter(name__in=sources, refs=0).delete()
+        kv_keys.clear()
+        sources.clear()
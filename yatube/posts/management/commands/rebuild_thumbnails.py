@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.file_lock import file_lock
+from posts import thumbnails
+from posts.models import Post
+from yatube.settings import BASE_DIR
+
+CHECKPOINT = os.path.join(BASE_DIR, 'rebuild_thumbnails.checkpoint')
+
+
+def render(image):
+    """thumbnails.render в процессе пула под той же блокировкой, что и
+    генерация по запросу; ошибка возвращается, чтобы одна битая
+    картинка не останавливала остальные."""
+    try:
+        with file_lock(thumbnails.lock_path(image)):
+            return thumbnails.render(image)
+    except Exception as error:
+        return error
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as checkpoint:
+            return int(checkpoint.read())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_checkpoint(path, post_id):
+    """Атомарно записывает id последнего обработанного поста."""
+    with open(f'{path}.tmp', 'w') as checkpoint:
+        checkpoint.write(str(post_id))
+    os.replace(f'{path}.tmp', path)
+
+
+class Command(BaseCommand):
+    help = ('Создает миниатюры картинок всех постов в несколько процессов '
+            'с продолжением с места остановки')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=os.cpu_count(),
+            help='Сколько процессов создают миниатюры',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=100,
+            help='Сколько постов читать из базы за раз',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=CHECKPOINT,
+            help='Файл с id последнего обработанного поста',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать с первого поста, не глядя на checkpoint',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать и уже готовые миниатюры',
+        )
+
+    def chunks(self, after_id, chunk_size):
+        """Пачки [(id, картинка)] постов с картинками по возрастанию id."""
+        while True:
+            rows = list(Post.objects.filter(pk__gt=after_id).exclude(
+                image=''
+            ).order_by('pk').values_list('pk', 'image')[:chunk_size])
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1][0]
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        after_id = 0 if options['restart'] else read_checkpoint(checkpoint)
+        if after_id:
+            self.stdout.write(f'Продолжаю после поста {after_id}')
+        jobs = max(options['jobs'] or 1, 1)
+        # fork: дочерним процессам достаются настроенный Django и
+        # настройки; в базу они не ходят, store пишет этот процесс.
+        pool = ProcessPoolExecutor(
+            jobs, mp_context=multiprocessing.get_context('fork')
+        ) if jobs > 1 else None
+        rendered = skipped = failed = 0
+        started = time.monotonic()
+        try:
+            for rows in self.chunks(after_id, options['chunk_size']):
+                images = sorted({image for _, image in rows})
+                if not options['force']:
+                    done = thumbnails.current(images)
+                    skipped += len(done)
+                    images = [image for image in images if image not in done]
+                if pool is None:
+                    results = map(render, images)
+                else:
+                    results = pool.map(render, images)
+                for image, result in zip(images, results):
+                    if isinstance(result, Exception):
+                        failed += 1
+                        self.stderr.write(f'{image}: {result}')
+                        continue
+                    thumbnails.store(*result)
+                    rendered += 1
+                write_checkpoint(checkpoint, rows[-1][0])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {rendered}, пропущено готовых: {skipped}, '
+            f'ошибок: {failed}, {rendered / max(elapsed, 0.001):.1f} '
+            f'картинок в секунду'
+        ))
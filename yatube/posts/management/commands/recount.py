@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики и исправляет расхождения'
+
+    def handle(self, *args, **options):
+        repaired = counters.recount()
+        self.stdout.write(self.style.SUCCESS(
+            'Исправлено счетчиков: пользователей {users}, '
+            'постов {posts}, групп {groups}, файлов {media}'.format(
+                **repaired
+            )
+        ))
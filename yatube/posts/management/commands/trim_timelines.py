@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = 'Обрезает ленты подписок длиннее TIMELINE_SIZE записей'
+
+    def handle(self, *args, **options):
+        trimmed = timeline.trim_overfull()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обрезано лент: {trimmed}'
+        ))
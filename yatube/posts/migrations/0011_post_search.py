@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:13
+
+from django.conf import settings
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+import posts.models
+
+
+def create_search_table(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE posts_post_search USING fts5("
+                "text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            if settings.SEARCH_BACKEND == 'fts5':
+                # Иначе каждая запись поста падала бы на отсутствующей
+                # таблице.
+                raise
+            # SQLite собран без FTS5, поиск идет через инвертированный
+            # индекс.
+            return
+        cursor.execute(
+            'INSERT INTO posts_post_search(rowid, text) '
+            'SELECT id, text FROM posts_post'
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    schema_editor.execute('DROP TABLE IF EXISTS posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearch',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='posts.Post')),
+                ('text', posts.models.FullTextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_post_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
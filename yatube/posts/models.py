@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -21,6 +23,11 @@ class Group(models.Model):
         verbose_name='Описание группы',
         help_text='Описание группы',
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число постов',
+    )
 
     def __str__(self):
         return self.title
@@ -54,12 +61,29 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -84,6 +108,13 @@ class Comment(models.Model):
         verbose_name='Дата публикации комментария',
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx'),
+        )
+
     def __str__(self) -> str:
         return self.text[:15]
 
@@ -104,8 +135,139 @@ class Follow(models.Model):
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'author'),
-                name='unique_follow')
+                name='unique_follow'),
+        )
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx'),
         )
 
     def __str__(self) -> str:
         return f'{self.user} подписан на {self.author}'
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя, которые обновляются при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписок',
+    )
+
+    def __str__(self) -> str:
+        return f'Счетчики {self.user}'
+
+
+class MediaFile(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+
+    Картинки хранятся по хешу содержимого, поэтому одинаковые загрузки
+    разных постов — один файл; refs меняется при записи постов.
+    """
+    name = models.CharField(
+        max_length=100,
+        primary_key=True,
+        verbose_name='Имя файла',
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число ссылок',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.name} ({self.refs})'
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора, на которого подписан user.
+
+    Лента материализуется при публикации поста и при подписке, поэтому
+    страница follow_index читается одним диапазоном по индексу
+    (user, -pub_date, -post) без join с Follow.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx'),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.post_id} в ленте {self.user}'
+
+
+class FullTextField(models.TextField):
+    """Колонка виртуальной таблицы FTS5 с lookup match."""
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class PostSearch(models.Model):
+    """Строка полнотекстового индекса постов.
+
+    Модель только читает виртуальную таблицу FTS5, созданную миграцией;
+    пишет в нее posts.search. rank — скрытая колонка FTS5 со значением
+    bm25: чем меньше, тем лучше совпадение.
+    """
+    post = models.OneToOneField(
+        Post,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='+',
+    )
+    text = FullTextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_search'
@@ -0,0 +1,84 @@
+"""Страницы, закешированные для анонимных читателей.
+
+Функции *_modified возвращают время самого нового поста или
+комментария на странице, а post_pages — адреса страниц, которые
+нужно сбросить после записи поста или комментария.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+
+def _newest(posts, comments):
+    moments = (
+        posts.aggregate(newest=Max('pub_date'))['newest'],
+        comments.aggregate(newest=Max('created'))['newest'],
+    )
+    return max(filter(None, moments), default=None)
+
+
+def index_modified(request):
+    return _newest(Post.objects.all(), Comment.objects.all())
+
+
+def group_modified(request, slug):
+    return _newest(
+        Post.objects.filter(group__slug=slug),
+        Comment.objects.filter(post__group__slug=slug),
+    )
+
+
+def profile_modified(request, username):
+    return _newest(
+        Post.objects.filter(author__username=username),
+        Comment.objects.filter(post__author__username=username),
+    )
+
+
+def post_modified(request, post_id):
+    return _newest(
+        Post.objects.filter(pk=post_id),
+        Comment.objects.filter(post_id=post_id),
+    )
+
+
+def profile_page(username):
+    return reverse('posts:profile', kwargs={'username': username})
+
+
+def post_page(post_id):
+    return reverse('posts:post_detail', kwargs={'post_id': post_id})
+
+
+def post_pages(post, group_ids=()):
+    """Адреса страниц, на которых показывается пост.
+
+    Число постов автора на страницах его постов — дыра со своим кешем
+    (feed_cache.author_posts_count), поэтому сами страницы не сбрасываются.
+    """
+    if Post.author.is_cached(post):
+        username = post.author.username
+    else:
+        username = User.objects.filter(pk=post.author_id).values_list(
+            'username', flat=True
+        ).first()
+    pages = {reverse('posts:index'), post_page(post.pk)}
+    if username is not None:
+        pages.add(profile_page(username))
+    group_ids = {pk for pk in (post.group_id, *group_ids) if pk is not None}
+    slugs = []
+    if post.group_id is not None and Post.group.is_cached(post):
+        slugs.append(post.group.slug)
+        group_ids.discard(post.group_id)
+    if group_ids:
+        slugs.extend(Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True
+        ))
+    pages.update(
+        reverse('posts:group_list', kwargs={'slug': slug}) for slug in slugs
+    )
+    return pages
@@ -0,0 +1,274 @@
+import base64
+import binascii
+import bisect
+import heapq
+import json
+import time
+from itertools import islice
+from operator import itemgetter
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+from yatube.settings import NUMBER_OF_PAGES
+
+CURSOR_PARAM = 'cursor'
+PAGE_PARAM = 'page'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Страница выбирается по непрозрачному курсору, в котором закодированы
+    направление и ключ крайней записи соседней страницы. Второе поле
+    ключа (id) делает порядок стабильным для записей с одинаковым
+    pub_date.
+
+    Общее число страниц не считается: ``number`` и ``num_pages``
+    описывают положение страницы среди соседей, поэтому стандартные
+    ``has_next``/``has_previous`` у ``Page`` продолжают работать.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-pk')):
+        self.ordering = tuple(ordering)
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page
+        )
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.count = 0
+        self.num_pages = 1
+
+    def get_page(self, number=None, cursor=None):
+        """Страница по курсору, по номеру (старые ссылки ``?page=``)
+        или первая страница, если параметры некорректны."""
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                return self.first_page()
+            return self.cursor_page(direction, values)
+        if number:
+            try:
+                number = int(number)
+            except (TypeError, ValueError):
+                number = 1
+            if number > 1:
+                return self.offset_page(number)
+        return self.first_page()
+
+    def first_page(self):
+        return self.offset_page(1)
+
+    def offset_page(self, number):
+        bottom = (number - 1) * self.per_page
+        rows = self.fetch(None, True, self.per_page + 1, offset=bottom)
+        has_next = len(rows) > self.per_page
+        return self._build_page(
+            rows[:self.per_page], number, has_next, number > 1
+        )
+
+    def cursor_page(self, direction, values):
+        if direction == NEXT:
+            rows = self.fetch(values, True, self.per_page + 1)
+            has_next = len(rows) > self.per_page
+            return self._build_page(rows[:self.per_page], 2, has_next, True)
+        rows = self.fetch(values, False, self.per_page + 1)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return self._build_page(rows, 1 + has_previous, True, has_previous)
+
+    def fetch(self, values, forward, limit, offset=0):
+        """Строки строго после (forward) или до ключа values.
+
+        При forward=False строки возвращаются в обратном порядке.
+        """
+        return list(self.fetch_queryset(
+            self.object_list, self.ordering, values, forward
+        )[offset:offset + limit])
+
+    def fetch_queryset(self, queryset, ordering, values, forward):
+        if values is not None:
+            queryset = queryset.filter(
+                self._keyset(ordering, values, forward)
+            )
+        if not forward:
+            queryset = queryset.order_by(
+                *[self._reverse(field) for field in ordering]
+            )
+        return queryset
+
+    def _build_page(self, rows, number, has_next, has_previous):
+        self.count = len(rows)
+        self.num_pages = number + has_next
+        self.next_cursor = None
+        self.previous_cursor = None
+        if rows and has_next:
+            self.next_cursor = self.encode_cursor(NEXT, rows[-1])
+        if rows and has_previous:
+            self.previous_cursor = self.encode_cursor(PREVIOUS, rows[0])
+        if not rows and has_previous:
+            # Страница за пределами ленты: назад ведем на первую.
+            self.previous_cursor = ''
+        return Page(rows, number, self)
+
+    def _field_names(self, ordering=None):
+        return [field.lstrip('-') for field in ordering or self.ordering]
+
+    def _get_field(self, name, model=None):
+        opts = (model or self.object_list.model)._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    @staticmethod
+    def _reverse(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _keyset(ordering, values, forward):
+        """Лексикографическое условие «строго после/до ключа»."""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def key(self, obj):
+        """Значения полей ключа сортировки для объекта."""
+        return [
+            self._get_field(name).value_from_object(obj)
+            for name in self._field_names()
+        ]
+
+    def encode_cursor(self, direction, obj):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self.key(obj)
+        ]
+        raw = json.dumps([direction, values]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw.decode())
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        names = self._field_names()
+        if direction not in (NEXT, PREVIOUS) or len(values) != len(names):
+            raise InvalidCursor(cursor)
+        try:
+            return direction, [
+                self._get_field(name).to_python(value)
+                for name, value in zip(names, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor(cursor)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Keyset-пагинация по нескольким отсортированным потокам.
+
+    Каждый поток — queryset со своим ordering, ключи всех потоков
+    сравнимы между собой. Из каждого потока читается не больше строк,
+    чем нужно для страницы, потоки сливаются k-way слиянием через heapq.
+    Стоимость слияния за запрос копится в ``merge_stats``.
+    """
+
+    def __init__(self, streams, per_page):
+        streams = [
+            (queryset.order_by(*ordering), tuple(ordering))
+            for queryset, ordering in streams
+        ]
+        self.streams = streams
+        self.orderings = {
+            queryset.model: ordering for queryset, ordering in streams
+        }
+        self.merge_stats = {'streams': len(streams), 'rows': 0, 'ms': 0.0}
+        first, ordering = streams[0]
+        super().__init__(first, per_page, ordering)
+
+    def fetch(self, values, forward, limit, offset=0):
+        started = time.monotonic()
+        descending = self.ordering[0].startswith('-') == forward
+        sorted_streams = []
+        for queryset, ordering in self.streams:
+            rows = list(self.fetch_queryset(
+                queryset, ordering, values, forward
+            )[:offset + limit])
+            self.merge_stats['rows'] += len(rows)
+            sorted_streams.append(
+                [(self._stream_key(row, ordering), row) for row in rows]
+            )
+        merged = heapq.merge(
+            *sorted_streams, key=itemgetter(0), reverse=descending
+        )
+        rows = [row for _, row in islice(merged, offset, offset + limit)]
+        self.merge_stats['ms'] += (time.monotonic() - started) * 1000
+        return rows
+
+    def _stream_key(self, obj, ordering):
+        return tuple(
+            self._get_field(name, type(obj)).value_from_object(obj)
+            for name in self._field_names(ordering)
+        )
+
+    def key(self, obj):
+        return list(self._stream_key(obj, self.orderings[type(obj)]))
+
+
+class IdListCursorPaginator(CursorPaginator):
+    """Keyset-пагинация по готовому списку id, отсортированному по
+    убыванию (например, результатам поиска вне базы).
+
+    Границы страницы ищутся бисекцией по списку, строки страницы
+    загружаются одним запросом через in_bulk.
+    """
+
+    def __init__(self, queryset, ids, per_page):
+        self.ids = list(ids)
+        super().__init__(queryset, per_page, ordering=('-pk',))
+
+    def fetch(self, values, forward, limit, offset=0):
+        # Отрицание переводит список по убыванию в список по возрастанию.
+        negated = [-pk for pk in self.ids]
+        if values is None:
+            start, stop = offset, offset + limit
+        elif forward:
+            start = bisect.bisect_right(negated, -values[0]) + offset
+            stop = start + limit
+        else:
+            stop = bisect.bisect_left(negated, -values[0]) - offset
+            start = max(stop - limit, 0)
+        ids = self.ids[start:max(stop, 0)]
+        if not forward:
+            ids.reverse()
+        rows = self.object_list.in_bulk(ids)
+        return [rows[pk] for pk in ids if pk in rows]
+
+
+def get_request_page(request, paginator):
+    """Страница для запроса: ``?cursor=`` или старый ``?page=``."""
+    return paginator.get_page(
+        number=request.GET.get(PAGE_PARAM),
+        cursor=request.GET.get(CURSOR_PARAM),
+    )
+
+
+def paginate(request, queryset, per_page=NUMBER_OF_PAGES,
+             ordering=('-pub_date', '-pk')):
+    """Страница ленты из queryset для запроса."""
+    return get_request_page(
+        request, CursorPaginator(queryset, per_page, ordering)
+    )
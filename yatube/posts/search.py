@@ -0,0 +1,310 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой SEARCH_BACKEND.
+
+fts5 — виртуальная таблица SQLite posts_post_search со своей копией
+текста, rowid в ней равен id поста. Результаты сортируются по bm25,
+курсор строится по (rank, post_id).
+
+inverted — InvertedIndex из core.inverted_index в SEARCH_INDEX_DIR, для
+баз без FTS5. Ищет и по комментариям: id документа — id поста в
+старших битах и id комментария в младших DOC_BITS (0 — текст поста),
+поэтому новый комментарий добавляет в журнал только себя. Все слова
+запроса обязательны в одном документе, фразы берутся в кавычки;
+результаты идут от новых постов к старым, курсор строится по id поста.
+
+Сигналы переиндексируют пост при сохранении и убирают при удалении;
+записи мимо сигналов (update, bulk_create) подбирает команда
+rebuild_search_index.
+"""
+import functools
+import re
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from core.inverted_index import InvertedIndex
+from core.stemmer import analyze, stem, words
+from posts.models import Comment, Post, PostSearch
+from posts.paginators import (
+    IdListCursorPaginator, get_request_page, paginate
+)
+from yatube.settings import (
+    NUMBER_OF_PAGES, SEARCH_BACKEND, SEARCH_INDEX_DIR
+)
+
+FTS5 = 'fts5'
+INVERTED = 'inverted'
+TABLE = PostSearch._meta.db_table
+ORDERING = ('rank', 'post_id')
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 10
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+DOC_BITS = 32
+
+SearchResult = namedtuple('SearchResult', 'post snippet rank')
+
+
+def parse_query(text):
+    """FTS5-запрос из пользовательского ввода.
+
+    Каждое слово ищется как префикс, чтобы находились другие формы
+    слова; синтаксис FTS5 из ввода не пропускается.
+    """
+    terms = TERM_RE.findall(text.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(text):
+    """Результаты поиска с фрагментами текста, лучшие первыми."""
+    query = parse_query(text)
+    if not query:
+        return PostSearch.objects.none()
+    return PostSearch.objects.filter(text__match=query).annotate(
+        snippet=RawSQL(
+            f'snippet({TABLE}, 0, %s, %s, %s, %s)',
+            (HIGHLIGHT_START, HIGHLIGHT_END, '…', SNIPPET_TOKENS),
+        )
+    ).select_related('post__author', 'post__group').order_by(*ORDERING)
+
+
+def highlight(snippet):
+    """HTML фрагмента с найденными словами в <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+def get_index():
+    """Инвертированный индекс, открытый в этом процессе."""
+    return _open_index(SEARCH_INDEX_DIR)
+
+
+@functools.lru_cache(maxsize=None)
+def _open_index(path):
+    return InvertedIndex(path)
+
+
+def _post_doc(post_id):
+    return post_id << DOC_BITS
+
+
+def _comment_doc(post_id, comment_id):
+    return post_id << DOC_BITS | comment_id
+
+
+def find_post_ids(text):
+    """id постов, где нашлись текст или комментарии, по убыванию."""
+    post_ids = {doc >> DOC_BITS for doc in get_index().search(text)}
+    return sorted(post_ids, reverse=True)
+
+
+def _snippet(text, stems):
+    """Фрагмент text вокруг первого найденного слова, в разметке FTS5."""
+    text_words = words(text)
+    found = [
+        i for i, (_, _, word) in enumerate(text_words) if stem(word) in stems
+    ]
+    if not found:
+        return None
+    first = max(min(found[0] - 2, len(text_words) - SNIPPET_TOKENS), 0)
+    last = min(first + SNIPPET_TOKENS, len(text_words))
+    parts = ['…'] if first else []
+    position = text_words[first][0]
+    for i in range(first, last):
+        start, end, word = text_words[i]
+        parts.append(text[position:start])
+        if i in found:
+            word = f'{HIGHLIGHT_START}{word}{HIGHLIGHT_END}'
+        parts.append(word)
+        position = end
+    if last < len(text_words):
+        parts.append('…')
+    return ''.join(parts)
+
+
+def _inverted_results(text, posts):
+    stems = set(analyze(text))
+    comments = {}
+    for post_id, comment in Comment.objects.filter(
+        post__in=posts
+    ).order_by('pk').values_list('post_id', 'text'):
+        comments.setdefault(post_id, []).append(comment)
+    results = []
+    for post in posts:
+        snippets = (
+            _snippet(source, stems)
+            for source in (post.text, *comments.get(post.pk, ()))
+        )
+        snippet = next(filter(None, snippets), None)
+        results.append(SearchResult(post, snippet or post.text, None))
+    return results
+
+
+def results_page(request, text):
+    """Страница результатов поиска для запроса.
+
+    Элементы страницы — объекты с полями post, snippet и rank.
+    """
+    if SEARCH_BACKEND != INVERTED:
+        return paginate(request, search(text), ordering=ORDERING)
+    posts = Post.objects.select_related('author', 'group')
+    page = get_request_page(request, IdListCursorPaginator(
+        posts, find_post_ids(text) if text else (), NUMBER_OF_PAGES
+    ))
+    page.object_list = _inverted_results(text, page.object_list)
+    return page
+
+
+def index_post(post, replace=True):
+    if SEARCH_BACKEND == INVERTED:
+        get_index().add(_post_doc(post.pk), post.text)
+        return
+    with connection.cursor() as cursor:
+        if replace:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk]
+            )
+        cursor.execute(
+            f'INSERT INTO {TABLE}(rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def unindex_post(post_id):
+    if SEARCH_BACKEND == INVERTED:
+        # Документы комментариев убирает сигнал удаления комментария.
+        get_index().remove(_post_doc(post_id))
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_comment(comment):
+    """Индексирует комментарий; в FTS5 комментарии не ищутся."""
+    if SEARCH_BACKEND == INVERTED:
+        get_index().add(
+            _comment_doc(comment.post_id, comment.pk), comment.text
+        )
+
+
+def unindex_comment(comment):
+    if SEARCH_BACKEND == INVERTED:
+        get_index().remove(_comment_doc(comment.post_id, comment.pk))
+
+
+def _reindex_batch(after_id, batch_size):
+    """Переиндексирует посты с id после after_id; возвращает их id."""
+    rows = list(Post.objects.filter(pk__gt=after_id).order_by(
+        'pk'
+    ).values_list('pk', 'text')[:batch_size])
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not rows:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid > %s', [after_id]
+            )
+            return []
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid > %s AND rowid <= %s',
+            [after_id, rows[-1][0]],
+        )
+        cursor.executemany(
+            f'INSERT INTO {TABLE}(rowid, text) VALUES (%s, %s)', rows
+        )
+    return [pk for pk, _ in rows]
+
+
+def _batches(batch_size):
+    """Пачки постов [(id, текст)] с их комментариями [(id, текст)]."""
+    after_id = 0
+    while True:
+        rows = list(Post.objects.filter(pk__gt=after_id).order_by(
+            'pk'
+        ).values_list('pk', 'text')[:batch_size])
+        if not rows:
+            return
+        comments = {}
+        for post_id, pk, text in Comment.objects.filter(
+            post_id__in=[pk for pk, _ in rows]
+        ).order_by('pk').values_list('post_id', 'pk', 'text'):
+            comments.setdefault(post_id, []).append((pk, text))
+        yield rows, comments
+        after_id = rows[-1][0]
+
+
+def rebuild_inverted(batch_size):
+    indexed = 0
+
+    def documents():
+        nonlocal indexed
+        for rows, comments in _batches(batch_size):
+            indexed += len(rows)
+            for pk, text in rows:
+                yield _post_doc(pk), text
+                for comment_id, comment in comments.get(pk, ()):
+                    yield _comment_doc(pk, comment_id), comment
+
+    get_index().build(documents())
+    return indexed
+
+
+def rebuild(batch_size=1000):
+    """Переиндексирует все посты пачками; возвращает число постов.
+
+    В FTS5 каждая пачка заменяет свой диапазон id в отдельной
+    транзакции, инвертированный индекс собирается в новый сегмент;
+    поиск работает и во время перестройки.
+    """
+    if SEARCH_BACKEND == INVERTED:
+        return rebuild_inverted(batch_size)
+    indexed = 0
+    after_id = 0
+    while True:
+        ids = _reindex_batch(after_id, batch_size)
+        if not ids:
+            break
+        indexed += len(ids)
+        after_id = ids[-1]
+    compact()
+    return indexed
+
+
+def compact(if_needed=False):
+    """Сливает изменения индекса: журнал инвертированного индекса в
+    новый сегмент, сегменты FTS5 в один.
+
+    С if_needed журнал сливается, только если перерос сегмент; FTS5
+    сливает сегменты сам и оптимизируется только без if_needed.
+    Возвращает, было ли сжатие.
+    """
+    if SEARCH_BACKEND == INVERTED:
+        index = get_index()
+        if if_needed and not index.needs_compaction():
+            return False
+        index.compact()
+        return True
+    if if_needed:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return True
+
+
+def serialize(result):
+    post = result.post
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'snippet': highlight(result.snippet),
+        'rank': result.rank,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group else None,
+    }
@@ -0,0 +1,197 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from core import page_cache
+from posts import (
+    counters, feed_cache, pages, search, streams, thumbnails, timeline
+)
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+# id постов, которые удаляются в этом потоке. Django рассылает
+# post_delete каскадно удаляемых комментариев до удаления самого поста,
+# и все, что сделал бы каждый из них, сделает сигнал удаления поста.
+_deleting = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'post_ids'):
+        _deleting.post_ids = set()
+    return _deleting.post_ids
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_post(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        saved = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first() or (None, None)
+        instance._saved_group_id, instance._saved_image = saved
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post(sender, instance, **kwargs):
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_user(instance.author_id, 'posts_count', 1)
+        counters.shift_group(instance.group_id, 1)
+        return
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    if saved_group_id != instance.group_id:
+        counters.move_group(saved_group_id, instance.group_id)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.shift_user(instance.author_id, 'posts_count', -1)
+    counters.shift_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def count_media_refs(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    saved_image = None if created else getattr(instance, '_saved_image', None)
+    if saved_image != instance.image.name:
+        counters.shift_media(saved_image, -1)
+        counters.shift_media(instance.image.name, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_media_refs(sender, instance, **kwargs):
+    counters.shift_media(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    if instance.post_id not in _deleting_posts():
+        counters.shift_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, raw=False,
+                           **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def publish_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        streams.publish_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        streams.publish_comment(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.shift_user(instance.user_id, 'following_count', 1)
+        counters.shift_user(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift_user(instance.user_id, 'following_count', -1)
+    counters.shift_user(instance.author_id, 'followers_count', -1)
+    timeline.purge(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    saved_group_id = getattr(instance, '_saved_group_id', None)
+    feed_cache.bump(feed_cache.post_feeds(instance, (saved_group_id,)))
+    page_cache.purge(pages.post_pages(instance, (saved_group_id,)))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, raw=False, **kwargs):
+    if raw or instance.post_id in _deleting_posts():
+        return
+    if Comment.post.is_cached(instance):
+        post = instance.post
+    else:
+        post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        feed_cache.bump(feed_cache.post_feeds(post))
+        page_cache.purge(pages.post_pages(post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge(
+            {pages.profile_page(instance.user.username),
+             pages.profile_page(instance.author.username)}
+        )
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, created, raw=False,
+                    update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'text' in update_fields):
+        search.index_post(instance, replace=not created)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment_text(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment_text(sender, instance, **kwargs):
+    search.unindex_comment(instance)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    saved_image = getattr(instance, '_saved_image', None)
+    if created or saved_image != instance.image.name:
+        thumbnails.schedule(instance)
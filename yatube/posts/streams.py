@@ -0,0 +1,73 @@
+"""Потоки событий: новые комментарии поста и новые посты подписок.
+
+Комментарий публикуется в канал своего поста, пост — в канал автора;
+поток ленты подписок слушает каналы всех авторов из подписок. id
+события — первичный ключ комментария или поста, поэтому пропущенное
+при переподключении дочитывается из базы. Данные событий — те же
+словари, что отдает API.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from core import pubsub, sse
+from posts.api import COMMENT_FIELDS, POST_FIELDS
+from posts.models import Comment, Post
+from yatube.settings import API_MAX_LIMIT
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+
+def publish_comment(comment):
+    channel, pk = post_channel(comment.post_id), comment.pk
+    transaction.on_commit(lambda: pubsub.publish(channel, pk))
+
+
+def publish_post(post):
+    channel, pk = author_channel(post.author_id), post.pk
+    transaction.on_commit(lambda: pubsub.publish(channel, pk))
+
+
+def _serialize(obj, fields):
+    return {name: getter(obj) for name, getter in fields.items()}
+
+
+def _events(queryset, name, fields):
+    def fetch(after):
+        rows = queryset.filter(pk__gt=after).select_related(
+            'author'
+        ).order_by('pk')[:API_MAX_LIMIT]
+        return [
+            (row.pk, sse.event(row.pk, name, _serialize(row, fields)))
+            for row in rows
+        ]
+    return fetch
+
+
+def _start(request, queryset):
+    """Последний id, отданный клиенту, или текущий для нового клиента."""
+    after = sse.last_event_id(request)
+    if after is None:
+        after = queryset.aggregate(latest=Max('pk'))['latest'] or 0
+    return after
+
+
+def comment_stream(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id)
+    return sse.stream(
+        [post_channel(post_id)], _start(request, comments),
+        _events(comments, 'comment', COMMENT_FIELDS),
+    )
+
+
+def follow_stream(request, author_ids):
+    posts = Post.objects.filter(author_id__in=author_ids)
+    return sse.stream(
+        [author_channel(author_id) for author_id in author_ids],
+        _start(request, posts), _events(posts, 'post', POST_FIELDS),
+    )
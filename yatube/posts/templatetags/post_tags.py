@@ -0,0 +1,38 @@
+from django import template
+
+from posts import feed_cache, search, thumbnails
+from posts.forms import CommentForm
+from posts.models import Follow
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author_id):
+    user = context['user']
+    return user.is_authenticated and Follow.objects.filter(
+        user=user, author_id=author_id
+    ).exists()
+
+
+@register.simple_tag
+def author_posts_count(author_id):
+    return feed_cache.author_posts_count(author_id)
+
+
+@register.simple_tag
+def comment_form():
+    return CommentForm()
+
+
+@register.filter
+def highlight(snippet):
+    return search.highlight(snippet)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image):
+    """Карточка картинки поста с srcset и ленивой загрузкой."""
+    if not image:
+        return {}
+    return thumbnails.picture(image)
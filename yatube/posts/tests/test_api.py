@@ -0,0 +1,263 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetMixin
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class ApiTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.other = User.objects.create_user(username='test_other')
+        cls.group = Group.objects.create(
+            title='test_title', slug='test_slug',
+            description='test_description',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'test_post_{i}', group=cls.group)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def send(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json')
+
+    def test_posts_list_by_cursor(self):
+        """Лента постов листается курсором без повторов"""
+        url = reverse('posts:api_posts')
+        first = self.client.get(url, {'limit': 3}).json()
+        second = self.client.get(
+            url, {'limit': 3, 'cursor': first['next']}).json()
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+        self.assertIsNone(second['next'])
+        self.assertEqual(first['results'][0]['author'], 'test_author')
+
+    def test_sparse_fieldsets(self):
+        """?fields= оставляет только запрошенные поля"""
+        url = reverse('posts:api_post', kwargs={'post_id': self.posts[0].pk})
+        response = self.client.get(url, {'fields': 'id,text'})
+        self.assertEqual(
+            response.json(), {'id': self.posts[0].pk, 'text': 'test_post_0'})
+        response = self.client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_by_ids(self):
+        """?ids= возвращает посты одним запросом в порядке id"""
+        ids = [self.posts[2].pk, self.posts[0].pk, 10 ** 6]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('posts:api_posts'),
+                {'ids': ','.join(map(str, ids))},
+            )
+        self.assertEqual(len(context), 1)
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']], ids[:2])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов не зависит от размера страницы"""
+        url = reverse('posts:api_posts')
+        for limit in (1, 5):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(1):
+                    self.client.get(url, {'limit': limit})
+
+    def test_etag(self):
+        """Повторный запрос с If-None-Match получает 304"""
+        url = reverse('posts:api_groups')
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'][0]['slug'], 'test_slug')
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_ignores_signed_image_urls(self):
+        """ETag считается по имени картинки, а не по подписанному адресу"""
+        Post.objects.filter(pk=self.posts[0].pk).update(image='posts/a.gif')
+        url = reverse('posts:api_post', kwargs={'post_id': self.posts[0].pk})
+        storage = Post._meta.get_field('image').storage
+        signatures = iter(range(10))
+        with mock.patch.object(
+            storage, 'url',
+            side_effect=lambda name: f'/{name}?sig={next(signatures)}',
+        ):
+            first = self.client.get(url)
+            second = self.client.get(url)
+        self.assertNotEqual(first.json()['image'], second.json()['image'])
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_create_and_edit_post(self):
+        """Пост создает пользователь, а меняет и удаляет только автор"""
+        url = reverse('posts:api_posts')
+        data = {'text': 'api_post', 'group': self.group.pk}
+        self.assertEqual(
+            self.send(self.client, 'post', url, data).status_code, 401)
+        self.assertEqual(
+            self.send(self.author_client, 'post', url, {}).status_code, 400)
+        response = self.send(self.author_client, 'post', url, data)
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(pk=response.json()['id'])
+        self.assertEqual((post.author, post.group), (self.user, self.group))
+        url = reverse('posts:api_post', kwargs={'post_id': post.pk})
+        response = self.send(
+            self.other_client, 'patch', url, {'text': 'hacked'})
+        self.assertEqual(response.status_code, 403)
+        response = self.send(
+            self.author_client, 'patch', url, {'text': 'edited'})
+        self.assertEqual(response.json()['group'], self.group.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'edited')
+        response = self.author_client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+
+    def test_comments(self):
+        """Комментарии создаются и читаются по времени"""
+        url = reverse(
+            'posts:api_comments', kwargs={'post_id': self.posts[0].pk})
+        for text in ('first', 'second'):
+            response = self.send(
+                self.other_client, 'post', url, {'text': text})
+            self.assertEqual(response.status_code, 201)
+        response = self.client.get(url, {'fields': 'author,text'})
+        self.assertEqual(response.json()['results'], [
+            {'author': 'test_other', 'text': 'first'},
+            {'author': 'test_other', 'text': 'second'},
+        ])
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_follow(self):
+        """Подписка создается, показывается и удаляется"""
+        url = reverse('posts:api_follows')
+        response = self.send(
+            self.other_client, 'post', url, {'author': 'test_author'})
+        self.assertEqual(response.status_code, 201)
+        response = self.other_client.get(url)
+        self.assertEqual(
+            [follow['author'] for follow in response.json()['results']],
+            ['test_author'],
+        )
+        url = reverse('posts:api_follow', kwargs={'username': 'test_author'})
+        self.assertEqual(self.other_client.delete(url).status_code, 204)
+        self.assertEqual(self.other_client.delete(url).status_code, 404)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_views_within_budget(self):
+        """API укладывается в закрепленный бюджет запросов"""
+        post_url = reverse(
+            'posts:api_post', kwargs={'post_id': self.posts[0].pk})
+        for url in (
+            reverse('posts:api_posts'),
+            post_url,
+            reverse('posts:api_comments', kwargs={
+                'post_id': self.posts[0].pk}),
+            reverse('posts:api_groups'),
+            reverse('posts:api_group', kwargs={'slug': 'test_slug'}),
+            reverse('posts:api_follows'),
+            reverse('posts:api_feed') + '?since=1',
+            reverse('posts:api_group_feed', kwargs={
+                'group_id': self.group.pk}) + '?since=1',
+            reverse('posts:api_follow_feed') + '?since=1',
+        ):
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.author_client, url)
+
+
+class DeltaFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.follower = User.objects.create_user(username='test_follower')
+        cls.stranger = User.objects.create_user(username='test_stranger')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.group = Group.objects.create(title='test_title', slug='test_slug')
+        cls.post = Post.objects.create(
+            author=cls.user, text='test_post', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def poll(self, client, url, since):
+        return client.get(url, {'since': since})
+
+    def test_high_water_mark(self):
+        """Без since лента отдает только отметку для опроса"""
+        response = self.client.get(reverse('posts:api_feed')).json()
+        self.assertEqual(response['since'], self.post.pk)
+        self.assertEqual(response['results'], [])
+
+    def test_not_modified_without_queries(self):
+        """Опрос без новых постов получает 304 без запросов к базе"""
+        url = reverse('posts:api_feed')
+        self.assertEqual(self.poll(self.client, url, 0).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.poll(self.client, url, self.post.pk)
+        self.assertEqual(response.status_code, 304)
+
+    def test_returns_only_new_posts(self):
+        """Лента отдает только посты новее since"""
+        url = reverse('posts:api_feed')
+        self.poll(self.client, url, self.post.pk)
+        new = Post.objects.create(author=self.stranger, text='new_post')
+        response = self.poll(self.client, url, self.post.pk).json()
+        self.assertEqual(
+            [post['id'] for post in response['results']], [new.pk])
+        self.assertEqual(response['since'], new.pk)
+        self.assertFalse(response['truncated'])
+
+    def test_group_feed(self):
+        """Лента группы не видит постов вне группы"""
+        url = reverse(
+            'posts:api_group_feed', kwargs={'group_id': self.group.pk})
+        Post.objects.create(author=self.user, text='no_group')
+        self.assertEqual(
+            self.poll(self.client, url, self.post.pk).status_code, 304)
+        new = Post.objects.create(
+            author=self.stranger, text='in_group', group=self.group)
+        response = self.poll(self.client, url, self.post.pk).json()
+        self.assertEqual(
+            [post['id'] for post in response['results']], [new.pk])
+
+    def test_follow_feed(self):
+        """Лента подписок видит только посты авторов из подписок"""
+        url = reverse('posts:api_follow_feed')
+        self.assertEqual(self.poll(self.client, url, 0).status_code, 401)
+        Post.objects.create(author=self.stranger, text='stranger_post')
+        self.assertEqual(self.poll(
+            self.follower_client, url, self.post.pk).status_code, 304)
+        new = Post.objects.create(author=self.user, text='followed_post')
+        response = self.poll(self.follower_client, url, self.post.pk).json()
+        self.assertEqual(
+            [post['id'] for post in response['results']], [new.pk])
+
+    def test_truncated(self):
+        """Если новых постов больше лимита, ответ помечается truncated"""
+        for i in range(2):
+            Post.objects.create(author=self.user, text=f'new_post_{i}')
+        with mock.patch('posts.api.API_MAX_LIMIT', 1):
+            response = self.poll(
+                self.client, reverse('posts:api_feed'), self.post.pk).json()
+        self.assertEqual(len(response['results']), 1)
+        self.assertTrue(response['truncated'])
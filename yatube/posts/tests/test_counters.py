@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, Group, Comment, Follow, UserStats
+
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.follower = User.objects.create_user(username='test_follower')
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug='test_slug',
+            description='test_description',
+        )
+        cls.other_group = Group.objects.create(
+            title='test_other_title',
+            slug='test_other_slug',
+            description='test_description',
+        )
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос в другую группу и удаление поста"""
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'test_text', 'group': self.group.pk},
+        )
+        post = Post.objects.get()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'test_text', 'group': self.other_group.pk},
+        )
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+        Post.objects.get().delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарии учитываются в счетчике поста"""
+        post = Post.objects.create(author=self.author, text='test_text')
+        self.follower_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'test_comment'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def delete_queries(self, comments):
+        post = Post.objects.create(author=self.author, text='test_text')
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.follower, text='test_comment')
+            for _ in range(comments)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        return len(queries)
+
+    def test_post_delete_ignores_cascaded_comments(self):
+        """Число запросов при удалении поста не зависит от комментариев"""
+        self.assertEqual(self.delete_queries(1), self.delete_queries(50))
+        self.assertFalse(Comment.objects.exists())
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счетчики обоих пользователей"""
+        kwargs = {'username': self.author.username}
+        self.follower_client.get(
+            reverse('posts:profile_follow', kwargs=kwargs))
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.follower).following_count, 1)
+        self.follower_client.get(
+            reverse('posts:profile_unfollow', kwargs=kwargs))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.follower).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """recount исправляет разошедшиеся счетчики"""
+        Post.objects.create(
+            author=self.author, text='test_text', group=self.group)
+        Follow.objects.create(user=self.follower, author=self.author)
+        UserStats.objects.update(posts_count=7, followers_count=7)
+        Group.objects.update(posts_count=7)
+        UserStats.objects.filter(user=self.follower).delete()
+        call_command('recount', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.follower).following_count, 1)
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -62,12 +63,13 @@ class PostCreateFormTests(TestCase):
             follow=True,
         )
         self.assertEqual(Post.objects.count(), post_count + 1)
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 author=self.user,
                 text='test_text',
                 group=self.group.pk,
-                image='posts/small.gif',
+                image=f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif',
             ).exists()
         )
 
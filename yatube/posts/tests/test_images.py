@@ -0,0 +1,54 @@
+from io import BytesIO
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.images import EXIF_ORIENTATION, ingest
+
+
+def uploaded_jpeg(size, orientation=None):
+    output = BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    Image.new('RGB', size, 'red').save(output, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(
+        'photo.jpeg', output.getvalue(), content_type='image/jpeg'
+    )
+
+
+class IngestTests(SimpleTestCase):
+    def test_small_image_is_kept_as_is(self):
+        """Картинку, которую не нужно менять, не перекодируют"""
+        upload = uploaded_jpeg((100, 50))
+        self.assertIs(ingest(upload), upload)
+
+    def test_large_image_is_downscaled(self):
+        """Слишком большая картинка уменьшается до IMAGE_MAX_SIDE"""
+        with mock.patch('posts.images.IMAGE_MAX_SIDE', 200):
+            result = ingest(uploaded_jpeg((800, 400)))
+        self.assertEqual(result.name, 'photo.jpg')
+        self.assertEqual(Image.open(result).size, (200, 100))
+
+    def test_exif_orientation_is_applied(self):
+        """Поворот из EXIF применяется к пикселям"""
+        result = ingest(uploaded_jpeg((100, 50), orientation=6))
+        image = Image.open(result)
+        self.assertEqual(image.size, (50, 100))
+        self.assertEqual(image.getexif().get(EXIF_ORIENTATION, 1), 1)
+
+    def test_too_many_pixels_are_rejected(self):
+        """Картинка больше IMAGE_MAX_PIXELS отклоняется формой"""
+        with mock.patch('posts.images.IMAGE_MAX_PIXELS', 1000):
+            with self.assertRaises(ValidationError):
+                ingest(uploaded_jpeg((100, 50)))
+            form = PostForm(
+                data={'text': 'с картинкой'},
+                files={'image': uploaded_jpeg((100, 50))},
+            )
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,81 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, Group, Comment, Follow
+
+
+User = get_user_model()
+FULL_SCAN = re.compile(r'SCAN (TABLE )?(?P<table>\w+)(?! USING)\s*$')
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class FeedIndexesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.follower = User.objects.create_user(username='test_follower')
+        cls.group = Group.objects.create(
+            title='test_title',
+            slug='test_slug',
+            description='test_description',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        for i in range(15):
+            cls.post = Post.objects.create(
+                author=cls.user,
+                text=f'test_post_text_{i}',
+                group=cls.group,
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.follower, text='test_comment')
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def capture(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.follower_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        ]
+
+    def assert_no_full_scans(self, url, queries):
+        for sql in queries:
+            for step in self.explain(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertIsNone(FULL_SCAN.search(step))
+                    self.assertNotIn(TEMP_SORT, step)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не сканируют таблицы целиком и не сортируют"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'test_author'}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            response, queries = self.capture(url)
+            self.assert_no_full_scans(url, queries)
+            next_cursor = response.context['page_obj'].paginator.next_cursor
+            next_url = f'{url}?cursor={next_cursor}'
+            self.assert_no_full_scans(next_url, self.capture(next_url)[1])
+
+    def test_post_detail_queries_use_indexes(self):
+        """Комментарии поста читаются по индексу (post, created)"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.assert_no_full_scans(url, self.capture(url)[1])
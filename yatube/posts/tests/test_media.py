@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts import thumbnails
+from posts.models import MediaFile, Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\x4c\x01', b'\x44\x01')
+
+
+def uploaded_gif(name='small.gif', content=SMALL_GIF):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def refs(self, name):
+        return MediaFile.objects.get(pk=name).refs
+
+    def test_identical_uploads_are_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом с именем по хешу"""
+        first, second = (
+            Post.objects.create(author=self.user, text=f'пост {i}',
+                                image=uploaded_gif(f'photo{i}.GIF'))
+            for i in range(2)
+        )
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.gif$')
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)])
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    def test_thumbnails_are_shared(self):
+        """Посты с одной картинкой используют одни миниатюры"""
+        first, second = (
+            Post.objects.create(author=self.user, text=f'пост {i}',
+                                image=uploaded_gif())
+            for i in range(2)
+        )
+        self.assertEqual(
+            thumbnails.thumbnail_file(first.image).name,
+            thumbnails.thumbnail_file(second.image).name,
+        )
+
+    def test_refs_follow_post_changes(self):
+        """Ссылки на файл меняются при смене картинки и удалении поста"""
+        first = Post.objects.create(
+            author=self.user, text='пост', image=uploaded_gif())
+        second = Post.objects.create(
+            author=self.user, text='пост', image=uploaded_gif())
+        name = first.image.name
+        second.image = uploaded_gif(content=OTHER_GIF)
+        second.save()
+        self.assertNotEqual(second.image.name, name)
+        self.assertEqual(self.refs(name), 1)
+        self.assertEqual(self.refs(second.image.name), 1)
+        first.delete()
+        self.assertEqual(self.refs(name), 0)
+
+    def test_recount_repairs_refs(self):
+        """recount исправляет разошедшиеся ссылки на файлы"""
+        post = Post.objects.create(
+            author=self.user, text='пост', image=uploaded_gif())
+        MediaFile.objects.all().delete()
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.refs(post.image.name), 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GcMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.kept = Post.objects.create(
+            author=self.user, text='пост', image=uploaded_gif())
+        orphan = Post.objects.create(
+            author=self.user, text='пост', image=uploaded_gif(
+                content=OTHER_GIF))
+        self.orphan = orphan.image.name
+        thumbnails.ensure(self.kept.image.name)
+        thumbnails.ensure(self.orphan)
+        orphan.delete()
+        self.files = {
+            name: os.path.join(TEMP_MEDIA_ROOT, name) for name in (
+                self.kept.image.name,
+                thumbnails.lookup(self.kept.image.name).name,
+                self.orphan,
+                thumbnails.lookup(self.orphan).name,
+            )
+        }
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def age(self):
+        old = time.time() - 2 * 24 * 60 * 60
+        for path in self.files.values():
+            os.utime(path, (old, old))
+
+    def exists(self):
+        return [os.path.exists(path) for path in self.files.values()]
+
+    def gc_media(self, **options):
+        out = StringIO()
+        call_command('gc_media', stdout=out, **options)
+        return out.getvalue()
+
+    def test_orphans_are_deleted_with_store_entries(self):
+        """Удаляются файлы без ссылок, их миниатюры и записи store"""
+        self.age()
+        orphan_key = add_prefix(thumbnails._source(self.orphan).key)
+        self.assertTrue(KVStore.objects.filter(key=orphan_key).exists())
+        self.assertIn('Удалено файлов: 2', self.gc_media())
+        self.assertEqual(self.exists(), [True, True, False, False])
+        self.assertFalse(KVStore.objects.filter(key=orphan_key).exists())
+        self.assertFalse(MediaFile.objects.filter(pk=self.orphan).exists())
+        self.assertIsNone(default.kvstore.get(
+            thumbnails.thumbnail_file(self.orphan)))
+        self.assertIsNotNone(thumbnails.lookup(self.kept.image.name))
+
+    def test_dry_run_and_grace_period(self):
+        """Свежие файлы и пробный запуск ничего не удаляют"""
+        self.assertIn('Удалено файлов: 0', self.gc_media())
+        self.age()
+        self.assertIn('Будет удалено файлов: 2', self.gc_media(dry_run=True))
+        self.assertEqual(self.exists(), [True, True, True, True])
+
+    def test_reused_file_is_kept(self):
+        """Снова загруженный файл не удаляется, пока пост не сохранен"""
+        self.age()
+        storage = Post._meta.get_field('image').storage
+        storage.save('posts/again.gif', uploaded_gif(content=OTHER_GIF))
+        self.gc_media()
+        self.assertTrue(os.path.exists(self.files[self.orphan]))
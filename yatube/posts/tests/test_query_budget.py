@@ -0,0 +1,151 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from django.urls import resolve, reverse
+
+from core.query_budget import QueryBudgetMixin
+from posts import urls
+from posts.models import Post, Group, Comment, Follow
+from yatube.settings import NUMBER_OF_PAGES
+
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='test_author', first_name='Test', last_name='Author')
+        cls.follower = User.objects.create_user(username='test_follower')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        for i in range(NUMBER_OF_PAGES + 1):
+            group = Group.objects.create(
+                title=f'test_title_{i}',
+                slug=f'test_slug_{i}',
+                description='test_description',
+            )
+            cls.post = Post.objects.create(
+                author=cls.user,
+                text=f'test_post_text_{i}',
+                group=group,
+            )
+        cls.other_group = Group.objects.create(
+            title='test_other_title',
+            slug='test_other_slug',
+            description='test_description',
+        )
+        for i in range(NUMBER_OF_PAGES):
+            commenter = User.objects.create_user(username=f'commenter_{i}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'comment_{i}')
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_every_view_has_budget(self):
+        """У каждого view из posts.urls закреплен бюджет запросов"""
+        for pattern in urls.urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertTrue(hasattr(pattern.callback, 'query_budget'))
+
+    def test_overrun_is_logged_for_whole_request(self):
+        """Превышение считается по всему запросу, вместе с сессией"""
+        url = reverse('posts:follow_index')
+        view = resolve(url).func
+        queries = self.assertQueryBudget(self.follower_client, url)
+        with mock.patch.object(view, 'query_budget', queries - 1), \
+                self.assertLogs('core.query_budget', 'WARNING') as logs:
+            self.follower_client.get(url)
+        self.assertIn(f'{queries} запросов', logs.output[0])
+
+    def test_read_views_within_budget(self):
+        """Страницы укладываются в закрепленный бюджет запросов"""
+        post_id = self.post.pk
+        read_urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug_0'}),
+            reverse('posts:profile', kwargs={'username': 'test_author'}),
+            reverse('posts:post_detail', kwargs={'post_id': post_id}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', kwargs={'post_id': post_id}),
+        )
+        clients = (self.client, self.author_client, self.follower_client)
+        for url in read_urls:
+            with self.subTest(url=url):
+                for client in clients:
+                    # Бюджет считается для рендера, а не для ответа из кеша.
+                    cache.clear()
+                    self.assertQueryBudget(client, url)
+
+    def test_write_views_within_budget(self):
+        """Запись укладывается в закрепленный бюджет запросов"""
+        post_id = self.post.pk
+        profile_kwargs = {'username': 'test_author'}
+        self.assertQueryBudget(
+            self.follower_client,
+            reverse('posts:add_comment', kwargs={'post_id': post_id}),
+            method='post', data={'text': 'new_comment'},
+        )
+        self.assertQueryBudget(
+            self.follower_client,
+            reverse('posts:profile_unfollow', kwargs=profile_kwargs),
+        )
+        self.assertQueryBudget(
+            self.follower_client,
+            reverse('posts:profile_follow', kwargs=profile_kwargs),
+        )
+        self.assertQueryBudget(
+            self.author_client, reverse('posts:post_create'),
+            method='post', data={'text': 'new_post'},
+        )
+        self.assertQueryBudget(
+            self.author_client,
+            reverse('posts:post_edit', kwargs={'post_id': post_id}),
+            method='post',
+            data={'text': 'edited_post', 'group': self.post.group_id},
+        )
+        # Смена группы пересчитывает обе группы и страницы обеих групп.
+        self.assertQueryBudget(
+            self.author_client,
+            reverse('posts:post_edit', kwargs={'post_id': post_id}),
+            method='post',
+            data={'text': 'edited_post', 'group': self.other_group.pk},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.group, self.other_group)
+
+    def test_create_with_image_within_budget(self):
+        """Пост с картинкой укладывается в бюджет запросов"""
+        image = SimpleUploadedFile(
+            name='small.gif', content=SMALL_GIF, content_type='image/gif')
+        self.assertQueryBudget(
+            self.author_client, reverse('posts:post_create'),
+            method='post', data={'text': 'new_post', 'image': image},
+        )
+        self.assertTrue(Post.objects.filter(image__endswith='.gif').exists())
@@ -0,0 +1,210 @@
+import shutil
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+from yatube.settings import NUMBER_OF_PAGES, sqlite_has_fts5
+
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+
+    def setUp(self):
+        self.client = Client()
+
+    def found_ids(self, query):
+        return [result.post_id for result in search.search(query)]
+
+    def test_search_ranks_by_relevance(self):
+        """Поиск находит посты по словам и ставит лучшие первыми"""
+        weak = Post.objects.create(
+            author=self.user, text='котики и собаки в одном доме')
+        strong = Post.objects.create(
+            author=self.user, text='котики котики котики')
+        Post.objects.create(author=self.user, text='только собаки')
+        self.assertEqual(self.found_ids('котики'), [strong.pk, weak.pk])
+        self.assertEqual(self.found_ids('котики собаки'), [weak.pk])
+
+    def test_search_matches_prefixes(self):
+        """Слово находится и в других формах"""
+        post = Post.objects.create(author=self.user, text='Котиками полон дом')
+        self.assertEqual(self.found_ids('котик'), [post.pk])
+
+    def test_query_syntax_is_not_passed_to_fts(self):
+        """Операторы FTS5 во вводе не ломают запрос"""
+        post = Post.objects.create(author=self.user, text='котики NEAR дом')
+        self.assertEqual(self.found_ids('"котики NEAR(дом'), [post.pk])
+        self.assertEqual(self.found_ids('*:"()'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Правка и удаление поста сразу видны в поиске"""
+        post = Post.objects.create(author=self.user, text='котики')
+        post.text = 'собаки'
+        post.save()
+        self.assertEqual(self.found_ids('котики'), [])
+        self.assertEqual(self.found_ids('собаки'), [post.pk])
+        post.delete()
+        self.assertEqual(self.found_ids('собаки'), [])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        """Фрагмент подсвечивает найденное и экранирует HTML поста"""
+        Post.objects.create(author=self.user, text='<b>котики</b> дома')
+        response = self.client.get(reverse('posts:search'), {'q': 'котики'})
+        self.assertContains(
+            response, '&lt;b&gt;<mark>котики</mark>&lt;/b&gt; дома')
+
+    def test_search_cursor_pagination(self):
+        """Результаты листаются курсором, запрос сохраняется в ссылках"""
+        for i in range(NUMBER_OF_PAGES + 3):
+            Post.objects.create(author=self.user, text=f'котики {i}')
+        response = self.client.get(reverse('posts:search'), {'q': 'котики'})
+        self.assertEqual(len(response.context['page_obj']), NUMBER_OF_PAGES)
+        cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertContains(response, f'q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA%D0'
+                                      f'%B8&amp;cursor={cursor}')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'котики', 'cursor': cursor})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_search_api(self):
+        """API поиска отдает результаты с фрагментами и курсором"""
+        for i in range(NUMBER_OF_PAGES + 1):
+            Post.objects.create(author=self.user, text=f'котики {i}')
+        response = self.client.get(
+            reverse('posts:search_api'), {'q': 'котики'})
+        data = response.json()
+        self.assertEqual(len(data['results']), NUMBER_OF_PAGES)
+        self.assertIn('<mark>котики</mark>', data['results'][0]['snippet'])
+        self.assertEqual(data['results'][0]['author'], 'test_author')
+        response = self.client.get(
+            reverse('posts:search_api'),
+            {'q': 'котики', 'cursor': data['next']},
+        )
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNone(response.json()['next'])
+
+    def test_rebuild_search_index(self):
+        """Команда переиндексирует записи, сделанные мимо сигналов"""
+        posts = [
+            Post.objects.create(author=self.user, text=f'котики {i}')
+            for i in range(5)
+        ]
+        Post.objects.filter(pk=posts[0].pk).update(text='собаки')
+        Post.objects.filter(pk=posts[1].pk).delete()
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('Проиндексировано постов: 4', out.getvalue())
+        self.assertEqual(self.found_ids('собаки'), [posts[0].pk])
+        self.assertCountEqual(
+            self.found_ids('котики'), [post.pk for post in posts[2:]])
+
+    def test_fts5_is_detected(self):
+        """Без FTS5 в SQLite настройки выбирают инвертированный индекс"""
+        with mock.patch('sqlite3.connect') as connect:
+            connect.return_value.execute.side_effect = (
+                sqlite3.OperationalError)
+            self.assertFalse(sqlite_has_fts5())
+
+
+class InvertedSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+
+    def setUp(self):
+        self.client = Client()
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        for name, value in (('SEARCH_BACKEND', search.INVERTED),
+                            ('SEARCH_INDEX_DIR', path)):
+            patcher = mock.patch(f'posts.search.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def found_ids(self, query):
+        return search.find_post_ids(query)
+
+    def test_posts_and_comments_are_searched(self):
+        """Посты находятся по словам текста и комментариев"""
+        first = Post.objects.create(author=self.user, text='Котики спят')
+        second = Post.objects.create(author=self.user, text='Собаки гуляют')
+        comment = Comment.objects.create(
+            post=second, author=self.user, text='А котиков выгуливают?')
+        self.assertEqual(self.found_ids('котик'), [second.pk, first.pk])
+        comment.delete()
+        second.text = 'котики гуляют'
+        second.save()
+        self.assertEqual(self.found_ids('"котики гуляют"'), [second.pk])
+        first.delete()
+        self.assertEqual(self.found_ids('котики'), [second.pk])
+
+    def test_comment_journals_only_itself(self):
+        """Новый комментарий пишет в журнал только свой документ"""
+        post = Post.objects.create(author=self.user, text='Собаки гуляют')
+        first, second = (
+            Comment.objects.create(post=post, author=self.user, text=text)
+            for text in ('котики', 'молоко')
+        )
+        index = search.get_index()
+        index.refresh()
+        records, _ = index._log_records(index.generation, 0)
+        self.assertEqual(
+            [doc for doc, _ in records],
+            [search._post_doc(post.pk),
+             search._comment_doc(post.pk, first.pk),
+             search._comment_doc(post.pk, second.pk)],
+        )
+        self.assertEqual(self.found_ids('молоко'), [post.pk])
+        second.delete()
+        self.assertEqual(self.found_ids('молоко'), [])
+        self.assertEqual(self.found_ids('котики'), [post.pk])
+
+    def test_compact_search_index(self):
+        """Команда сливает журнал в сегмент без изменения выдачи"""
+        post = Post.objects.create(author=self.user, text='котики')
+        out = StringIO()
+        call_command('compact_search_index', '--if-needed', stdout=out)
+        self.assertIn('Сжатие не нужно', out.getvalue())
+        call_command('compact_search_index', stdout=out)
+        self.assertIn('Индекс сжат', out.getvalue())
+        self.assertFalse(search.get_index().live)
+        self.assertEqual(self.found_ids('котики'), [post.pk])
+
+    def test_results_page(self):
+        """Страница поиска листается курсором и подсвечивает совпадения"""
+        for i in range(NUMBER_OF_PAGES + 3):
+            Post.objects.create(author=self.user, text=f'пост {i} про котиков')
+        response = self.client.get(reverse('posts:search'), {'q': 'котик'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), NUMBER_OF_PAGES)
+        self.assertContains(response, 'про <mark>котиков</mark>')
+        response = self.client.get(reverse('posts:search'), {
+            'q': 'котик', 'cursor': page_obj.paginator.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_rebuild_search_index(self):
+        """Команда собирает индекс заново из базы"""
+        post = Post.objects.create(author=self.user, text='котики')
+        Post.objects.filter(pk=post.pk).update(text='собаки')
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Проиндексировано постов: 1', out.getvalue())
+        self.assertEqual(self.found_ids('котики'), [])
+        self.assertEqual(self.found_ids('собаки'), [post.pk])
+        call_command('benchmark_search', 'собаки', repeat=1, stdout=out)
+        self.assertIn('собаки: индекс', out.getvalue())
@@ -0,0 +1,82 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from core import pubsub
+from posts.models import Comment, Follow, Post
+
+
+User = get_user_model()
+
+
+class StreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.follower = User.objects.create_user(username='test_follower')
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.post = Post.objects.create(author=cls.user, text='test_post')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for patcher in (
+            mock.patch('core.pubsub.PUBSUB_DIR', directory),
+            mock.patch('core.sse.SSE_MAX_DURATION', 0),
+            mock.patch(
+                'posts.streams.transaction.on_commit', lambda func: func()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def read(self, response):
+        content = b''.join(response.streaming_content).decode()
+        response.close()
+        return content
+
+    def test_comments_are_published(self):
+        """Новый комментарий публикуется в канал поста"""
+        self.follower_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'new_comment'},
+        )
+        comment = Comment.objects.get()
+        self.assertEqual(
+            pubsub.latest(f'post:{self.post.pk}'), comment.pk)
+
+    def test_comment_stream_resumes_from_last_event_id(self):
+        """Поток поста отдает комментарии после Last-Event-ID"""
+        first, second = (
+            Comment.objects.create(
+                post=self.post, author=self.follower, text=text)
+            for text in ('first_comment', 'second_comment')
+        )
+        url = reverse('posts:post_events', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url, HTTP_LAST_EVENT_ID=str(first.pk))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = self.read(response)
+        self.assertIn(f'id: {second.pk}\nevent: comment\n', content)
+        self.assertIn('second_comment', content)
+        self.assertNotIn('first_comment', content)
+        # Новый клиент получает только то, что появится после подключения.
+        self.assertNotIn('comment', self.read(self.client.get(url)))
+
+    def test_follow_stream(self):
+        """Поток подписок отдает новые посты авторов из подписок"""
+        stranger = User.objects.create_user(username='test_stranger')
+        Post.objects.create(author=stranger, text='stranger_post')
+        new = Post.objects.create(author=self.user, text='followed_post')
+        self.assertEqual(pubsub.latest(f'author:{self.user.pk}'), new.pk)
+        content = self.read(self.follower_client.get(
+            reverse('posts:follow_events'),
+            {'last_event_id': self.post.pk},
+        ))
+        self.assertIn(f'id: {new.pk}\nevent: post\n', content)
+        self.assertNotIn('stranger_post', content)
@@ -0,0 +1,212 @@
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from core.query_budget import QueryBudgetMixin
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def uploaded_gif(name='small.gif', color=None):
+    """Картинка 1×1; разный color дает разные по содержимому файлы."""
+    content = SMALL_GIF
+    if color is not None:
+        output = BytesIO()
+        Image.new('L', (1, 1), color).save(output, 'GIF')
+        content = output.getvalue()
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        # Генерация сразу, а не после коммита в пуле потоков.
+        for target, value in (
+            ('posts.thumbnails.THUMBNAIL_WORKERS', 0),
+            ('posts.thumbnails.transaction.on_commit', lambda func: func()),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_thumbnails_are_generated_on_save(self):
+        """Миниатюра создается при сохранении поста с картинкой"""
+        post = Post.objects.create(
+            author=self.user, text='с картинкой', image=uploaded_gif())
+        thumbnail = thumbnails.lookup(post.image)
+        self.assertIsNotNone(thumbnail)
+        self.assertTrue(thumbnail.exists())
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+
+    def test_render_only_looks_up_thumbnails(self):
+        """Страница берет готовую миниатюру и не генерирует ее сама"""
+        post = Post.objects.create(
+            author=self.user, text='с картинкой', image=uploaded_gif())
+        with mock.patch('posts.thumbnails.render') as render:
+            response = self.client.get(reverse('posts:index'))
+        render.assert_not_called()
+        self.assertContains(response, thumbnails.lookup(post.image).url)
+
+    def test_missing_thumbnail_is_generated_on_demand(self):
+        """Пока миниатюры нет, страница ссылается на генерацию по запросу"""
+        with mock.patch('posts.thumbnails.schedule'):
+            post = Post.objects.create(
+                author=self.user, text='с картинкой', image=uploaded_gif())
+            response = self.client.get(reverse('posts:index'))
+        url = reverse('posts:thumbnail', args=('card', post.image.name))
+        self.assertContains(response, url)
+        self.assertIsNone(thumbnails.lookup(post.image))
+        response = self.client.get(url)
+        self.assertRedirects(
+            response, thumbnails.lookup(post.image).url,
+            fetch_redirect_response=False)
+
+    def test_on_demand_thumbnail_within_budget(self):
+        """Генерация по запросу укладывается в бюджет запросов"""
+        with mock.patch('posts.thumbnails.schedule'):
+            post = Post.objects.create(
+                author=self.user, text='с картинкой', image=uploaded_gif())
+        self.assertQueryBudget(
+            self.client,
+            reverse('posts:thumbnail', args=('card', post.image.name)),
+        )
+        self.assertIsNotNone(thumbnails.lookup(post.image))
+
+    def test_failed_thumbnail_redirects_to_image(self):
+        """Без миниатюры запрос перенаправляется на исходную картинку"""
+        with mock.patch('posts.thumbnails.schedule'):
+            post = Post.objects.create(
+                author=self.user, text='с картинкой', image=uploaded_gif())
+        with mock.patch('posts.thumbnails.ensure', return_value=None):
+            response = self.client.get(
+                reverse('posts:thumbnail', args=('card', post.image.name)))
+        self.assertRedirects(
+            response, post.image.url, fetch_redirect_response=False)
+
+    def test_on_demand_thumbnail_of_unknown_image(self):
+        """Миниатюры создаются только для картинок постов"""
+        response = self.client.get(
+            reverse('posts:thumbnail', args=('card', 'posts/unknown.gif')))
+        self.assertEqual(response.status_code, 404)
+
+    def test_concurrent_requests_wait_for_one_generation(self):
+        """Одновременные запросы ждут одну генерацию, а не повторяют ее"""
+        done = threading.Event()
+        calls = []
+
+        def render(image_name):
+            calls.append(image_name)
+            time.sleep(0.2)
+            return 'source', []
+
+        with mock.patch('posts.thumbnails.render', render), \
+                mock.patch('posts.thumbnails.store',
+                           lambda *args: done.set()), \
+                mock.patch('posts.thumbnails._ready',
+                           lambda image_name: done.is_set()), \
+                mock.patch('posts.thumbnails.lookup'):
+            workers = [
+                threading.Thread(
+                    target=thumbnails.ensure, args=('posts/small.gif',))
+                for _ in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(calls, ['posts/small.gif'])
+
+    def test_picture_has_srcset_and_lazy_loading(self):
+        """Карточка отдает варианты через srcset и грузится лениво"""
+        post = Post.objects.create(
+            author=self.user, text='с картинкой', image=uploaded_gif())
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(
+            response, f'{thumbnails.lookup(post.image).url} 960w')
+        small = thumbnails.lookup(post.image, 'card-480-jpeg')
+        self.assertEqual((small.width, small.height), (480, 170))
+        self.assertContains(response, f'{small.url} 480w')
+
+    def test_page_thumbnails_are_prefetched_at_once(self):
+        """Миниатюры всей страницы ищутся одним обращением к store"""
+        posts = [
+            Post.objects.create(author=self.user, text=f'пост {i}',
+                                image=uploaded_gif(f'small{i}.gif'))
+            for i in range(3)
+        ]
+        cache.clear()
+        with mock.patch('posts.thumbnails._get_many',
+                        wraps=thumbnails._get_many) as get_many, \
+                mock.patch('posts.thumbnails.lookup') as lookup:
+            response = self.client.get(reverse('posts:index'))
+        get_many.assert_called_once()
+        lookup.assert_not_called()
+        for post in posts:
+            self.assertContains(response, thumbnails.lookup(post.image).url)
+
+    def test_rebuild_thumbnails(self):
+        """Команда создает недостающие миниатюры и продолжает с checkpoint"""
+        with mock.patch('posts.thumbnails.schedule'):
+            posts = [
+                Post.objects.create(author=self.user, text=f'пост {i}',
+                                    image=uploaded_gif(color=i))
+                for i in range(3)
+            ]
+        checkpoint = f'{TEMP_MEDIA_ROOT}/checkpoint'
+        with open(checkpoint, 'w') as checkpoint_file:
+            checkpoint_file.write(str(posts[0].pk))
+        out = StringIO()
+        call_command('rebuild_thumbnails', jobs=2, checkpoint=checkpoint,
+                     stdout=out)
+        self.assertIn('Создано: 2, пропущено готовых: 0', out.getvalue())
+        self.assertIsNone(thumbnails.lookup(posts[0].image))
+        self.assertIsNotNone(thumbnails.lookup(posts[2].image))
+        call_command('rebuild_thumbnails', jobs=1, checkpoint=checkpoint,
+                     stdout=out)
+        self.assertIn('Создано: 1, пропущено готовых: 2', out.getvalue())
+        # Картинка без одного из вариантов карточки не считается готовой.
+        variant = thumbnails.card_name(thumbnails.CARD_WIDTHS[0])
+        default.kvstore.delete(thumbnails.lookup(posts[1].image, variant))
+        out = StringIO()
+        call_command('rebuild_thumbnails', jobs=1, checkpoint=checkpoint,
+                     stdout=out)
+        self.assertIn('Создано: 1, пропущено готовых: 2', out.getvalue())
+        self.assertIsNotNone(thumbnails.lookup(posts[1].image, variant))
@@ -0,0 +1,159 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Post, Follow, TimelineEntry
+
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.follower = User.objects.create_user(username='test_follower')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='test_old_post',
+        )
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def follow(self):
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+
+    def timeline_posts(self):
+        return [entry.post for entry in timeline.get_timeline(self.follower)]
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        self.follow()
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков"""
+        self.follow()
+        new_post = Post.objects.create(author=self.author, text='new')
+        self.assertEqual(self.timeline_posts(), [new_post, self.old_post])
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post])
+
+    def test_unfollow_purges_timeline(self):
+        """Отписка убирает посты автора из ленты"""
+        self.follow()
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.follower).exists())
+
+    def test_timeline_is_capped(self):
+        """В ленте хранится не больше TIMELINE_SIZE записей"""
+        self.follow()
+        posts = [
+            Post.objects.create(author=self.author, text=f'post_{i}')
+            for i in range(3)
+        ]
+        timeline.trim([self.follower.pk], size=2)
+        self.assertEqual(self.timeline_posts(), posts[:-3:-1])
+
+    def test_fan_out_does_not_trim(self):
+        """Раскладка поста не зависит от числа подписчиков и не обрезает"""
+        followers = [self.follower] + [
+            User.objects.create_user(username=f'test_follower_{i}')
+            for i in range(3)
+        ]
+        post = Post.objects.create(author=self.author, text='new')
+        with self.assertNumQueries(2):
+            timeline.fan_out(post, [user.pk for user in followers])
+        timeline.trim([user.pk for user in followers[:2]], size=0)
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user_id', flat=True)),
+            {user.pk for user in followers[2:]},
+        )
+
+    def test_trim_overfull(self):
+        """Обрезаются только ленты длиннее заданного размера"""
+        self.follow()
+        other = User.objects.create_user(username='test_other')
+        Follow.objects.create(user=other, author=self.follower)
+        Post.objects.create(author=self.follower, text='other_post')
+        posts = [
+            Post.objects.create(author=self.author, text=f'post_{i}')
+            for i in range(3)
+        ]
+        self.assertEqual(timeline.trim_overfull(size=2), 1)
+        self.assertEqual(self.timeline_posts(), posts[:-3:-1])
+        self.assertEqual(TimelineEntry.objects.filter(user=other).count(), 1)
+
+    def test_rebuild_timelines_command(self):
+        """rebuild_timelines восстанавливает ленты по подпискам"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+
+    def test_failed_rebuild_keeps_timelines(self):
+        """Сбой пересборки не оставляет ленты пустыми"""
+        self.follow()
+        with mock.patch('posts.timeline.backfill', side_effect=OSError):
+            with self.assertRaises(OSError):
+                timeline.rebuild()
+        self.assertEqual(self.timeline_posts(), [self.old_post])
+
+    def test_post_without_followers(self):
+        """Пост без подписчиков не создает записей ленты"""
+        Post.objects.create(author=self.follower, text='lonely')
+        self.assertFalse(TimelineEntry.objects.exists())
+
+
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='test_star')
+        cls.author = User.objects.create_user(username='test_author')
+        cls.follower = User.objects.create_user(username='test_follower')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+        patcher = mock.patch('posts.timeline.FEED_PULL_THRESHOLD', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        fan = User.objects.create_user(username='test_fan')
+        Follow.objects.create(user=fan, author=self.star)
+        Follow.objects.create(user=self.follower, author=self.star)
+
+    def test_popular_author_posts_are_not_pushed(self):
+        """Посты автора с большим числом подписчиков не пишутся в ленты"""
+        Post.objects.create(author=self.star, text='star_post')
+        self.assertFalse(
+            TimelineEntry.objects.filter(author=self.star).exists())
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Лента сливает записи ленты и посты популярных авторов"""
+        posts = [
+            Post.objects.create(author=author, text=f'post_{i}')
+            for i, author in enumerate(
+                [self.author, self.star, self.author, self.star] * 3)
+        ]
+        url = reverse('posts:follow_index')
+        response = self.follower_client.get(url)
+        first_page = list(response.context['page_obj'])
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        response = self.follower_client.get(url + f'?cursor={next_cursor}')
+        second_page = list(response.context['page_obj'])
+        self.assertEqual(first_page + second_page, posts[::-1])
+        self.assertIn('feed-merge', response['Server-Timing'])
@@ -0,0 +1,127 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import uploads
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.stranger = User.objects.create_user(username='test_stranger')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_dir, ignore_errors=True)
+        patcher = mock.patch('posts.uploads.UPLOAD_DIR', self.upload_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create(self, length=len(SMALL_GIF)):
+        response = self.client.post(
+            reverse('posts:upload_create'),
+            HTTP_UPLOAD_LENGTH=str(length),
+            HTTP_UPLOAD_METADATA='filename '
+                                 + base64.b64encode(b'photo.gif').decode(),
+        )
+        self.assertEqual(response.status_code, 201)
+        return response['Location']
+
+    def patch(self, url, offset, data, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum is None:
+            checksum = base64.b64encode(hashlib.sha256(data).digest())
+        headers['HTTP_UPLOAD_CHECKSUM'] = f'sha256 {checksum.decode()}'
+        return self.client.generic(
+            'PATCH', url, data,
+            content_type='application/offset+octet-stream', **headers)
+
+    def test_chunks_are_assembled_and_used_by_form(self):
+        """Загрузка частями с продолжением и пост по ее токену"""
+        url = self.create()
+        response = self.patch(url, 0, SMALL_GIF[:20])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '20')
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '20')
+        response = self.patch(url, 20, SMALL_GIF[20:])
+        self.assertEqual(response['Upload-Offset'], str(len(SMALL_GIF)))
+        token = url.rstrip('/').rsplit('/', 1)[-1]
+        opened = []
+        original = uploads.completed
+
+        def completed(*args):
+            opened.append(original(*args))
+            return opened[-1]
+
+        with mock.patch('posts.forms.uploads.completed', completed):
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'с загрузкой', 'upload': token},
+            )
+        # Файл загрузки закрывается после сохранения поста.
+        self.assertTrue(opened[0].closed)
+        post = Post.objects.get(text='с загрузкой')
+        with post.image.open() as image:
+            self.assertEqual(image.read(), SMALL_GIF)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_wrong_offset_and_checksum_are_rejected(self):
+        """Часть не с того смещения или с неверным хешем отбрасывается"""
+        url = self.create()
+        self.assertEqual(self.patch(url, 5, SMALL_GIF[:5]).status_code, 409)
+        response = self.patch(
+            url, 0, SMALL_GIF[:5], checksum=base64.b64encode(b'x' * 32))
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '0')
+        response = self.patch(url, 0, SMALL_GIF + b'lost')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '0')
+
+    def test_upload_belongs_to_its_author(self):
+        """Чужую или незаконченную загрузку нельзя использовать"""
+        url = self.create()
+        token = url.rstrip('/').rsplit('/', 1)[-1]
+        response = self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'незаконченная', 'upload': token},
+        )
+        self.assertFormError(
+            response, 'form', 'image', 'Загрузка не найдена или не закончена.')
+        self.patch(url, 0, SMALL_GIF)
+        stranger = Client()
+        stranger.force_login(self.stranger)
+        self.assertEqual(stranger.head(url).status_code, 404)
+        stranger.post(
+            reverse('posts:post_create'),
+            {'text': 'чужая', 'upload': token},
+        )
+        self.assertFalse(Post.objects.filter(text='чужая').exists())
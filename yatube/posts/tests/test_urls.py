@@ -1,4 +1,5 @@
 from http import HTTPStatus
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from posts.models import Post, Group
@@ -87,5 +88,7 @@ class StaticURLTests(TestCase):
         }
         for address, template in templates_url_names.items():
             with self.subTest(address=address):
+                # Страница из кеша не рендерит шаблон заново.
+                cache.clear()
                 response = self.authorized_client.get(address, follow=True)
                 self.assertTemplateUsed(response, template)
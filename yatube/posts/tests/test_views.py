@@ -8,7 +8,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django import forms
-
+from core import page_cache
 from posts.models import Post, Group, Follow
 from yatube.settings import NUMBER_OF_PAGES
 
@@ -54,6 +54,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         self.sub_client = Client()
@@ -237,6 +238,7 @@ class PaginatorViewsTest(TestCase):
         cls.posts_next_pages = cls.count_posts - NUMBER_OF_PAGES
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -289,6 +291,48 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(
             len(response.context['page_obj']), self.posts_next_pages)
 
+    def test_index_next_cursor_contains_rest_records(self):
+        """VIEWS INDEX курсор следующей страницы ведет к оставшимся постам"""
+        response = self.client.get(reverse('posts:index'))
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        response = self.client.get(
+            reverse('posts:index') + f'?cursor={next_cursor}')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), self.posts_next_pages)
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(page_obj.has_previous())
+
+    def test_previous_cursor_returns_first_page(self):
+        """VIEWS курсор предыдущей страницы возвращает первую страницу"""
+        url = reverse('posts:group_list', kwargs={'slug': 'test_slug'})
+        first_page = self.client.get(url).context['page_obj']
+        next_cursor = first_page.paginator.next_cursor
+        second_page = self.client.get(
+            url + f'?cursor={next_cursor}').context['page_obj']
+        previous_cursor = second_page.paginator.previous_cursor
+        response = self.client.get(url + f'?cursor={previous_cursor}')
+        self.assertEqual(
+            list(response.context['page_obj']), list(first_page))
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_cursor_order_is_stable_for_same_pub_date(self):
+        """VIEWS посты с одинаковым pub_date не теряются и не дублируются"""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        url = reverse('posts:profile', kwargs={'username': 'test_author'})
+        first_page = self.client.get(url).context['page_obj']
+        next_cursor = first_page.paginator.next_cursor
+        second_page = self.client.get(
+            url + f'?cursor={next_cursor}').context['page_obj']
+        seen = [post.pk for post in list(first_page) + list(second_page)]
+        self.assertEqual(
+            seen, sorted(Post.objects.values_list('pk', flat=True),
+                         reverse=True))
+
+    def test_invalid_cursor_returns_first_page(self):
+        """VIEWS некорректный курсор возвращает первую страницу"""
+        response = self.client.get(reverse('posts:index') + '?cursor=bad')
+        self.assertEqual(len(response.context['page_obj']), NUMBER_OF_PAGES)
+
 
 class CacheTest(TestCase):
     @classmethod
@@ -298,20 +342,186 @@ class CacheTest(TestCase):
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.user)
 
+    def setUp(self):
+        cache.clear()
+
     def test_index_cache(self):
         """Тест кеша страницы индекс"""
-        response = self.authorized_client.get(reverse('posts:index'))
-        before_create_new_post = response.content
-        Post.objects.create(
-            text='test_new_post',
+        post = Post.objects.create(
+            text='test_post',
             author=self.user,
         )
+        response = self.authorized_client.get(reverse('posts:index'))
+        before_update = response.content
+        Post.objects.filter(pk=post.pk).update(text='test_updated_post')
         response_2 = self.authorized_client.get(reverse('posts:index'))
-        create_new_post = response_2.content
-        self.assertEqual(create_new_post, before_create_new_post)
+        self.assertEqual(response_2.content, before_update)
 
         cache.clear()
 
         response_3 = self.authorized_client.get(reverse('posts:index'))
-        after_cache_clear = response_3.content
-        self.assertNotEqual(create_new_post, after_cache_clear)
+        self.assertNotEqual(response_3.content, before_update)
+
+    def test_cached_feed_skips_query(self):
+        """Закешированная лента не обращается к базе"""
+        Post.objects.create(text='test_post', author=self.user)
+        self.client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('posts:index'))
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден в закешированных лентах"""
+        group = Group.objects.create(
+            title='test_title',
+            slug='test_slug',
+            description='test_description',
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        Post.objects.create(
+            text='test_new_post',
+            author=self.user,
+            group=group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'test_new_post')
+
+    def test_feed_cache_varies_on_page(self):
+        """Разные страницы ленты кешируются отдельно"""
+        for i in range(NUMBER_OF_PAGES + 1):
+            Post.objects.create(text=f'test_post_{i}', author=self.user)
+        first_page = self.client.get(reverse('posts:index'))
+        second_page = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertNotEqual(first_page.content, second_page.content)
+        self.assertContains(second_page, 'test_post_0')
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(text='test_post', author=cls.user)
+        cls.other_post = Post.objects.create(
+            text='test_other_post', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторный анонимный запрос отдается из кеша без базы"""
+        first = self.client.get(self.post_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.post_url)
+        self.assertTemplateNotUsed(second, 'posts/post_detail.html')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('Last-Modified', second)
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_missing_page_leaves_no_version(self):
+        """Версия адреса записывается только для закешированной страницы"""
+        missing_url = reverse('posts:post_detail', kwargs={'post_id': 10 ** 6})
+        self.assertEqual(self.client.get(missing_url).status_code, 404)
+        self.assertIsNone(
+            cache.get(page_cache.VERSION_KEY.format(missing_url)))
+        etag = self.client.get(self.post_url)['ETag']
+        version = cache.get(page_cache.VERSION_KEY.format(self.post_url))
+        self.assertEqual(etag, f'"{version:x}"')
+
+    def test_evicted_version_is_not_older_than_purge(self):
+        """Вытесненная версия не откатывается к странице до purge"""
+        etag = self.client.get(self.post_url)['ETag']
+        page_cache.purge([self.post_url])
+        cache.delete(page_cache.VERSION_KEY.format(self.post_url))
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_none_match_gets_not_modified(self):
+        """Совпавший If-None-Match получает 304"""
+        etag = self.client.get(self.post_url)['ETag']
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_comment_purges_only_its_pages(self):
+        """Комментарий сбрасывает страницы своего поста, но не чужого"""
+        other_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.other_post.pk})
+        etag = self.client.get(self.post_url)['ETag']
+        other_etag = self.client.get(other_url)['ETag']
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'test_comment'},
+        )
+        response = self.client.get(self.post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'test_comment')
+        response = self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_post_purges_feeds(self):
+        """Новый пост сразу виден анонимному читателю"""
+        self.client.get(reverse('posts:index'))
+        Post.objects.create(text='test_new_post', author=self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'test_new_post')
+
+    def test_new_post_updates_count_without_purging_posts(self):
+        """Новый пост меняет число постов автора, не сбрасывая его посты"""
+        self.assertContains(
+            self.client.get(self.post_url), 'Всего постов автора:  <span>2')
+        Post.objects.create(text='test_new_post', author=self.user)
+        response = self.client.get(self.post_url)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, 'Всего постов автора:  <span>3')
+
+    def test_cached_page_is_personalized(self):
+        """Общая страница из кеша дополняется персональными фрагментами"""
+        reader = User.objects.create_user(username='test_reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        edit_url = reverse('posts:post_edit', kwargs={'post_id': self.post.pk})
+        self.client.get(self.post_url)
+        response = self.authorized_client.get(self.post_url)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, edit_url)
+        self.assertContains(response, 'Пользователь: test_author')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+        response = reader_client.get(self.post_url)
+        self.assertNotContains(response, edit_url)
+        self.assertContains(response, 'Пользователь: test_reader')
+        response = self.client.get(self.post_url)
+        self.assertNotContains(response, edit_url)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_cached_profile_shows_follow_state(self):
+        """Кнопка подписки в закешированном профиле своя у каждого"""
+        reader = User.objects.create_user(username='test_reader')
+        Follow.objects.create(user=reader, author=self.user)
+        reader_client = Client()
+        reader_client.force_login(reader)
+        profile_url = reverse(
+            'posts:profile', kwargs={'username': self.user.username})
+        unfollow_url = reverse(
+            'posts:profile_unfollow', kwargs={'username': self.user.username})
+        self.authorized_client.get(profile_url)
+        response = reader_client.get(profile_url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, unfollow_url)
+        response = self.client.get(profile_url)
+        self.assertNotContains(response, unfollow_url)
@@ -0,0 +1,366 @@
+"""Миниатюры картинок постов.
+
+Все геометрии, которые используют шаблоны, перечислены в THUMBNAILS:
+карточка поста в нескольких ширинах для srcset, в JPEG и в форматах
+из IMAGE_FORMATS, которые умеют Pillow и sorl. Одинаковые картинки
+разных постов хранятся одним файлом (core.storage), поэтому и
+миниатюры у них общие.
+После сохранения поста с новой картинкой миниатюры всех геометрий
+генерируются в фоновом пуле потоков, а шаблоны через lookup только
+читают готовую миниатюру из key-value store sorl; prefetch находит
+миниатюры для всей страницы постов одним обращением к store. Пока
+миниатюры нет, шаблон ссылается на view thumbnail, который создает ее
+по запросу.
+
+Генерация идет через ensure под блокировкой файлом на источник, общей
+для процессов: одновременные запросы ждут одну генерацию, а не
+повторяют ее. Файлы пишутся атомарно (THUMBNAIL_STORAGE). Когда
+фоновая генерация закончена, страницы поста сбрасываются из кеша
+страниц.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as default_settings, settings
+from sorl.thumbnail.images import (
+    ImageFile, deserialize_image_file, serialize_image_file
+)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import page_cache
+from core.file_lock import file_lock
+from posts import pages
+from posts.models import Post
+from yatube.settings import (
+    IMAGE_FORMATS, THUMBNAIL_LOCK_DIR, THUMBNAIL_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+CARD = 'card'
+CARD_SIZE = (960, 339)
+CARD_WIDTHS = (480, 960)
+MIME_TYPES = {
+    'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'AVIF': 'image/avif',
+}
+
+
+def _formats():
+    Image.init()
+    return ['JPEG'] + [
+        format_ for format_ in IMAGE_FORMATS
+        if format_ in Image.SAVE and format_ in EXTENSIONS
+    ]
+
+
+def card_name(width, format_='JPEG'):
+    if (width, format_) == (CARD_SIZE[0], 'JPEG'):
+        return CARD
+    return f'{CARD}-{width}-{format_.lower()}'
+
+
+FORMATS = _formats()
+THUMBNAILS = {
+    card_name(width, format_): (
+        f'{width}x{round(width * CARD_SIZE[1] / CARD_SIZE[0])}',
+        {'crop': 'center', 'upscale': True, 'format': format_},
+    )
+    for format_ in FORMATS for width in CARD_WIDTHS
+}
+
+# Запросы генерации по запросу: проверка поста, поиск миниатюр и
+# запись источника, затем по шесть записей kvstore sorl на миниатюру.
+ON_DEMAND_QUERIES = 10 + 6 * len(THUMBNAILS)
+
+OnDemandThumbnail = namedtuple('OnDemandThumbnail', 'url')
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _options(source, options):
+    """Параметры миниатюры с умолчаниями, как их дополняет sorl."""
+    backend = default.backend
+    options = dict(options)
+    if settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _source(image):
+    """Источник: FieldFile картинки или ее имя в хранилище картинок
+    постов."""
+    if isinstance(image, str):
+        return ImageFile(image, Post._meta.get_field('image').storage)
+    return ImageFile(image)
+
+
+def thumbnail_file(image, name=CARD):
+    """ImageFile миниатюры; сам файл может быть еще не создан."""
+    geometry, options = THUMBNAILS[name]
+    source = _source(image)
+    return ImageFile(
+        default.backend._get_thumbnail_filename(
+            source, geometry, _options(source, options)
+        ),
+        default.storage,
+    )
+
+
+def lookup(image, name=CARD):
+    """Готовая миниатюра из key-value store или None, без генерации."""
+    if not image:
+        return None
+    return default.kvstore.get(thumbnail_file(image, name))
+
+
+def _get_many(keys):
+    """Сырые значения store по ключам; для cached_db — одним get_many
+    из кеша и одним запросом к базе за промахами."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        for key in missing:
+            # Отсутствие тоже кешируется, как в самом KVStore.
+            values[key] = stored.get(key, EMPTY_VALUE)
+            kvstore.cache.set(
+                key, values[key], settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+    return {
+        key: value for key, value in values.items()
+        if value is not None and value != EMPTY_VALUE
+    }
+
+
+def prefetch(posts, names=None):
+    """Находит готовые миниатюры картинок всех постов за одно обращение
+    к key-value store и запоминает их в постах; возвращает posts.
+
+    Без names ищутся все геометрии THUMBNAILS.
+    """
+    names = tuple(names or THUMBNAILS)
+    keys = {
+        (post.pk, name): add_prefix(thumbnail_file(post.image, name).key)
+        for post in posts if post.image for name in names
+    }
+    values = _get_many(list(set(keys.values())))
+    for post in posts:
+        found = post.__dict__.setdefault('_thumbnails', {})
+        for name in names:
+            value = values.get(keys.get((post.pk, name)))
+            found[name] = deserialize_image_file(value) if value else None
+    return posts
+
+
+def on_demand(image, name=CARD):
+    """Адрес view, который создаст миниатюру при первом запросе."""
+    return OnDemandThumbnail(
+        reverse('posts:thumbnail', args=(name, image.name))
+    )
+
+
+def thumbnail(image, name=CARD):
+    """Миниатюра из prefetch или store, а если ее еще нет — адрес
+    генерации по запросу. Сама ничего не генерирует."""
+    prefetched = getattr(image.instance, '_thumbnails', {})
+    if name in prefetched:
+        found = prefetched[name]
+    else:
+        found = lookup(image, name)
+    return found or on_demand(image, name)
+
+
+def picture(image):
+    """Источники <picture> карточки: srcset по форматам и запасной JPEG.
+
+    Ничего не генерирует: недостающие миниатюры ведут на on_demand.
+    """
+    sources = []
+    for format_ in FORMATS:
+        sources.append((MIME_TYPES[format_], ', '.join(
+            f'{thumbnail(image, card_name(width, format_)).url} {width}w'
+            for width in CARD_WIDTHS
+        )))
+    jpeg = sources.pop(0)
+    return {
+        'sources': sources,
+        'src': thumbnail(image).url,
+        'srcset': jpeg[1],
+        'width': CARD_SIZE[0],
+        'height': CARD_SIZE[1],
+    }
+
+
+def current(images):
+    """Имена картинок, у которых все миниатюры THUMBNAILS есть и в
+    store, и в файлах."""
+    keys = {
+        image: [
+            add_prefix(thumbnail_file(image, name).key)
+            for name in THUMBNAILS
+        ]
+        for image in images
+    }
+    values = _get_many([key for names in keys.values() for key in names])
+    return {
+        image for image, names in keys.items()
+        if all(
+            key in values and deserialize_image_file(values[key]).exists()
+            for key in names
+        )
+    }
+
+
+def render(image_name):
+    """Создает файлы миниатюр всех геометрий, не трогая store и базу.
+
+    Годится для запуска в отдельном процессе: возвращает
+    сериализованные источник и миниатюры для store.
+    """
+    backend = default.backend
+    source = _source(image_name)
+    source_image = default.engine.get_image(source)
+    try:
+        source.set_size(default.engine.get_image_size(source_image))
+        rendered = []
+        for geometry, options in THUMBNAILS.values():
+            options = _options(source, options)
+            thumbnail = ImageFile(
+                backend._get_thumbnail_filename(source, geometry, options),
+                default.storage,
+            )
+            # image_info не входит в имя миниатюры, как и в sorl.
+            options['image_info'] = default.engine.get_image_info(
+                source_image
+            )
+            backend._create_thumbnail(
+                source_image, geometry, options, thumbnail
+            )
+            backend._create_alternative_resolutions(
+                source_image, geometry, options, thumbnail.name
+            )
+            rendered.append(serialize_image_file(thumbnail))
+    finally:
+        default.engine.cleanup(source_image)
+    return serialize_image_file(source), rendered
+
+
+def store(source, rendered):
+    """Записывает в store результат render."""
+    source = deserialize_image_file(source)
+    default.kvstore.get_or_set(source)
+    for thumbnail in rendered:
+        default.kvstore.set(deserialize_image_file(thumbnail), source)
+
+
+def lock_path(image_name):
+    digest = hashlib.md5(image_name.encode()).hexdigest()
+    return os.path.join(THUMBNAIL_LOCK_DIR, f'{digest}.lock')
+
+
+def _ready(image_name):
+    return all(lookup(image_name, name) for name in THUMBNAILS)
+
+
+def ensure(image_name, name=CARD, timeout=None):
+    """Миниатюра картинки; если миниатюр нет, создает все геометрии.
+
+    Создает под блокировкой на источник: кто пришел вторым, ждет
+    первого, а затем берет готовые файлы. При timeout ожидание может
+    закончиться LockTimeout.
+    """
+    if not _ready(image_name):
+        with file_lock(lock_path(image_name), timeout):
+            if not _ready(image_name):
+                _create(image_name)
+    return lookup(image_name, name)
+
+
+def _create(image_name):
+    files = [thumbnail_file(image_name, name) for name in THUMBNAILS]
+    if not all(thumbnail.exists() for thumbnail in files):
+        store(*render(image_name))
+        return
+    # Файлы создал другой процесс: store мог еще не дойти до кеша
+    # этого процесса, а файлы пишутся атомарно и уже целые.
+    source = _source(image_name)
+    default.kvstore.get_or_set(source)
+    for thumbnail in files:
+        default.kvstore.set(thumbnail, source)
+
+
+def _generate_for_post(post_id, image_name):
+    try:
+        post = Post.objects.select_related('author').filter(
+            pk=post_id
+        ).first()
+        if post is None or post.image.name != image_name:
+            return
+        ensure(image_name)
+        page_cache.purge(pages.post_pages(post))
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', image_name)
+    finally:
+        with _pending_lock:
+            _pending.discard(image_name)
+
+
+def _work(post_id, image_name):
+    try:
+        _generate_for_post(post_id, image_name)
+    finally:
+        # Соединение с базой у каждого потока пула свое.
+        connection.close()
+
+
+def _submit(post_id, image_name):
+    global _executor
+    with _pending_lock:
+        if image_name in _pending:
+            return
+        _pending.add(image_name)
+        if THUMBNAIL_WORKERS and _executor is None:
+            _executor = ThreadPoolExecutor(
+                THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+            )
+    if THUMBNAIL_WORKERS:
+        _executor.submit(_work, post_id, image_name)
+    else:
+        _generate_for_post(post_id, image_name)
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в очередь после коммита.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры генерируются сразу в текущем
+    потоке.
+    """
+    if post.image:
+        post_id, image_name = post.pk, post.image.name
+        transaction.on_commit(lambda: _submit(post_id, image_name))
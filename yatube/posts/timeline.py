@@ -0,0 +1,177 @@
+"""Лента подписок: гибрид fan-out-on-write и чтения при запросе.
+
+Посты обычных авторов раскладываются по лентам подписчиков при
+публикации, при подписке лента дополняется последними постами автора,
+при отписке очищается. Раскладка не обрезает ленты: ленты длиннее
+TIMELINE_SIZE записей обрезает команда trim_timelines, запускаемая по
+расписанию, а до того лишние старые записи просто не дочитываются.
+
+Посты авторов, у которых не меньше FEED_PULL_THRESHOLD подписчиков, в
+ленты не пишутся: при чтении они сливаются с лентой из отсортированных
+потоков по каждому такому автору. Если автор опустился ниже порога,
+его посты вернутся в ленты после rebuild_timelines.
+"""
+from django.db import connection, transaction
+from django.db.models import Count
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+from posts.paginators import MergedCursorPaginator
+from yatube.settings import (
+    FEED_PULL_THRESHOLD, NUMBER_OF_PAGES, TIMELINE_SIZE
+)
+
+TIMELINE_ORDERING = ('-pub_date', '-post')
+POST_ORDERING = ('-pub_date', '-pk')
+TABLE = TimelineEntry._meta.db_table
+# Лент в одном DELETE: столько параметров укладывается в лимит SQLite.
+TRIM_BATCH_SIZE = 500
+
+
+def get_timeline(user):
+    """Записи ленты пользователя вместе с постами, от новых к старым."""
+    return TimelineEntry.objects.filter(user=user).select_related(
+        'post', 'post__author', 'post__group'
+    ).order_by(*TIMELINE_ORDERING)
+
+
+def pulled_authors(author_ids):
+    """Авторы из author_ids, чьи посты читаются при запросе ленты."""
+    return list(UserStats.objects.filter(
+        user_id__in=author_ids, followers_count__gte=FEED_PULL_THRESHOLD
+    ).values_list('user_id', flat=True))
+
+
+def is_pulled(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__gte=FEED_PULL_THRESHOLD
+    ).exists()
+
+
+def follow_feed(user, per_page=NUMBER_OF_PAGES):
+    """Пагинатор ленты подписок: лента user плюс потоки pull-авторов."""
+    author_ids = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    )
+    pulled = pulled_authors(author_ids)
+    streams = [(
+        get_timeline(user).exclude(author_id__in=pulled),
+        TIMELINE_ORDERING,
+    )]
+    for author_id in pulled:
+        streams.append((
+            Post.objects.filter(author_id=author_id).select_related(
+                'author', 'group'
+            ),
+            POST_ORDERING,
+        ))
+    return MergedCursorPaginator(streams, per_page)
+
+
+def feed_post(item):
+    """Пост из элемента ленты: записи TimelineEntry или самого поста."""
+    if isinstance(item, TimelineEntry):
+        return item.post
+    return item
+
+
+def merge_timing(stats):
+    """Стоимость слияния потоков в формате заголовка Server-Timing."""
+    return (
+        f'feed-merge;dur={stats["ms"]:.2f};'
+        f'desc="streams={stats["streams"]} rows={stats["rows"]}"'
+    )
+
+
+def _entry(user_id, post):
+    return TimelineEntry(
+        user_id=user_id,
+        post=post,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def trim(user_ids, size=TIMELINE_SIZE):
+    """Удаляет из лент user_ids записи старше size последних.
+
+    Один DELETE на пачку лент: записи нумеруются внутри ленты оконной
+    функцией по индексу (user, -pub_date, -post).
+    """
+    user_ids = list(user_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_ids), TRIM_BATCH_SIZE):
+            batch = user_ids[start:start + TRIM_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+                f') AS position FROM {TABLE} WHERE user_id IN '
+                f'({placeholders})) AS ranked WHERE position > %s)',
+                [*batch, size],
+            )
+
+
+def trim_overfull(size=TIMELINE_SIZE):
+    """Обрезает только ленты длиннее size; возвращает их число."""
+    user_ids = list(TimelineEntry.objects.order_by().values(
+        'user_id'
+    ).annotate(entries=Count('id')).filter(
+        entries__gt=size
+    ).values_list('user_id', flat=True))
+    trim(user_ids, size)
+    return len(user_ids)
+
+
+def fan_out(post, follower_ids=None):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    if follower_ids is None:
+        follower_ids = Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for user_id in follower_ids],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Дополняет ленту последними постами автора после подписки."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-pk'
+    )[:TIMELINE_SIZE]
+    TimelineEntry.objects.bulk_create(
+        [_entry(user_id, post) for post in posts],
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def purge(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты с нуля по таблице Follow.
+
+    Все в одной транзакции: читатели видят либо старые ленты, либо уже
+    пересобранные, а не пустые на время пересборки.
+    """
+    entries = TimelineEntry.objects.all()
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    rebuilt = 0
+    with transaction.atomic():
+        entries.delete()
+        for user_id, author_id in follows.values_list(
+                'user_id', 'author_id'):
+            backfill(user_id, author_id)
+            rebuilt += 1
+    return rebuilt
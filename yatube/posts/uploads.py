@@ -0,0 +1,192 @@
+"""Загрузка картинок частями с продолжением после обрыва.
+
+Протокол — основа tus 1.0: POST создает загрузку заданной длины и
+возвращает ее адрес, HEAD сообщает, сколько байт уже принято, PATCH
+дописывает часть с того же смещения и, если передан Upload-Checksum,
+сверяет ее хеш. Части дописываются в файл в UPLOAD_DIR под блокировкой
+на загрузку; рядом лежат метаданные: владелец, длина и имя файла.
+Законченную загрузку PostForm получает по токену, поэтому запрос с
+формой не ждет медленную передачу картинки.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import secrets
+
+from django.core.files.uploadedfile import UploadedFile
+
+from core.file_lock import LockTimeout, file_lock
+from yatube.settings import UPLOAD_DIR, UPLOAD_MAX_SIZE
+
+TOKEN = re.compile(r'[0-9a-f]{32}')
+CHECKSUM_ALGORITHMS = ('md5', 'sha1', 'sha256')
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Ошибка протокола со статусом ответа."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _path(token, suffix):
+    return os.path.join(UPLOAD_DIR, f'{token}.{suffix}')
+
+
+def _meta(token, user_id):
+    """Метаданные загрузки пользователя user_id или None."""
+    if not token or not TOKEN.fullmatch(token):
+        return None
+    try:
+        with open(_path(token, 'json')) as meta_file:
+            meta = json.load(meta_file)
+    except FileNotFoundError:
+        return None
+    return meta if meta['user'] == user_id else None
+
+
+def _offset(token):
+    try:
+        return os.path.getsize(_path(token, 'part'))
+    except FileNotFoundError:
+        return 0
+
+
+def create(user_id, length, filename):
+    """Заводит загрузку length байт и возвращает ее токен."""
+    if not 0 < length <= UPLOAD_MAX_SIZE:
+        raise UploadError(413, f'Размер должен быть от 1 до '
+                               f'{UPLOAD_MAX_SIZE} байт.')
+    token = secrets.token_hex(16)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    open(_path(token, 'part'), 'wb').close()
+    with open(_path(token, 'json'), 'w') as meta_file:
+        json.dump({
+            'user': user_id,
+            'length': length,
+            'filename': os.path.basename(filename) or 'upload',
+        }, meta_file)
+    return token
+
+
+def state(token, user_id):
+    """(принято байт, длина) загрузки или None, если ее нет."""
+    meta = _meta(token, user_id)
+    if meta is None:
+        return None
+    return _offset(token), meta['length']
+
+
+def parse_metadata(header):
+    """Upload-Metadata: пары «ключ значение-в-base64» через запятую."""
+    metadata = {}
+    for item in header.split(','):
+        key, _, value = item.strip().partition(' ')
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value, validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise UploadError(400, 'Метаданные должны быть в base64.')
+    return metadata
+
+
+def parse_checksum(header):
+    """(алгоритм, хеш) из заголовка 'sha256 <base64>' или None."""
+    if not header:
+        return None
+    algorithm, _, encoded = header.partition(' ')
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(400, f'Неизвестный алгоритм {algorithm}.')
+    try:
+        return algorithm, base64.b64decode(encoded, validate=True)
+    except binascii.Error:
+        raise UploadError(400, 'Хеш должен быть в base64.')
+
+
+def _write_part(part, stream, length, checksum):
+    """Дописывает stream в part, проверяя длину загрузки и хеш."""
+    digest = hashlib.new(checksum[0]) if checksum else None
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        if part.tell() + len(data) > length:
+            raise UploadError(413, 'Часть длиннее загрузки.')
+        part.write(data)
+        if digest:
+            digest.update(data)
+    if digest and digest.digest() != checksum[1]:
+        raise UploadError(460, 'Хеш части не совпал.')
+
+
+def append(token, user_id, offset, stream, checksum=None):
+    """Дописывает часть из stream со смещения offset.
+
+    Возвращает новое смещение. Часть, у которой не сошелся хеш или
+    которая выходит за длину загрузки, отбрасывается целиком.
+    """
+    meta = _meta(token, user_id)
+    if meta is None:
+        raise UploadError(404, 'Загрузка не найдена.')
+    try:
+        with file_lock(_path(token, 'lock'), timeout=0):
+            if offset != _offset(token):
+                raise UploadError(409, 'Смещение не совпадает с принятым.')
+            with open(_path(token, 'part'), 'ab') as part:
+                try:
+                    _write_part(part, stream, meta['length'], checksum)
+                except BaseException:
+                    part.truncate(offset)
+                    raise
+                return part.tell()
+    except LockTimeout:
+        raise UploadError(409, 'Часть этой загрузки уже принимается.')
+
+
+def completed(token, user_id):
+    """Законченная загрузка как UploadedFile или None.
+
+    Файл открыт; закрывает его вызывающий, когда картинка сохранена.
+    """
+    meta = _meta(token, user_id)
+    if meta is None or _offset(token) != meta['length']:
+        return None
+    return UploadedFile(
+        open(_path(token, 'part'), 'rb'),
+        name=meta['filename'],
+        size=meta['length'],
+    )
+
+
+def discard(token):
+    if not token or not TOKEN.fullmatch(token):
+        return
+    for suffix in ('json', 'part', 'lock'):
+        try:
+            os.remove(_path(token, suffix))
+        except FileNotFoundError:
+            pass
+
+
+def expire(older_than, dry_run=False):
+    """Удаляет загрузки, которые не менялись с older_than; возвращает
+    их число."""
+    try:
+        entries = list(os.scandir(UPLOAD_DIR))
+    except FileNotFoundError:
+        return 0
+    expired = 0
+    for entry in entries:
+        token, _, suffix = entry.name.partition('.')
+        if suffix != 'part' or entry.stat().st_mtime >= older_than:
+            continue
+        expired += 1
+        if not dry_run:
+            discard(token)
+    return expired
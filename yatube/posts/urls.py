@@ -1,6 +1,6 @@
 from django.urls import path
 
-from posts import views
+from posts import api, views
 
 
 app_name = 'posts'
@@ -17,7 +17,22 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path(
+        'posts/<int:post_id>/events/',
+        views.post_events,
+        name='post_events'
+    ),
+    path('search/', views.post_search, name='search'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('uploads/', views.upload_create, name='upload_create'),
+    path('uploads/<slug:token>/', views.upload, name='upload'),
+    path(
+        'thumbnails/<slug:name>/<path:image>',
+        views.thumbnail,
+        name='thumbnail'
+    ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/events/', views.follow_events, name='follow_events'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -28,5 +43,22 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
-    # path('api/v1/posts/<int:pk>/', views.get_post, name='get_post'),
+    path('api/v1/posts/', api.posts, name='api_posts'),
+    path('api/v1/posts/<int:post_id>/', api.post, name='api_post'),
+    path(
+        'api/v1/posts/<int:post_id>/comments/',
+        api.comments,
+        name='api_comments'
+    ),
+    path('api/v1/groups/', api.groups, name='api_groups'),
+    path('api/v1/groups/<slug:slug>/', api.group, name='api_group'),
+    path('api/v1/feed/', api.feed, name='api_feed'),
+    path(
+        'api/v1/feed/groups/<int:group_id>/',
+        api.group_feed,
+        name='api_group_feed'
+    ),
+    path('api/v1/feed/follow/', api.follow_feed, name='api_follow_feed'),
+    path('api/v1/follow/', api.follows, name='api_follows'),
+    path('api/v1/follow/<str:username>/', api.follow, name='api_follow'),
 ]
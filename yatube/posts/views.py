@@ -1,58 +1,91 @@
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.utils.functional import SimpleLazyObject
+from core.file_lock import LockTimeout
+from core.page_cache import shared_page_cache
+from core.query_budget import query_budget
 from posts.models import Post, Group, User, Follow
+from posts.feed_cache import (
+    INDEX, author_posts_count, feed_cache_key, group_feed, profile_feed
+)
 from posts.forms import PostForm, CommentForm
-from yatube.settings import NUMBER_OF_PAGES
+from posts import pages, search, streams, thumbnails, uploads
+from posts.paginators import get_request_page, paginate
+from posts.timeline import feed_post, follow_feed, merge_timing
+from yatube.settings import (
+    FEED_CACHE_TIMEOUT, FEED_STALE_TIMEOUT, THUMBNAIL_LOCK_TIMEOUT
+)
 
 
+@shared_page_cache(pages.index_modified)
+@query_budget(5)
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.select_related('author', 'group')
+    page_obj = SimpleLazyObject(
+        lambda: thumbnails.prefetch(paginate(request, posts))
+    )
     context = {
         'page_obj': page_obj,
+        'feed_cache_key': feed_cache_key(INDEX, request),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_stale_timeout': FEED_STALE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@shared_page_cache(pages.group_modified)
+@query_budget(6)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = SimpleLazyObject(
+        lambda: thumbnails.prefetch(paginate(request, posts))
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_cache_key': feed_cache_key(group_feed(group.pk), request),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_stale_timeout': FEED_STALE_TIMEOUT,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@shared_page_cache(pages.profile_modified)
+@query_budget(7)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    author_posts = user.posts.all()
-    paginator = Paginator(author_posts, NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=user
-    ).exists()
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    author_posts = user.posts.select_related('group')
+    page_obj = SimpleLazyObject(
+        lambda: thumbnails.prefetch(paginate(request, author_posts))
+    )
     context = {
         'author': user,
         'page_obj': page_obj,
-        'author_posts': author_posts,
-        'following': following,
-
+        'feed_cache_key': feed_cache_key(profile_feed(user.pk), request),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+        'feed_stale_timeout': FEED_STALE_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@shared_page_cache(pages.post_modified)
+@query_budget(6)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    # Число постов — дыра со своим кешем: заполняем его уже
+    # прочитанным значением, чтобы дыра не шла в базу.
+    stats = getattr(post.author, 'stats', None)
+    author_posts_count(post.author_id, stats.posts_count if stats else 0)
     form = CommentForm()
-    comments = post.comments.all()
+    comments = post.comments.select_related('author').order_by('created')
     context = {
         'post': post,
         'form': form,
@@ -62,6 +95,7 @@ def post_detail(request, post_id):
 
 
 @login_required
+@query_budget(12)
 def post_create(request):
     if request.method != 'POST':
         form = PostForm()
@@ -72,15 +106,18 @@ def post_create(request):
     form = PostForm(
         request.POST,
         files=request.FILES,
+        user=request.user,
     )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        form.discard_upload()
         return redirect('posts:profile', request.user.get_username())
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
+        user=request.user,
     )
     context = {
         'form': form,
@@ -89,8 +126,9 @@ def post_create(request):
 
 
 @login_required
+@query_budget(11)
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
     if request.method != 'POST':
@@ -109,8 +147,9 @@ def post_edit(request, post_id):
         request.POST or None,
         files=request.FILES or None,
         instance=post,
+        user=request.user,
     )
-    if not form.is_valid:
+    if not form.is_valid():
         context = {
             'form': form,
             'is_edit': True,
@@ -118,10 +157,12 @@ def post_edit(request, post_id):
         }
         return render(request, 'posts/post_create.html', context)
     form.save()
+    form.discard_upload()
     return redirect('posts:post_detail', post_id)
 
 
 @login_required
+@query_budget(7)
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -133,19 +174,160 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@require_http_methods(['GET'])
+@query_budget(4)
+def post_events(request, post_id):
+    """Поток новых комментариев поста (Server-Sent Events)."""
+    get_object_or_404(Post.objects.only('pk'), id=post_id)
+    return streams.comment_stream(request, post_id)
+
+
+@query_budget(3)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search.results_page(request, query)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(1)
+def search_api(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search.results_page(request, query)
+    return JsonResponse({
+        'query': query,
+        'results': [search.serialize(result) for result in page_obj],
+        'next': page_obj.paginator.next_cursor,
+        'previous': page_obj.paginator.previous_cursor,
+    })
+
+
+def _tus_response(status=204, **headers):
+    response = HttpResponse(status=status)
+    response['Tus-Resumable'] = '1.0.0'
+    response['Cache-Control'] = 'no-store'
+    for name, value in headers.items():
+        response[name.replace('_', '-')] = value
+    return response
+
+
+def _upload_error(error):
+    response = _tus_response(error.status)
+    response.content = str(error)
+    response['Content-Type'] = 'text/plain; charset=utf-8'
+    if error.status == 460:
+        response.reason_phrase = 'Checksum Mismatch'
+    return response
+
+
+@login_required
+@require_http_methods(['POST'])
+@query_budget(2)
+def upload_create(request):
+    try:
+        length = int(request.META.get('HTTP_UPLOAD_LENGTH', ''))
+    except ValueError:
+        return _tus_response(400)
+    try:
+        metadata = uploads.parse_metadata(
+            request.META.get('HTTP_UPLOAD_METADATA', '')
+        )
+        token = uploads.create(
+            request.user.pk, length, metadata.get('filename', '')
+        )
+    except uploads.UploadError as error:
+        return _upload_error(error)
+    return _tus_response(
+        201,
+        Location=reverse('posts:upload', args=(token,)),
+        Upload_Offset=0,
+    )
+
+
+@login_required
+@require_http_methods(['HEAD', 'PATCH', 'DELETE'])
+@query_budget(2)
+def upload(request, token):
+    found = uploads.state(token, request.user.pk)
+    if found is None:
+        return _tus_response(404)
+    offset, length = found
+    if request.method == 'HEAD':
+        return _tus_response(200, Upload_Offset=offset, Upload_Length=length)
+    if request.method == 'DELETE':
+        uploads.discard(token)
+        return _tus_response()
+    if request.content_type != 'application/offset+octet-stream':
+        return _tus_response(415)
+    try:
+        offset = uploads.append(
+            token,
+            request.user.pk,
+            int(request.META.get('HTTP_UPLOAD_OFFSET', '')),
+            request,
+            uploads.parse_checksum(request.META.get('HTTP_UPLOAD_CHECKSUM')),
+        )
+    except ValueError:
+        return _tus_response(400)
+    except uploads.UploadError as error:
+        return _upload_error(error)
+    return _tus_response(Upload_Offset=offset)
+
+
+@query_budget(thumbnails.ON_DEMAND_QUERIES)
+def thumbnail(request, name, image):
+    post = None
+    if name in thumbnails.THUMBNAILS:
+        post = Post.objects.only('image').filter(image=image).first()
+    if post is None:
+        raise Http404
+    try:
+        found = thumbnails.ensure(image, name, THUMBNAIL_LOCK_TIMEOUT)
+    except LockTimeout:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = 1
+        return response
+    except OSError:
+        # Файла картинки нет или Pillow не может его прочитать.
+        raise Http404
+    if found is None:
+        # Миниатюры не получилось: отдаем исходную картинку.
+        return redirect(post.image.url)
+    return redirect(found.url)
+
+
 @login_required
+@query_budget(4)
 def follow_index(request):
-    follow_authors = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(follow_authors, NUMBER_OF_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = follow_feed(request.user)
+    page_obj = get_request_page(request, paginator)
+    page_obj.object_list = thumbnails.prefetch(
+        [feed_post(item) for item in page_obj]
+    )
     context = {
         'page_obj': page_obj,
     }
-    return render(request, 'posts/follow.html', context)
+    response = render(request, 'posts/follow.html', context)
+    response['Server-Timing'] = merge_timing(paginator.merge_stats)
+    return response
+
+
+@login_required
+@require_http_methods(['GET'])
+@query_budget(4)
+def follow_events(request):
+    """Поток новых постов авторов из подписок (Server-Sent Events)."""
+    author_ids = list(Follow.objects.filter(user=request.user).values_list(
+        'author_id', flat=True
+    ))
+    return streams.follow_stream(request, author_ids)
 
 
 @login_required
+@query_budget(13)
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -154,6 +336,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@query_budget(11)
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     is_follow = Follow.objects.filter(user=request.user, author=author)
@@ -0,0 +1,35 @@
+// Дописывает на страницу поста комментарии из потока событий.
+// После обрыва EventSource переподключается сам и передает серверу
+// Last-Event-ID, поэтому пропущенные комментарии тоже приходят.
+(function () {
+  var list = document.getElementById('comments');
+  if (!list || !window.EventSource) {
+    return;
+  }
+
+  function render(comment) {
+    var link = document.createElement('a');
+    link.href = list.dataset.profileUrl.replace(
+      'username', encodeURIComponent(comment.author)
+    );
+    link.textContent = comment.author;
+    var title = document.createElement('h5');
+    title.className = 'mt-0';
+    title.appendChild(link);
+    var text = document.createElement('p');
+    text.textContent = comment.text;
+    var body = document.createElement('div');
+    body.className = 'media-body';
+    body.appendChild(title);
+    body.appendChild(text);
+    var item = document.createElement('div');
+    item.className = 'media mb-4';
+    item.appendChild(body);
+    return item;
+  }
+
+  var source = new EventSource(list.dataset.eventsUrl);
+  source.addEventListener('comment', function (message) {
+    list.appendChild(render(JSON.parse(message.data)));
+  });
+})();
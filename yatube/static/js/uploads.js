@@ -0,0 +1,139 @@
+// Отправляет картинку формы поста частями по протоколу tus и передает
+// форме только токен законченной загрузки. После обрыва загрузка
+// продолжается с принятого сервером смещения.
+(function () {
+  var CHUNK_SIZE = 1024 * 1024;
+  var RETRY_DELAYS = [1000, 3000, 5000, 10000];
+
+  function csrfToken(form) {
+    return form.querySelector('[name=csrfmiddlewaretoken]').value;
+  }
+
+  function base64(buffer) {
+    var bytes = new Uint8Array(buffer);
+    var binary = '';
+    for (var i = 0; i < bytes.length; i++) {
+      binary += String.fromCharCode(bytes[i]);
+    }
+    return btoa(binary);
+  }
+
+  function request(form, method, url, headers, body) {
+    headers['Tus-Resumable'] = '1.0.0';
+    headers['X-CSRFToken'] = csrfToken(form);
+    return fetch(url, {
+      method: method, headers: headers, body: body,
+      credentials: 'same-origin'
+    }).then(function (response) {
+      if (!response.ok) {
+        throw new Error(method + ' ' + url + ': ' + response.status);
+      }
+      return response;
+    });
+  }
+
+  function withRetries(action, attempt) {
+    attempt = attempt || 0;
+    return action().catch(function (error) {
+      if (attempt >= RETRY_DELAYS.length) {
+        throw error;
+      }
+      return new Promise(function (resolve) {
+        setTimeout(resolve, RETRY_DELAYS[attempt]);
+      }).then(function () {
+        return withRetries(action, attempt + 1);
+      });
+    });
+  }
+
+  function storageKey(file) {
+    return 'upload:' + [file.name, file.size, file.lastModified].join(':');
+  }
+
+  function start(form, file) {
+    var saved = localStorage.getItem(storageKey(file));
+    if (saved) {
+      return request(form, 'HEAD', saved, {}).then(function (response) {
+        return {
+          url: saved,
+          offset: Number(response.headers.get('Upload-Offset'))
+        };
+      }).catch(function () {
+        localStorage.removeItem(storageKey(file));
+        return start(form, file);
+      });
+    }
+    return request(form, 'POST', form.dataset.uploadUrl, {
+      'Upload-Length': String(file.size),
+      'Upload-Metadata': 'filename ' + btoa(unescape(
+        encodeURIComponent(file.name)))
+    }).then(function (response) {
+      var url = response.headers.get('Location');
+      localStorage.setItem(storageKey(file), url);
+      return {url: url, offset: 0};
+    });
+  }
+
+  function sendChunk(form, upload, file) {
+    var chunk = file.slice(upload.offset, upload.offset + CHUNK_SIZE);
+    return chunk.arrayBuffer().then(function (data) {
+      return crypto.subtle.digest('SHA-256', data).then(function (hash) {
+        return request(form, 'PATCH', upload.url, {
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(upload.offset),
+          'Upload-Checksum': 'sha256 ' + base64(hash)
+        }, data);
+      });
+    }).then(function (response) {
+      upload.offset = Number(response.headers.get('Upload-Offset'));
+    });
+  }
+
+  function sendAll(form, upload, file) {
+    if (upload.offset >= file.size) {
+      return Promise.resolve(upload);
+    }
+    return withRetries(function () {
+      return sendChunk(form, upload, file).catch(function (error) {
+        // Смещение могло уйти вперед, если ответ потерялся.
+        return request(form, 'HEAD', upload.url, {}).then(function (r) {
+          upload.offset = Number(r.headers.get('Upload-Offset'));
+          throw error;
+        });
+      });
+    }).then(function () {
+      return sendAll(form, upload, file);
+    });
+  }
+
+  document.querySelectorAll('form[data-upload-url]').forEach(function (form) {
+    var input = form.querySelector('input[type=file][name=image]');
+    if (!input || !window.fetch || !window.crypto || !crypto.subtle) {
+      return;
+    }
+    form.addEventListener('submit', function (event) {
+      var file = input.files[0];
+      if (!file) {
+        return;
+      }
+      event.preventDefault();
+      var button = form.querySelector('[type=submit]');
+      button.disabled = true;
+      withRetries(function () {
+        return start(form, file);
+      }).then(function (upload) {
+        return sendAll(form, upload, file);
+      }).then(function (upload) {
+        localStorage.removeItem(storageKey(file));
+        form.elements.upload.value = upload.url.split('/').filter(
+          Boolean).pop();
+        input.value = '';
+        form.submit();
+      }).catch(function () {
+        // Запасной путь: обычная отправка файла в форме.
+        button.disabled = false;
+        form.submit();
+      });
+    });
+  });
+})();
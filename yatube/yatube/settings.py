@@ -1,9 +1,14 @@
 import os
+import sqlite3
+from contextlib import closing
 
 from django.core.management.utils import get_random_secret_key
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Каталог файлового кеша, блокировок и каналов; тесты подменяют его
+# своим (yatube.test_settings).
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
@@ -12,6 +17,95 @@ LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
 NUMBER_OF_PAGES = 10
+# Наибольший ?limit= и число ?ids= в одном запросе к API.
+API_MAX_LIMIT = 100
+API_MAX_IDS = 100
+TIMELINE_SIZE = 1000
+FEED_PULL_THRESHOLD = 10000
+FEED_CACHE_TIMEOUT = 300
+FEED_STALE_TIMEOUT = 60
+# Каналы core.pubsub и потоки событий (SSE) для комментариев и ленты.
+PUBSUB_DIR = os.path.join(CACHE_DIR, 'pubsub')
+PUBSUB_POLL_INTERVAL = 1
+SSE_HEARTBEAT = 15
+SSE_MAX_DURATION = 300
+SSE_RETRY = 3000
+# Потоки держат поток WSGI-сервера: больше этого числа на процесс
+# получают 503.
+SSE_MAX_CONNECTIONS = 8
+PAGE_CACHE_TIMEOUT = 600
+
+
+def sqlite_has_fts5():
+    """Собран ли SQLite, с которым работает Django, с FTS5."""
+    with closing(sqlite3.connect(':memory:')) as probe:
+        try:
+            probe.execute('CREATE VIRTUAL TABLE probe USING fts5(text)')
+        except sqlite3.OperationalError:
+            return False
+    return True
+
+
+# 'fts5' — SQLite FTS5, 'inverted' — индекс на Python для баз без FTS5.
+# По умолчанию FTS5, если SQLite его поддерживает.
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or (
+    'fts5' if sqlite_has_fts5() else 'inverted'
+)
+SEARCH_INDEX_DIR = os.path.join(BASE_DIR, 'search_index')
+# compact_search_index --if-needed сливает журнал инвертированного индекса
+# в сегмент, когда он больше сегмента во столько раз и не меньше
+# SEARCH_COMPACT_MIN_LOG байт.
+SEARCH_COMPACT_RATIO = 2
+SEARCH_COMPACT_MIN_LOG = 1 << 20
+# Потоки фоновой генерации миниатюр; 0 — генерировать сразу (так
+# в тестах, чтобы пул не писал во временный MEDIA_ROOT после теста).
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+# Хранилище картинок постов и миниатюр: файлы в MEDIA_ROOT или
+# 'core.object_storage.ObjectStorage' с параметрами OBJECT_STORAGE.
+MEDIA_STORAGE = 'core.storage.AtomicFileSystemStorage'
+THUMBNAIL_STORAGE = MEDIA_STORAGE
+OBJECT_STORAGE = {
+    # 'local' — каталог root, для разработки и тестов без сети, 's3' —
+    # S3-совместимый сервис (нужен boto3).
+    'backend': os.environ.get('MEDIA_BACKEND', 'local'),
+    'bucket': os.environ.get('MEDIA_BUCKET', ''),
+    'endpoint_url': os.environ.get('MEDIA_ENDPOINT_URL'),
+    'region': os.environ.get('MEDIA_REGION'),
+    'access_key': os.environ.get('MEDIA_ACCESS_KEY'),
+    'secret_key': os.environ.get('MEDIA_SECRET_KEY'),
+    'root': os.path.join(BASE_DIR, 'object_storage'),
+    # Префикс ключей объектов.
+    'location': 'media',
+    # Адреса через CDN, иначе подписанные на url_expiry секунд или
+    # прямые адреса объектов.
+    'cdn_url': os.environ.get('MEDIA_CDN_URL'),
+    'signed_urls': True,
+    'url_expiry': 60 * 60,
+    'max_pool_connections': 20,
+    # Файлы от multipart_threshold байт отправляются частями part_size.
+    'multipart_threshold': 8 * 2 ** 20,
+    'part_size': 8 * 2 ** 20,
+}
+# Блокировки генерации миниатюр: общие для процессов одной машины.
+THUMBNAIL_LOCK_DIR = os.path.join(CACHE_DIR, 'thumbnail_locks')
+# Сколько секунд запрос миниатюры ждет чужую генерацию.
+THUMBNAIL_LOCK_TIMEOUT = 30
+# Картинки больше IMAGE_MAX_PIXELS отклоняются, больше IMAGE_MAX_SIDE
+# по длинной стороне — уменьшаются при загрузке.
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_MAX_SIDE = 2560
+IMAGE_QUALITY = 85
+# Форматы вариантов для srcset помимо JPEG; недоступные в Pillow и sorl
+# пропускаются.
+IMAGE_FORMATS = ('AVIF', 'WEBP')
+# gc_media не трогает файлы моложе MEDIA_GC_GRACE секунд: их пост может
+# быть еще не закоммичен.
+MEDIA_GC_GRACE = 24 * 60 * 60
+# Загрузки картинок частями: где собираются, наибольший размер и через
+# сколько секунд незаконченная загрузка удаляется gc_media.
+UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
+UPLOAD_MAX_SIZE = 50 * 2 ** 20
+UPLOAD_EXPIRY = 24 * 60 * 60
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 STATICFILES_DIRS = [
@@ -55,11 +149,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.page_cache.SharedPageCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -139,8 +235,36 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Блокировки пересчета core.dogpile.
+DOGPILE_LOCK_DIR = os.path.join(CACHE_DIR, 'dogpile_locks')
+DOGPILE_LOCK_STRIPES = 1024
+# Общий L2: в работе — memcached на всех машинах
+# (SHARED_CACHE_BACKEND=django.core.cache.backends.memcached.PyLibMCCache,
+# SHARED_CACHE_LOCATION=host:port); файловый кеш — для разработки.
+SHARED_CACHE = {
+    'BACKEND': os.environ.get('SHARED_CACHE_BACKEND', 'core.cache.FileCache'),
+    'LOCATION': os.environ.get(
+        'SHARED_CACHE_LOCATION', os.path.join(CACHE_DIR, 'shared')
+    ),
+}
+if SHARED_CACHE['BACKEND'] == 'core.cache.FileCache':
+    # При переполнении удаляется десятая часть случайных записей;
+    # каталог пересчитывается раз в CULL_EVERY записей.
+    SHARED_CACHE['OPTIONS'] = {
+        'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 10, 'CULL_EVERY': 100,
+    }
+
+# Страницы, версии страниц, поколения и фрагменты лент, записи миниатюр
+# живут в одном вытесняющем L2: потеря версии или поколения только
+# заставляет пересобрать запись.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 2,
+        },
+    },
+    'shared': SHARED_CACHE,
 }
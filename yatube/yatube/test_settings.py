@@ -0,0 +1,14 @@
+"""Настройки тестов: кеш, блокировки и каналы лежат во временном
+каталоге, поэтому тесты не трогают кеш запущенного сайта и не делят
+состояние между запусками. Миниатюры создаются без фонового пула: его
+задачи иначе переживают тест и его временный MEDIA_ROOT."""
+import atexit
+import os
+import shutil
+import tempfile
+
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='yatube-test-cache-')
+atexit.register(shutil.rmtree, os.environ['CACHE_DIR'], ignore_errors=True)
+os.environ['THUMBNAIL_WORKERS'] = '0'
+
+from yatube.settings import *  # noqa: E402,F401,F403
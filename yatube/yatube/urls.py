@@ -2,6 +2,9 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.core.files.storage import FileSystemStorage, get_storage_class
+
+from core.views import media_object
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
@@ -12,8 +15,12 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('media-objects/<path:key>', media_object, name='media_object'),
 ]
-if settings.DEBUG:
+# Картинки из объектного хранилища этот процесс не раздает.
+if settings.DEBUG and issubclass(
+    get_storage_class(settings.MEDIA_STORAGE), FileSystemStorage
+):
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
     )